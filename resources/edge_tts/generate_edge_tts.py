@@ -3,88 +3,247 @@
 """
 Edge TTS Generator - TurboVoicer
 Gera áudio usando Microsoft Edge TTS com controles de pitch e rate
+
+Modo lote (--manifest): vários itens (text, voice, rate, pitch, output) em um só
+processo, com concorrência limitada, novas tentativas com backoff (jitter) e
+resultado por item. O manifesto é um JSON (lista de itens ou {"items": [...]}) ou
+JSONL (um item por linha); voice/pitch/rate ausentes usam os valores da linha de
+comando.
+
+--stream grava o MP3 à medida que os pedaços chegam (communicate.stream()) em vez
+de esperar a síntese inteira: o arquivo já pode ser lido/tocado enquanto cresce, e a
+linha [FIRST_AUDIO] informa o tempo até o primeiro áudio.
+
+--communicator modulo:fabrica troca o edge_tts.Communicate por outra fábrica
+fabrica(text=, voice=, pitch=, rate=) com async save(caminho) (e stream(), com --stream) - por
+exemplo um cliente de um servidor falso local, para testar sem rede.
+
+Exemplos:
+python generate_edge_tts.py --text "Olá" --voice pt-BR-FranciscaNeural --output ola.mp3
+python generate_edge_tts.py --text "Olá" --voice pt-BR-FranciscaNeural --output ola.mp3 --stream
+python generate_edge_tts.py --manifest roteiro.json --voice pt-BR-FranciscaNeural --concurrency 4 --results resultado.json
 """
 
 import asyncio
 import argparse
+import importlib
+import json
+import random
 import sys
 import os
+import time
 
 try:
     import edge_tts
 except ImportError:
-    print("ERRO: Módulo edge-tts não encontrado. Instale com: pip install edge-tts", file=sys.stderr)
-    sys.exit(1)
+    edge_tts = None
+
+
+def load_communicator(spec):
+    """Fábrica do comunicador: edge_tts.Communicate ou 'modulo:fabrica'"""
+    if spec:
+        module_name, _, attr = spec.partition(":")
+        return getattr(importlib.import_module(module_name), attr or "Communicate")
+    if edge_tts is None:
+        print("ERRO: Módulo edge-tts não encontrado. Instale com: pip install edge-tts", file=sys.stderr)
+        sys.exit(1)
+    return edge_tts.Communicate
+
+
+async def synthesize(text, voice, pitch, rate, output_path, communicator):
+    """Sintetiza um texto e retorna o tamanho do arquivo (grava em .part e renomeia no fim)"""
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    partial_path = output_path + ".part"
+    communicate = communicator(text=text, voice=voice, pitch=pitch, rate=rate)
+    try:
+        await communicate.save(partial_path)
+        if not os.path.exists(partial_path) or os.path.getsize(partial_path) == 0:
+            raise Exception(f"Arquivo de saída não foi criado: {output_path}")
+        os.replace(partial_path, output_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    return os.path.getsize(output_path)
 
 
-async def generate_tts(text, voice, pitch, rate, output_path):
+async def generate_tts(text, voice, pitch, rate, output_path, communicator=None):
     """
     Gera áudio usando Edge TTS
-    
+
     Args:
         text (str): Texto para sintetizar
         voice (str): Nome da voz (ex: en-US-AvaMultilingualNeural)
         pitch (str): Ajuste de pitch (ex: +5Hz, -10Hz)
         rate (str): Ajuste de velocidade (ex: +50%, -25%)
         output_path (str): Caminho do arquivo de saída
+        communicator: fábrica do comunicador (padrão: edge_tts.Communicate)
     """
     try:
-        # Criar comunicador Edge TTS
-        communicate = edge_tts.Communicate(
-            text=text,
-            voice=voice,
-            pitch=pitch,
-            rate=rate
-        )
-        
-        # Gerar e salvar áudio
-        await communicate.save(output_path)
-        
-        # Verificar se arquivo foi criado
-        if not os.path.exists(output_path):
-            raise Exception(f"Arquivo de saída não foi criado: {output_path}")
-        
-        file_size = os.path.getsize(output_path)
+        file_size = await synthesize(text, voice, pitch, rate, output_path, communicator or load_communicator(None))
         print(f"[OK] Audio gerado com sucesso: {output_path} ({file_size} bytes)")
-        
+
     except Exception as e:
         print(f"ERRO ao gerar áudio: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
 
+async def stream_tts(text, voice, pitch, rate, output_path, communicator=None):
+    """
+    Gera áudio gravando cada pedaço assim que chega do Edge TTS
+
+    Retorna o tempo até o primeiro áudio e o total (s).
+    """
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    start = time.time()
+    first_audio = None
+    communicate = (communicator or load_communicator(None))(text=text, voice=voice, pitch=pitch, rate=rate)
+    with open(output_path, "wb") as f:
+        async for chunk in communicate.stream():
+            if chunk["type"] != "audio":
+                continue
+            f.write(chunk["data"])
+            f.flush()
+            if first_audio is None:
+                first_audio = time.time() - start
+                print(f"[FIRST_AUDIO] {first_audio:.2f}s", flush=True)
+
+    if first_audio is None:
+        raise Exception(f"Nenhum áudio recebido para: {output_path}")
+    return first_audio, time.time() - start
+
+
+def load_manifest(path, defaults):
+    """Itens do manifesto (JSON ou JSONL) com voice/pitch/rate padrão preenchidos"""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    try:
+        data = json.loads(content)
+        items = data["items"] if isinstance(data, dict) else data
+    except json.JSONDecodeError:
+        items = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    manifest = []
+    for index, item in enumerate(items):
+        if not str(item.get("text", "")).strip() or not item.get("output"):
+            raise ValueError(f"Item {index} do manifesto sem 'text' ou 'output'")
+        entry = dict(defaults, **{k: v for k, v in item.items() if v is not None})
+        if not entry.get("voice"):
+            raise ValueError(f"Item {index} do manifesto sem 'voice' (e sem --voice)")
+        manifest.append(entry)
+    return manifest
+
+
+async def run_manifest(items, communicator, concurrency=4, retries=3, backoff=0.5, max_backoff=8.0):
+    """
+    Sintetiza os itens com no máximo `concurrency` conexões simultâneas.
+    Cada item tenta até 1 + retries vezes, esperando uniform(0, min(max_backoff,
+    backoff * 2^tentativa)) entre elas (full jitter: as novas tentativas de itens que
+    falharam juntos não batem no serviço ao mesmo tempo). Retorna um resultado por item.
+    """
+    slots = asyncio.Semaphore(max(1, concurrency))
+    done = 0
+
+    async def run_item(index, item):
+        nonlocal done
+        result = {"index": index, "output": item["output"], "success": False, "attempts": 0}
+        start = time.time()
+        for attempt in range(retries + 1):
+            result["attempts"] = attempt + 1
+            try:
+                # A vaga é liberada durante o backoff: itens com falha não seguram os demais
+                async with slots:
+                    result["bytes"] = await synthesize(
+                        item["text"], item["voice"], item["pitch"], item["rate"], item["output"], communicator
+                    )
+                result["success"] = True
+                result.pop("error", None)
+                break
+            except Exception as e:
+                result["error"] = str(e) or e.__class__.__name__
+                if attempt < retries:
+                    await asyncio.sleep(random.uniform(0, min(max_backoff, backoff * 2 ** attempt)))
+        result["seconds"] = round(time.time() - start, 2)
+        done += 1
+        status = "[OK]" if result["success"] else f"[ERRO] {result['error']}"
+        print(f"[{done}/{len(items)}] {status} {item['output']} ({result['attempts']} tentativa(s), {result['seconds']}s)")
+        return result
+
+    return await asyncio.gather(*(run_item(i, item) for i, item in enumerate(items)))
+
+
 def main():
     parser = argparse.ArgumentParser(description='Gerar áudio com Edge TTS')
-    parser.add_argument('--text', required=True, help='Texto para sintetizar')
-    parser.add_argument('--voice', required=True, help='Nome da voz Edge TTS')
+    parser.add_argument('--text', help='Texto para sintetizar')
+    parser.add_argument('--voice', help='Nome da voz Edge TTS (no manifesto: padrão dos itens)')
     parser.add_argument('--pitch', default='+0Hz', help='Ajuste de pitch (ex: +5Hz)')
     parser.add_argument('--rate', default='+0%', help='Ajuste de velocidade (ex: +50%)')
-    parser.add_argument('--output', required=True, help='Caminho do arquivo de saída')
-    
+    parser.add_argument('--output', help='Caminho do arquivo de saída')
+    parser.add_argument('--stream', action='store_true', help='Gravar o áudio à medida que chega (menor tempo até o primeiro áudio)')
+    parser.add_argument('--manifest', help='JSON/JSONL com itens (text, voice, rate, pitch, output) para gerar em lote')
+    parser.add_argument('--concurrency', type=int, default=4, help='Sínteses simultâneas no modo lote')
+    parser.add_argument('--retries', type=int, default=3, help='Novas tentativas por item no modo lote')
+    parser.add_argument('--backoff', type=float, default=0.5, help='Espera base (s) entre tentativas, dobrada a cada falha')
+    parser.add_argument('--results', help='Gravar o resultado por item neste JSON (modo lote)')
+    parser.add_argument('--communicator', help='Fábrica alternativa ao edge_tts.Communicate (modulo:fabrica)')
+
     args = parser.parse_args()
-    
+    communicator = load_communicator(args.communicator)
+
+    if args.manifest:
+        try:
+            items = load_manifest(args.manifest, {"voice": args.voice, "pitch": args.pitch, "rate": args.rate})
+        except (OSError, ValueError) as e:
+            print(f"ERRO no manifesto: {e}", file=sys.stderr)
+            sys.exit(1)
+
+        print(f"Gerando {len(items)} áudios com Edge TTS ({args.concurrency} simultâneos)...")
+        start = time.time()
+        results = asyncio.run(run_manifest(items, communicator, args.concurrency, args.retries, args.backoff))
+        failed = [r for r in results if not r["success"]]
+        print(f"[OK] {len(results) - len(failed)}/{len(results)} áudios em {time.time() - start:.1f}s")
+
+        if args.results:
+            with open(args.results, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+        sys.exit(1 if failed else 0)
+
     # Validar argumentos
+    if not args.text or not args.voice or not args.output:
+        parser.error("--text, --voice e --output são obrigatórios (ou use --manifest)")
     if not args.text.strip():
         print("ERRO: Texto não pode estar vazio", file=sys.stderr)
         sys.exit(1)
-    
-    # Criar diretório de saída se não existir
-    output_dir = os.path.dirname(args.output)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir, exist_ok=True)
-    
+
     # Executar geração
     print(f"Gerando áudio com Edge TTS...")
     print(f"  Voz: {args.voice}")
     print(f"  Pitch: {args.pitch}")
     print(f"  Rate: {args.rate}")
     print(f"  Texto: {args.text[:50]}{'...' if len(args.text) > 50 else ''}")
-    
+
+    if args.stream:
+        try:
+            first_audio, total = asyncio.run(stream_tts(args.text, args.voice, args.pitch, args.rate, args.output, communicator))
+        except Exception as e:
+            print(f"ERRO ao gerar áudio: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        print(f"[OK] Audio gerado com sucesso: {args.output} ({os.path.getsize(args.output)} bytes, 1º áudio em {first_audio:.2f}s, total {total:.2f}s)")
+        return
+
     asyncio.run(generate_tts(
         text=args.text,
         voice=args.voice,
         pitch=args.pitch,
         rate=args.rate,
-        output_path=args.output
+        output_path=args.output,
+        communicator=communicator
     ))
 
 
@@ -0,0 +1,305 @@
+"""
+Offline micro-benchmarks of the VC pipeline (no downloads, CPU-only friendly).
+
+Builds small random-weight synthesizers (SynthesizerTrnMs256NSFsid for v1,
+SynthesizerTrnMs768NSFsid for v2), a stand-in HuBERT with the same interface and
+frame rate as the real one, synthetic speech-like signals (harmonic source with a
+moving f0, formants, syllable envelope and pauses) and synthetic FAISS indexes, then
+times:
+  - split-point search (every segmentation policy)
+  - f0 extraction (every requested method)
+  - index search (flat / IVF indexes of several sizes, labelled by the engine
+    VC.load_index picks for them: torch exact scan or FAISS)
+  - the full VC.pipeline per model version, with its per-stage breakdown
+Every result has the best wall time of --repeats runs, the real-time factor, the
+stage breakdown reported by stage_timing and the peak RSS (memory_accounting).
+
+The absolute numbers of the HuBERT / synthesis stages depend on the stand-in sizes
+(--model_size full uses the real layer sizes); the benchmark is meant to compare
+revisions of the pipeline code on the same machine:
+
+python benchmark_pipeline.py --output_json bench.json
+python benchmark_pipeline.py --baseline bench.json --tolerance 0.15
+
+Must be executed with CWD = RVC-GUI directory (infer_pack).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from time import time as ttime
+
+parser = argparse.ArgumentParser(description="Offline micro-benchmarks of the VC pipeline")
+parser.add_argument("--durations", default="5,30", help="Comma separated signal durations (seconds)")
+parser.add_argument("--f0_methods", default="pm,harvest,dio,crepe-tiny", help="Comma separated f0 methods")
+parser.add_argument("--index_sizes", default="10000,100000", help="Comma separated index sizes (vectors)")
+parser.add_argument("--versions", default="v1,v2", help="Model versions benchmarked end to end")
+parser.add_argument("--model_size", default="tiny", choices=["tiny", "full"], help="Layer sizes of the random models")
+parser.add_argument("--pipeline_f0", default="pm", help="f0 method used by the end-to-end runs")
+parser.add_argument("--repeats", type=int, default=3, help="Timed runs per benchmark (best is kept)")
+parser.add_argument("--only", default=None, help="Run only the benchmarks whose name contains this text")
+parser.add_argument("--threads", type=int, default=0, help="torch threads (0 = torch default)")
+parser.add_argument("--seed", type=int, default=1234)
+parser.add_argument("--gpu", action="store_true", help="Allow CUDA (default: CPU only)")
+parser.add_argument("--output_json", default=None, help="Write the report to this file")
+parser.add_argument("--baseline", default=None, help="Compare against a report written by --output_json")
+parser.add_argument("--tolerance", type=float, default=0.10, help="Slowdown ratio reported as a regression")
+args = parser.parse_args()
+# Config() parses sys.argv on its own; keep it away from our arguments
+sys.argv = [sys.argv[0]]
+if not args.gpu:
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+now_dir = os.getcwd()
+sys.path.append(now_dir)
+
+import faiss
+import numpy as np
+import torch
+import torch.nn as nn
+from scipy import signal
+
+from config import Config
+import model_loader
+import index_search
+import segmentation
+import stage_timing
+from memory_accounting import MemoryAccountant
+from vc_infer_pipeline import VC, bh, ah
+
+SR = 16000
+TGT_SR = 40000
+
+# SynthesizerTrnMs*NSFsid constructor arguments (same order as cpt["config"]);
+# the upsample rates multiply to the 400 samples per frame of a 40k model
+SYNTH_CONFIGS = {
+    "tiny": [1025, 32, 64, 64, 128, 2, 2, 3, 0, "1", [3, 7], [[1, 3, 5], [1, 3, 5]],
+             [10, 10, 2, 2], 64, [16, 16, 4, 4], 1, 32, TGT_SR],
+    "full": [1025, 32, 192, 192, 768, 2, 6, 3, 0, "1", [3, 7, 11], [[1, 3, 5], [1, 3, 5], [1, 3, 5]],
+             [10, 10, 2, 2], 512, [16, 16, 4, 4], 1, 256, TGT_SR],
+}
+HUBERT_LAYERS = {"tiny": 2, "full": 12}
+
+
+class StandInHubert(nn.Module):
+    """Same interface and frame rate (320 samples per frame) as fairseq's HuBERT base"""
+
+    def __init__(self, n_layers, dim=768):
+        super().__init__()
+        layers = []
+        in_channels = 1
+        # Conv front end of HuBERT base: total stride 5 * 2**6 = 320
+        for kernel, stride in [(10, 5)] + [(3, 2)] * 4 + [(2, 2)] * 2:
+            layers += [nn.Conv1d(in_channels, 512, kernel, stride, bias=False), nn.GELU()]
+            in_channels = 512
+        self.feature_extractor = nn.Sequential(*layers)
+        self.post_extract_proj = nn.Linear(512, dim)
+        self.encoder = nn.TransformerEncoder(
+            nn.TransformerEncoderLayer(dim, 12, dim * 4, dropout=0.0, batch_first=True), n_layers
+        )
+        self.final_proj = nn.Linear(dim, 256)
+
+    def extract_features(self, source, padding_mask=None, output_layer=None):
+        x = self.feature_extractor(source.unsqueeze(1)).transpose(1, 2)
+        x = self.encoder(self.post_extract_proj(x))
+        return x, None
+
+
+def speech_like(seconds, seed):
+    """Harmonic source with a moving f0, three formants, a syllable envelope and pauses"""
+    rng = np.random.RandomState(seed)
+    n = int(seconds * SR)
+    audio = np.zeros(n, dtype=np.float64)
+    pos = int(0.2 * SR)
+    while pos < n:
+        length = min(n - pos, int(rng.uniform(1.5, 5.0) * SR))
+        t = np.arange(length) / SR
+        f0 = rng.uniform(100, 220) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(0.2, 0.6) * t)) \
+            * (1 + 0.01 * np.sin(2 * np.pi * 5.5 * t))
+        phase = 2 * np.pi * np.cumsum(f0) / SR
+        source = sum(np.sin(k * phase) / k * (k * f0 < 7000) for k in range(1, 25))
+        for formant, bandwidth in zip(rng.uniform([500, 1200, 2400], [900, 2000, 3200]), (80, 120, 160)):
+            r = np.exp(-np.pi * bandwidth / SR)
+            source = signal.lfilter([1 - r], [1, -2 * r * np.cos(2 * np.pi * formant / SR), r * r], source)
+        envelope = np.abs(np.sin(np.pi * rng.uniform(3, 5) * t)) ** 0.5
+        audio[pos : pos + length] = source * envelope
+        pos += length + int(rng.uniform(0.3, 0.8) * SR)
+    audio += rng.normal(0, 1e-3, n)
+    return (0.5 * audio / np.max(np.abs(audio))).astype(np.float32)
+
+
+def synthetic_index(path, n_vectors, dim, kind, seed):
+    """Clustered random vectors (like the features of one voice) in a FAISS index file"""
+    rng = np.random.RandomState(seed)
+    centers = rng.normal(0, 1, (64, dim)).astype(np.float32)
+    vectors = centers[rng.randint(0, 64, n_vectors)] + 0.3 * rng.normal(0, 1, (n_vectors, dim)).astype(np.float32)
+    if kind == "ivf":
+        n_list = int(min(4096, max(16, 4 * np.sqrt(n_vectors))))
+        index = faiss.index_factory(dim, "IVF%d,Flat" % n_list)
+        index.train(vectors)
+    else:
+        index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+    faiss.write_index(index, path)
+    return path
+
+
+def build_models(config, version):
+    synth = model_loader.build_synthesizer(list(SYNTH_CONFIGS[args.model_size]), 1, version, False)
+    del synth.enc_q
+    synth = synth.eval().to(config.device).float()
+    hubert = StandInHubert(HUBERT_LAYERS[args.model_size]).eval().to(config.device).float()
+    return hubert, synth
+
+
+def measure(fn):
+    """Best of --repeats runs: wall time, stage breakdown and peak RSS of that run"""
+    best = None
+    for _ in range(max(1, args.repeats)):
+        events = []
+        torch.manual_seed(args.seed)
+        with MemoryAccountant() as accountant, stage_timing.listen(stage_timing.collector(events)), \
+                stage_timing.listen(accountant):
+            t0 = ttime()
+            fn()
+            elapsed = ttime() - t0
+        if best is None or elapsed < best["seconds"]:
+            stages = {}
+            for name, _, seconds, labels in events:
+                key = "%s/%s" % (name, labels["method"]) if "method" in labels else name
+                stages[key] = stages.get(key, 0.0) + seconds
+            best = {
+                "seconds": elapsed,
+                "stages": {k: round(v, 4) for k, v in sorted(stages.items())},
+                "rss_peak_mb": accountant.report()["rss_peak_mb"],
+            }
+    return best
+
+
+def main():
+    config = Config()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    durations = [float(d) for d in args.durations.split(",") if d]
+    f0_methods = [m.strip() for m in args.f0_methods.split(",") if m.strip()]
+    index_sizes = [int(n) for n in args.index_sizes.split(",") if n]
+    versions = [v.strip() for v in args.versions.split(",") if v.strip()]
+    vc = VC(TGT_SR, config)
+    signals = {d: speech_like(d, args.seed) for d in durations}
+    workdir = tempfile.mkdtemp(prefix="rvc_bench_")
+    results = {}
+
+    def run(name, fn, audio_seconds=None):
+        if args.only and args.only not in name:
+            return
+        result = measure(fn)
+        if audio_seconds:
+            result["rtf"] = result["seconds"] / audio_seconds
+        results[name] = result
+        print("%-40s %8.3fs%s  peak RSS %.0fMB" % (
+            name, result["seconds"], "  RTF %.3f" % result["rtf"] if "rtf" in result else "", result["rss_peak_mb"]))
+
+    print("Device: %s, torch threads: %d, model size: %s" % (config.device, torch.get_num_threads(), args.model_size))
+
+    # Split-point search on the high-passed signal
+    for d, audio in signals.items():
+        filtered = signal.filtfilt(bh, ah, audio)
+        for policy in segmentation.SPLIT_POLICIES:
+            run("segmentation/%s/%gs" % (policy, d), lambda policy=policy, filtered=filtered: segmentation.find_split_points(
+                filtered, vc.window, vc.t_center, vc.t_query, vc.t_max, policy=policy), d)
+
+    # f0 over the padded signal, as VC.prepare computes it
+    for d, audio in signals.items():
+        audio_pad = np.pad(audio.astype(np.float64), (vc.t_pad, vc.t_pad), mode="reflect")
+        p_len = audio_pad.shape[0] // vc.window
+        for method in f0_methods:
+            run("f0/%s/%gs" % (method, d), lambda method=method, audio_pad=audio_pad, p_len=p_len: vc.get_f0(
+                audio_pad, p_len, 0, method, 128), d)
+
+    # Index search inside VC.vc (retrieval + blend) on one segment of the shortest signal
+    segment = np.pad(signals[min(durations)][: 10 * SR], (vc.t_pad, vc.t_pad), mode="reflect")
+    for version in versions:
+        hubert, synth = build_models(config, version)
+        dim = 256 if version == "v1" else 768
+        p_len = segment.shape[0] // vc.window
+        pitch = torch.full((1, p_len), 100, dtype=torch.long, device=config.device)
+        pitchf = torch.full((1, p_len), 150.0, device=config.device)
+        sid = torch.tensor([0], device=config.device)
+        for n_vectors in index_sizes:
+            for kind in ("flat", "ivf"):
+                path = synthetic_index(os.path.join(workdir, "%s_%s_%d.index" % (version, kind, n_vectors)), n_vectors, dim, kind, args.seed)
+                index, big_npy = vc.load_index(path)
+                # Label by what load_index returned: small indexes become an exact torch scan
+                # whatever FAISS type they were built as, so the ivf run would repeat the flat one
+                if isinstance(index, index_search.TorchIndex):
+                    if kind != "flat":
+                        continue
+                    engine = "torch"
+                else:
+                    engine = "faiss-" + kind
+                run("index/%s/%s-%d" % (version, engine, n_vectors), lambda index=index, big_npy=big_npy: vc.vc(
+                    hubert, synth, sid, segment, pitch, pitchf, [0, 0, 0], index, big_npy, 0.75, version))
+
+        # End to end
+        index_file = synthetic_index(os.path.join(workdir, "%s_pipeline.index" % version), index_sizes[0], dim, "flat", args.seed)
+        for d, audio in signals.items():
+            run("pipeline/%s/%gs" % (version, d), lambda audio=audio, version=version: vc.pipeline(
+                hubert, synth, 0, audio, [0, 0, 0], 0, args.pipeline_f0, index_file, 0.75, 1, version, 128,
+                precision="fp32", seed=args.seed), d)
+
+    report = {
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "device": str(config.device),
+        },
+        "settings": {
+            "model_size": args.model_size,
+            "repeats": args.repeats,
+            "pipeline_f0": args.pipeline_f0,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(report, f, indent=2)
+        print("Report written to %s" % args.output_json)
+    if args.baseline:
+        sys.exit(1 if compare(report, args.baseline) else 0)
+
+
+def compare(report, baseline_path):
+    """Print current / baseline time ratios; returns the names of the regressions"""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != report["settings"]:
+        print("Warning: baseline settings differ: %s" % baseline.get("settings"))
+    if baseline.get("machine", {}).get("processor") != report["machine"]["processor"]:
+        print("Warning: baseline was recorded on another processor")
+    regressions = []
+    print("\n%-40s %10s %10s %8s" % ("benchmark", "baseline", "current", "ratio"))
+    for name, result in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print("%-40s %10s %9.3fs %8s" % (name, "-", result["seconds"], "new"))
+            continue
+        ratio = result["seconds"] / base["seconds"] if base["seconds"] > 0 else float("inf")
+        flag = ""
+        if ratio > 1 + args.tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - args.tolerance:
+            flag = "  faster"
+        print("%-40s %9.3fs %9.3fs %7.2fx%s" % (name, base["seconds"], result["seconds"], ratio, flag))
+    print("\n%d regression(s) above %.0f%%" % (len(regressions), args.tolerance * 100))
+    return regressions
+
+
+if __name__ == "__main__":
+    main()
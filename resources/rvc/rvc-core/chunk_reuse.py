@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import threading
+from time import time as ttime
+
+import numpy as np
+
+import compact_index
+import stage_timing
+
+# Fork Feature: reuse converted segments across re-conversions of near-identical audio.
+# With split_policy="content" (segmentation.py) the cut points follow the audio content, so
+# a re-recorded take, a re-export with one section fixed or a podcast with the same intro
+# keeps most of its segments unchanged. Each segment is identified by the sha256 of its
+# decoded PCM (the raw 16 kHz input, before the high-pass) plus the t_pad context on both
+# sides that HuBERT and net_g see, together with every conversion parameter that changes the
+# output (model and retrieved index files, f0 method, transposition, index rate, precision, backend...).
+# Segments already in the ChunkStore are taken as they are; only the others go through
+# HuBERT / net_g. f0 and the split points are still computed over the whole file.
+#
+# Keys use the unrounded cut points, so an insertion that is not a multiple of the 160-sample
+# frame still finds its unchanged segments; their stored output may then be off by less than
+# one frame (10 ms) relative to a fresh conversion, at cuts that sit in pauses.
+
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3
+
+_digests = {}  # (path, size, mtime) -> sha256
+_digest_lock = threading.Lock()
+
+
+def file_digest(path):
+    """sha256 of a file, memoized by path, size and mtime"""
+    stat = os.stat(path)
+    memo_key = (str(path), stat.st_size, stat.st_mtime)
+    with _digest_lock:
+        if memo_key in _digests:
+            return _digests[memo_key]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    with _digest_lock:
+        _digests[memo_key] = digest.hexdigest()
+    return _digests[memo_key]
+
+
+def model_digest(model_file, index_file=""):
+    """Identity of a voice: its .pth and (when there is one) its .index"""
+    parts = [file_digest(model_file)] + ([file_digest(index_file)] if index_file else [])
+    return hashlib.sha256(":".join(parts).encode()).hexdigest()
+
+
+def conversion_params(vc, model_file, index_file, version, tgt_sr, if_f0, f0_up_key, f0_method, index_rate, precision, backend_name):
+    """Everything besides the audio that changes a converted segment"""
+    # The index VC.load_index actually retrieves from: compacting a voice changes its output
+    index_file = compact_index.resolve_index_file(index_file)
+    return {
+        "model": model_digest(model_file, index_file),
+        "version": version,
+        "tgt_sr": tgt_sr,
+        "if_f0": if_f0,
+        "f0_up_key": f0_up_key,
+        "f0_method": f0_method,
+        "index_rate": index_rate if index_file else 0,
+        "precision": precision,
+        "backend": backend_name,
+        "x_pad": vc.x_pad,
+    }
+
+
+def chunk_keys(raw_audio, opt_ts, t_pad, params):
+    """Key of every segment between consecutive split points (same order as VC.segment_bounds)"""
+    raw_pad = np.pad(np.asarray(raw_audio, dtype=np.float32), (t_pad, t_pad), mode="reflect")
+    settings = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    cuts = [0] + [int(t) for t in opt_ts] + [len(raw_audio)]
+    keys = []
+    for start, end in zip(cuts[:-1], cuts[1:]):
+        digest = hashlib.sha256(settings)
+        # Padded coordinates: the segment plus t_pad of context on each side
+        digest.update(raw_pad[start : end + 2 * t_pad].tobytes())
+        keys.append(digest.hexdigest())
+    return keys, [(end - start) / 16000.0 for start, end in zip(cuts[:-1], cuts[1:])]
+
+
+class ChunkStore(object):
+    """Converted segments on disk (.npz: audio + conversion seconds), LRU by mtime above max_bytes"""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
+        """(audio, seconds it took to convert) or None"""
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                entry = data["audio"], float(data["seconds"])
+            os.utime(path)
+            return entry
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def put(self, key, audio, seconds):
+        path = self.path(key)
+        # Pool workers share the directory: the name is unique per process and thread
+        partial = "%s.%d.%d.part" % (path, os.getpid(), threading.get_ident())
+        with open(partial, "wb") as f:
+            np.savez(f, audio=np.asarray(audio), seconds=np.float64(seconds))
+        os.replace(partial, path)
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".npz"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+def convert_with_reuse(
+    vc,
+    store,
+    params,
+    raw_audio,
+    prepared,
+    model,
+    net_g,
+    sid,
+    times,
+    version,
+    precision=None,
+    backend=None,
+    seed=None,
+    segment_callback=None,
+):
+    """VC.convert over a prepare() result, reusing stored segments; returns (audio, report)"""
+    start = ttime()
+    bounds = vc.segment_bounds(prepared["opt_ts"])
+    with stage_timing.stage("chunk_lookup", segments=len(bounds)):
+        keys, durations = chunk_keys(raw_audio, prepared["opt_ts"], vc.t_pad, params)
+        outputs = [store.get(key) for key in keys]
+    missing = [i for i, output in enumerate(outputs) if output is None]
+
+    for n, i in enumerate(missing):
+        t0 = [ttime()]
+
+        def callback(_i, _total, n=n, t0=t0):
+            # Progress / cancellation / preemption counted over the segments actually converted;
+            # the clock restarts afterwards so time spent preempted is not stored as conversion time
+            if segment_callback is not None:
+                segment_callback(n, len(missing))
+            t0[0] = ttime()
+
+        seeds = None if seed is None else [seed + i]
+        audio = vc.convert_segments(model, net_g, sid, prepared, [bounds[i]], times, version, precision, backend, seeds, callback)[0]
+        seconds = ttime() - t0[0]
+        store.put(keys[i], audio, seconds)
+        outputs[i] = (audio, seconds)
+
+    reused = sorted(set(range(len(bounds))) - set(missing))
+    total_s = sum(durations)
+    reused_s = sum(durations[i] for i in reused)
+    report = {
+        "segments": len(bounds),
+        "reused_segments": len(reused),
+        "reuse_ratio": round(reused_s / total_s, 3) if total_s else 0.0,
+        "reused_audio_s": round(reused_s, 2),
+        "converted_audio_s": round(total_s - reused_s, 2),
+        # Conversion time the reused segments took when they were stored
+        "saved_s": round(sum(outputs[i][1] for i in reused), 2),
+        "convert_s": round(ttime() - start, 2),
+    }
+    return np.concatenate([audio for audio, _ in outputs]), report
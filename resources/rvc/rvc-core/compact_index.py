@@ -0,0 +1,188 @@
+"""
+Index compaction - rebuilds a voice's .index into a compact IVF (optionally PQ) index.
+
+Downloaded voices often ship flat or lightly clustered indexes with hundreds of
+thousands of vectors. Large sets are first reduced to k-means centroids (as RVC's own
+training does above 2e5 vectors), then indexed with IVF and the smallest nprobe that
+reaches the target recall. The result is written next to the original as
+<name>.compact.index (+ <name>.compact.json with the recall / size / timing report)
+and VC.pipeline uses it automatically whenever it is newer than the original.
+
+Usage (CWD = RVC-GUI directory, or any directory with faiss installed):
+python compact_index.py models/MyVoice
+python compact_index.py models/MyVoice/added_IVF256_Flat_nprobe_1.index --centroids 8000 --pq 32
+"""
+import argparse
+import json
+import os
+from time import time as ttime
+
+import faiss
+import numpy as np
+
+COMPACT_SUFFIX = ".compact.index"
+# Below this size a compact index does not pay off
+MIN_VECTORS = 50000
+# Above this size the vectors are reduced to k-means centroids first
+KMEANS_THRESHOLD = 200000
+KMEANS_CENTROIDS = 10000
+NPROBE_CANDIDATES = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def is_compact(index_path):
+    return str(index_path).endswith(COMPACT_SUFFIX)
+
+
+def compact_path(index_path):
+    return os.path.splitext(str(index_path))[0] + COMPACT_SUFFIX
+
+
+def resolve_index_file(file_index):
+    """Compacted index to use instead of file_index, when one exists and is up to date"""
+    if not file_index or is_compact(file_index):
+        return file_index
+    candidate = compact_path(file_index)
+    if os.path.exists(candidate) and os.path.getmtime(candidate) >= os.path.getmtime(file_index):
+        return candidate
+    return file_index
+
+
+def find_index_file(model_path):
+    if not os.path.isdir(model_path):
+        return model_path
+    index_files = sorted(
+        f for f in os.listdir(model_path) if f.endswith(".index") and not is_compact(f)
+    )
+    if not index_files:
+        raise Exception("No .index file found in: %s" % model_path)
+    return os.path.join(model_path, index_files[0])
+
+
+def blend(vectors, score, ix):
+    # Same inverse-square weighting as VC.vc
+    weight = np.square(1 / np.maximum(score, 1e-12))
+    weight /= weight.sum(axis=1, keepdims=True)
+    return np.sum(vectors[ix] * np.expand_dims(weight, axis=2), axis=1)
+
+
+def timed_search(index, queries, k):
+    t0 = ttime()
+    score, ix = index.search(queries, k)
+    return score, ix, (ttime() - t0) / len(queries)
+
+
+def compact_index(
+    index_path,
+    centroids=None,
+    pq=0,
+    target_recall=0.95,
+    k=8,
+    n_queries=2000,
+    seed=0,
+):
+    index = faiss.read_index(str(index_path))
+    vectors = index.reconstruct_n(0, index.ntotal).astype(np.float32)
+    n, d = vectors.shape
+    rng = np.random.RandomState(seed)
+    queries = vectors[rng.choice(n, size=min(n_queries, n), replace=False)]
+    queries = queries + rng.normal(scale=0.05 * vectors.std(), size=queries.shape).astype(np.float32)
+
+    # Reference: exact search over the full original vector set
+    exact_original = faiss.IndexFlatL2(d)
+    exact_original.add(vectors)
+    ref_score, ref_ix = exact_original.search(queries, k)
+    ref_blend = blend(vectors, ref_score, ref_ix)
+    _, _, original_seconds = timed_search(index, queries, k)
+
+    if centroids is None:
+        centroids = KMEANS_CENTROIDS if n > KMEANS_THRESHOLD else 0
+    if centroids and n > centroids:
+        print("k-means: %d -> %d vectors" % (n, centroids))
+        kmeans = faiss.Kmeans(d, int(centroids), niter=20, seed=seed, verbose=False)
+        kmeans.train(vectors)
+        compact_vectors = kmeans.centroids.astype(np.float32)
+    else:
+        compact_vectors = vectors
+
+    m = compact_vectors.shape[0]
+    nlist = max(1, min(int(16 * np.sqrt(m)), m // 39))
+    factory = "IVF%d,PQ%dx8" % (nlist, pq) if pq else "IVF%d,Flat" % nlist
+    print("Building %s over %d vectors" % (factory, m))
+    compact = faiss.index_factory(d, factory)
+    compact.train(compact_vectors)
+    compact.add(compact_vectors)
+
+    # Tune nprobe against exact search over the compact vector set
+    exact_compact = faiss.IndexFlatL2(d)
+    exact_compact.add(compact_vectors)
+    _, truth = exact_compact.search(queries, k)
+    ivf = faiss.extract_index_ivf(compact)
+    tuning = []
+    for nprobe in NPROBE_CANDIDATES:
+        if nprobe > nlist:
+            break
+        ivf.nprobe = nprobe
+        _, ix, seconds = timed_search(compact, queries, k)
+        recall = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ix, truth)]))
+        tuning.append({"nprobe": nprobe, "recall_at_k": recall, "seconds_per_query": seconds})
+        if recall >= target_recall:
+            break
+    ivf.nprobe = tuning[-1]["nprobe"]
+
+    # Recall against the original: how close the blended retrieval stays
+    score, ix, compact_seconds = timed_search(compact, queries, k)
+    compact_blend = blend(compact_vectors, score, ix)
+    cosine = np.sum(ref_blend * compact_blend, axis=1) / (
+        np.linalg.norm(ref_blend, axis=1) * np.linalg.norm(compact_blend, axis=1) + 1e-12
+    )
+    report = {
+        "source": os.path.basename(str(index_path)),
+        "factory": factory,
+        "original_vectors": int(n),
+        "compact_vectors": int(m),
+        "nprobe": int(ivf.nprobe),
+        "recall_at_k": tuning[-1]["recall_at_k"],
+        "blend_cosine_mean": float(np.mean(cosine)),
+        "blend_cosine_p05": float(np.percentile(cosine, 5)),
+        "original_bytes": int(os.path.getsize(str(index_path))),
+        "original_seconds_per_query": original_seconds,
+        "compact_seconds_per_query": compact_seconds,
+        "tuning": tuning,
+        "k": k,
+    }
+
+    out_path = compact_path(index_path)
+    tmp_path = out_path + ".tmp"
+    faiss.write_index(compact, tmp_path)
+    os.replace(tmp_path, out_path)
+    report["compact_bytes"] = int(os.path.getsize(out_path))
+    with open(os.path.splitext(out_path)[0] + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+    return out_path, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact a voice .index (k-means + IVF/PQ)")
+    parser.add_argument("model_path", help="Voice folder or .index file")
+    parser.add_argument("--centroids", type=int, default=None, help="k-means centroids (0 = keep all vectors)")
+    parser.add_argument("--pq", type=int, default=0, help="PQ sub-quantizers (0 = IVF,Flat)")
+    parser.add_argument("--target_recall", type=float, default=0.95)
+    parser.add_argument("--min_vectors", type=int, default=MIN_VECTORS, help="Skip indexes smaller than this")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if small or up to date")
+    args = parser.parse_args()
+
+    index_path = find_index_file(args.model_path)
+    if not args.force and resolve_index_file(index_path) != index_path:
+        print("Compact index is up to date: %s" % compact_path(index_path))
+        return
+    ntotal = faiss.read_index(index_path).ntotal
+    if not args.force and ntotal < args.min_vectors:
+        print("Index has %d vectors, nothing to compact" % ntotal)
+        return
+    out_path, report = compact_index(index_path, args.centroids, args.pq, args.target_recall)
+    print(json.dumps(report, indent=2))
+    print("Compact index written to: %s" % out_path)
+
+
+if __name__ == "__main__":
+    main()
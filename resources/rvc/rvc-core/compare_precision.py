@@ -0,0 +1,170 @@
+"""
+Compare the CPU precision modes (fp32 / int8 / bf16) on one conversion.
+
+Runs the same input through VC.pipeline once per mode on CPU and reports the
+speedup and the spectral / f0 deviation of every mode against the fp32 output.
+
+Must be executed with CWD = RVC-GUI directory (hubert_base.pt, infer_pack):
+python compare_precision.py --input voice.wav --model_path models/MyVoice --f0_method pm
+"""
+import argparse
+import json
+import os
+import sys
+from time import time as ttime
+
+parser = argparse.ArgumentParser(description="Compare CPU precision modes against fp32")
+parser.add_argument("--input", required=True, help="Input audio file")
+parser.add_argument("--model_path", required=True, help="Model folder (.pth + optional .index) or .pth file")
+parser.add_argument("--modes", default="fp32,int8,bf16", help="Comma separated precision modes")
+parser.add_argument("--f0_method", default="pm", help="f0 method used for the conversion")
+parser.add_argument("--pitch", type=int, default=0)
+parser.add_argument("--index_rate", type=float, default=0.75)
+parser.add_argument("--repeats", type=int, default=2, help="Timed runs per mode (best is kept)")
+parser.add_argument("--seed", type=int, default=114514, help="Seed applied before every run")
+parser.add_argument("--output_json", default=None, help="Write the report to this file")
+parser.add_argument("--save_audio", default=None, help="Folder where each mode's output is written")
+args = parser.parse_args()
+# Config() parses sys.argv on its own; keep it away from our arguments
+sys.argv = [sys.argv[0]]
+# The comparison is about the CPU path
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+now_dir = os.getcwd()
+sys.path.append(now_dir)
+
+import numpy as np
+import parselmouth
+import soundfile as sf
+import torch
+from scipy import signal
+
+from config import Config
+from my_utils import load_audio
+import cpu_precision
+import model_loader
+
+
+def find_model_files(model_path):
+    if not os.path.isdir(model_path):
+        return model_path, ""
+    pth_files = [f for f in os.listdir(model_path) if f.endswith(".pth") and not f.startswith(("G_", "D_"))]
+    if not pth_files:
+        raise Exception("No .pth file found in: %s" % model_path)
+    index_files = [f for f in os.listdir(model_path) if f.endswith(".index")]
+    index_file = os.path.join(model_path, index_files[0]) if index_files else ""
+    return os.path.join(model_path, pth_files[0]), index_file
+
+
+def log_spectral_distance(ref, out, sr):
+    n = min(len(ref), len(out))
+    _, _, s_ref = signal.stft(ref[:n], sr, nperseg=1024, noverlap=768)
+    _, _, s_out = signal.stft(out[:n], sr, nperseg=1024, noverlap=768)
+    p_ref = 10 * np.log10(np.abs(s_ref) ** 2 + 1e-10)
+    p_out = 10 * np.log10(np.abs(s_out) ** 2 + 1e-10)
+    diff = p_ref - p_out
+    return {
+        "lsd_db": float(np.mean(np.sqrt(np.mean(diff ** 2, axis=0)))),
+        "mean_abs_db": float(np.mean(np.abs(diff))),
+    }
+
+
+def f0_track(x, sr):
+    return (
+        parselmouth.Sound(x.astype(np.float64), sr)
+        .to_pitch_ac(time_step=0.01, voicing_threshold=0.6, pitch_floor=50, pitch_ceiling=1100)
+        .selected_array["frequency"]
+    )
+
+
+def f0_deviation(ref, out, sr):
+    f_ref, f_out = f0_track(ref, sr), f0_track(out, sr)
+    n = min(len(f_ref), len(f_out))
+    f_ref, f_out = f_ref[:n], f_out[:n]
+    voiced_ref, voiced_out = f_ref > 0, f_out > 0
+    both = voiced_ref & voiced_out
+    cents = 1200 * np.log2(f_out[both] / f_ref[both]) if both.any() else np.zeros(0)
+    return {
+        "f0_rmse_cents": float(np.sqrt(np.mean(cents ** 2))) if cents.size else 0.0,
+        "f0_gross_error_rate": float(np.mean(np.abs(cents) > 50)) if cents.size else 0.0,
+        "voicing_mismatch_rate": float(np.mean(voiced_ref != voiced_out)) if n else 0.0,
+    }
+
+
+def main():
+    config = Config()
+    model_file, index_file = find_model_files(args.model_path)
+    audio = load_audio(args.input, 16000)
+    duration = len(audio) / 16000
+
+    print("Loading models (fp32 reference)...")
+    hubert = model_loader.load_hubert(os.path.join(now_dir, "hubert_base.pt"), config)
+    model_data = model_loader.load_synthesizer(model_file, config)
+
+    results = {}
+    outputs = {}
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        resolved = cpu_precision.resolve_precision(mode, config.device)
+        if resolved != mode:
+            print("Skipping %s (not available on this machine)" % mode)
+            results[mode] = {"skipped": True}
+            continue
+        mode_hubert = cpu_precision.prepare_hubert(hubert, mode)
+        mode_net_g = cpu_precision.prepare_synthesizer(model_data["net_g"], mode)
+        best = None
+        for _ in range(max(1, args.repeats)):
+            times = [0, 0, 0]
+            torch.manual_seed(args.seed)
+            t0 = ttime()
+            audio_opt = model_data["vc"].pipeline(
+                mode_hubert,
+                mode_net_g,
+                0,
+                audio,
+                times,
+                args.pitch,
+                args.f0_method,
+                index_file,
+                args.index_rate,
+                model_data["if_f0"],
+                model_data["version"],
+                128,
+                None,
+                precision=mode,
+            )
+            elapsed = ttime() - t0
+            if best is None or elapsed < best["seconds"]:
+                best = {"seconds": elapsed, "npy": times[0], "f0": times[1], "infer": times[2]}
+        best["rtf"] = best["seconds"] / duration
+        results[mode] = best
+        outputs[mode] = audio_opt.astype(np.float32)
+        if args.save_audio:
+            os.makedirs(args.save_audio, exist_ok=True)
+            sf.write(os.path.join(args.save_audio, "%s.wav" % mode), audio_opt, model_data["tgt_sr"])
+        print("%s: %.2fs (RTF %.3f)" % (mode, best["seconds"], best["rtf"]))
+
+    if "fp32" in outputs:
+        ref = outputs["fp32"]
+        for mode, out in outputs.items():
+            results[mode]["speedup"] = results["fp32"]["seconds"] / results[mode]["seconds"]
+            if mode == "fp32":
+                continue
+            results[mode].update(log_spectral_distance(ref, out, model_data["tgt_sr"]))
+            results[mode].update(f0_deviation(ref, out, model_data["tgt_sr"]))
+
+    report = {
+        "input": args.input,
+        "model": model_file,
+        "duration": duration,
+        "f0_method": args.f0_method,
+        "bf16_supported": cpu_precision.cpu_supports_bf16(),
+        "torch_threads": torch.get_num_threads(),
+        "modes": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
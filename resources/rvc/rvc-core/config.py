@@ -4,6 +4,8 @@ import sys
 import torch
 from multiprocessing import cpu_count
 
+import cpu_precision
+
 
 class Config:
     def __init__(self):
@@ -20,6 +22,7 @@ class Config:
             self.noautoopen,
             self.use_gfloat,
             self.paperspace,
+            self.cpu_precision,
         ) = self.arg_parse()
         
         if self.use_gfloat: 
@@ -48,6 +51,16 @@ class Config:
         parser.add_argument( # Fork Feature. Paperspace integration for web UI
             "--paperspace", action="store_true", help="Note that this argument just shares a gradio link for the web UI. Thus can be used on other non-local CLI systems."
         )
+        # argparse does not check defaults against choices, so the env value is validated here
+        try:
+            default_cpu_precision = cpu_precision.default_precision()
+        except ValueError as e:
+            parser.error(str(e))
+        parser.add_argument( # Fork Feature. Reduced precision modes for CPU inference (see cpu_precision.py)
+            "--cpu_precision", type=str, choices=list(cpu_precision.PRECISION_MODES),
+            default=default_cpu_precision,
+            help="Precision used when running on CPU: fp32 (default), int8 (dynamic quantization) or bf16 (autocast).",
+        )
         cmd_opts = parser.parse_args()
 
         cmd_opts.port = cmd_opts.port if 0 <= cmd_opts.port <= 65535 else 7865
@@ -60,6 +73,7 @@ class Config:
             cmd_opts.noautoopen,
             cmd_opts.use_gfloat,
             cmd_opts.paperspace,
+            cmd_opts.cpu_precision,
         )
 
     def device_config(self) -> tuple:
@@ -0,0 +1,95 @@
+import contextlib
+import copy
+import os
+
+import torch
+
+# Fork Feature: opt-in reduced precision modes for CPU inference.
+# On CPU Config forces is_half = False, so HuBERT and the synthesizer run in fp32.
+#   fp32 - reference path (also what every non-CPU device keeps using)
+#   int8 - dynamic int8 quantization of nn.Linear layers (weights int8, activations quantized on the fly)
+#   bf16 - torch.autocast on CPU with bfloat16, only on CPUs with native bf16 support
+PRECISION_MODES = ("fp32", "int8", "bf16")
+
+_bf16_supported = None
+
+
+def cpu_supports_bf16() -> bool:
+    global _bf16_supported
+    if _bf16_supported is not None:
+        return _bf16_supported
+    supported = False
+    try:
+        supported = bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        # Older torch builds: look for the instruction set flags directly
+        try:
+            with open("/proc/cpuinfo", "r") as f:
+                flags = f.read()
+            supported = "avx512_bf16" in flags or "amx_bf16" in flags
+        except OSError:
+            supported = False
+    _bf16_supported = supported
+    return supported
+
+
+def resolve_precision(precision, device) -> str:
+    """Normalize a requested mode; non-CPU devices and unsupported bf16 fall back to fp32"""
+    precision = (precision or "fp32").lower()
+    if precision not in PRECISION_MODES:
+        raise ValueError(
+            "Unknown precision '%s' (expected one of: %s)" % (precision, ", ".join(PRECISION_MODES))
+        )
+    if not str(device).startswith("cpu"):
+        return "fp32"
+    if precision == "bf16" and not cpu_supports_bf16():
+        print("bf16 is not supported by this CPU, using fp32")
+        return "fp32"
+    return precision
+
+
+def default_precision() -> str:
+    """Mode from RVC_CPU_PRECISION (fp32 when unset); an unknown value raises ValueError"""
+    precision = os.environ.get("RVC_CPU_PRECISION", "fp32").lower()
+    if precision not in PRECISION_MODES:
+        raise ValueError(
+            "RVC_CPU_PRECISION='%s' is not a known precision (expected one of: %s)"
+            % (precision, ", ".join(PRECISION_MODES))
+        )
+    return precision
+
+
+def prepare_hubert(model, precision):
+    """Return the HuBERT module to use for the given (resolved) precision"""
+    if precision != "int8":
+        return model
+    model = copy.deepcopy(model).float().cpu()
+    # fairseq's MultiheadAttention hands q/k/v/out_proj.weight straight to
+    # F.multi_head_attention_forward, which does not work with the packed weights
+    # of dynamically quantized Linear layers. The onnx_trace path calls the
+    # projection modules instead.
+    for module in model.modules():
+        if hasattr(module, "q_proj") and hasattr(module, "onnx_trace"):
+            module.onnx_trace = True
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model.eval()
+
+
+def prepare_synthesizer(net_g, precision):
+    """Return the synthesizer module to use for the given (resolved) precision"""
+    if precision != "int8":
+        return net_g
+    net_g = copy.deepcopy(net_g).float().cpu()
+    # Only the text encoder is quantized. The flow and the NSF decoder are convolutional
+    # (not covered by dynamic quantization), and the harmonic source merge (m_source.l_linear)
+    # is kept in fp32 because it directly shapes the excitation signal.
+    net_g.enc_p = torch.quantization.quantize_dynamic(
+        net_g.enc_p, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+    return net_g.eval()
+
+
+def autocast(precision):
+    if precision == "bf16":
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
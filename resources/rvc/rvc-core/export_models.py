@@ -0,0 +1,212 @@
+"""
+Export HuBERT and voice synthesizers to frozen TorchScript / ONNX artifacts.
+
+The artifacts are picked up by infer_backend.create_backend ("torchscript" / "onnx").
+Every export is checked against the eager modules (the reference implementation) on
+two input lengths, one of them different from the length used for tracing, so graphs
+that baked a fixed size in are rejected. The parity report is stored in
+<voice>.backend.json next to the synthesizer artifact.
+
+Must be executed with CWD = RVC-GUI directory (hubert_base.pt, infer_pack):
+python export_models.py --hubert --format onnx
+python export_models.py --model_path models/MyVoice --format both
+"""
+import argparse
+import json
+import os
+import sys
+
+parser = argparse.ArgumentParser(description="Export RVC models to TorchScript / ONNX")
+parser.add_argument("--model_path", default=None, help="Voice folder or .pth file to export")
+parser.add_argument("--hubert", action="store_true", help="Export hubert_base.pt (v1 and v2 feature heads)")
+parser.add_argument("--format", default="onnx", choices=["torchscript", "onnx", "both"])
+parser.add_argument("--opset", type=int, default=17)
+parser.add_argument("--hubert_tol", type=float, default=1e-3, help="Max relative L2 error for HuBERT features")
+parser.add_argument("--synth_tol_db", type=float, default=1.5, help="Max log-spectral distance (dB) for the synthesizer")
+args = parser.parse_args()
+sys.argv = [sys.argv[0]]
+# Artifacts are exported in fp32 on CPU
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+now_dir = os.getcwd()
+sys.path.append(now_dir)
+
+import numpy as np
+import torch
+from scipy import signal
+
+from config import Config
+import infer_backend
+import model_loader
+
+
+def export_module(module, example_inputs, input_names, dynamic_axes, path, kind):
+    tmp_path = path + ".tmp"
+    with torch.no_grad():
+        if kind == "torchscript":
+            traced = torch.jit.trace(module, example_inputs, check_trace=False)
+            traced = torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+            torch.jit.save(traced, tmp_path)
+        else:
+            torch.onnx.export(
+                module,
+                example_inputs,
+                tmp_path,
+                input_names=input_names,
+                output_names=["output"],
+                dynamic_axes=dynamic_axes,
+                opset_version=args.opset,
+                do_constant_folding=True,
+            )
+    os.replace(tmp_path, path)
+
+
+def relative_error(ref, out):
+    ref, out = np.asarray(ref, dtype=np.float64), np.asarray(out, dtype=np.float64)
+    return float(np.linalg.norm(ref - out) / (np.linalg.norm(ref) + 1e-12))
+
+
+def log_spectral_distance(ref, out):
+    n = min(len(ref), len(out))
+    _, _, s_ref = signal.stft(ref[:n], nperseg=1024, noverlap=768)
+    _, _, s_out = signal.stft(out[:n], nperseg=1024, noverlap=768)
+    diff = 10 * np.log10(np.abs(s_ref) ** 2 + 1e-10) - 10 * np.log10(np.abs(s_out) ** 2 + 1e-10)
+    return float(np.mean(np.sqrt(np.mean(diff ** 2, axis=0))))
+
+
+def load_artifact(kind, path, input_names):
+    if kind == "torchscript":
+        module = torch.jit.load(path, map_location="cpu")
+        return lambda *inputs: module(*inputs).numpy()
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    # ONNX drops graph inputs that are not used (e.g. pitch for the nono models)
+    available = set(i.name for i in session.get_inputs())
+
+    def run(*inputs):
+        feed = {name: x.numpy() for name, x in zip(input_names, inputs) if name in available}
+        return session.run(None, feed)[0]
+
+    return run
+
+
+def speech_like(seconds, sr=16000, seed=0):
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    x = sum(np.sin(k * phase) / k for k in range(1, 8)) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2)
+    return (0.3 * x + 0.01 * rng.randn(len(t))).astype(np.float32), f0
+
+
+def export_hubert(config, kinds):
+    hubert = model_loader.load_hubert(os.path.join(now_dir, "hubert_base.pt"), config)
+    report = {}
+    for version in ("v1", "v2"):
+        wrapper = infer_backend.HubertFeatureExtractor(hubert, version).eval()
+        example = torch.from_numpy(speech_like(2.0)[0]).view(1, -1)
+        for kind in kinds:
+            path, _, _ = infer_backend.artifact_paths(kind, "unused", now_dir)
+            path = path[version]
+            print("Exporting HuBERT %s -> %s" % (version, path))
+            export_module(wrapper, (example,), ["source"], {"source": {1: "samples"}, "output": {1: "frames"}}, path, kind)
+            run = load_artifact(kind, path, ["source"])
+            errors = []
+            for seconds in (2.0, 3.3):
+                source = torch.from_numpy(speech_like(seconds, seed=1)[0]).view(1, -1)
+                with torch.no_grad():
+                    ref = wrapper(source).numpy()
+                errors.append(relative_error(ref, run(source)))
+            passed = max(errors) <= args.hubert_tol
+            report["%s/%s" % (kind, version)] = {"relative_error": errors, "passed": passed}
+            print("  parity: relative error %s -> %s" % (["%.2e" % e for e in errors], "OK" if passed else "FAILED"))
+            if not passed:
+                os.remove(path)
+    return report
+
+
+def export_voice(config, kinds):
+    model_file = args.model_path
+    if os.path.isdir(model_file):
+        pth_files = [f for f in os.listdir(model_file) if f.endswith(".pth") and not f.startswith(("G_", "D_"))]
+        if not pth_files:
+            raise Exception("No .pth file found in: %s" % model_file)
+        model_file = os.path.join(model_file, pth_files[0])
+    model_data = model_loader.load_synthesizer(model_file, config)
+    net_g = model_data["net_g"]
+    wrapper = infer_backend.SynthesizerInfer(net_g, model_data["if_f0"]).eval()
+    feat_dim = 256 if model_data["version"] == "v1" else 768
+
+    def example_inputs(frames, seed):
+        gen = torch.Generator().manual_seed(seed)
+        _, f0 = speech_like(frames / 100.0, seed=seed)
+        f0 = torch.from_numpy(f0[::160][:frames].astype(np.float32)).view(1, -1)
+        f0_mel = 1127 * torch.log(1 + f0 / 700)
+        pitch = torch.clamp(
+            (f0_mel - 1127 * np.log(1 + 50 / 700)) * 254 / (1127 * np.log(1 + 1100 / 700) - 1127 * np.log(1 + 50 / 700)) + 1,
+            1,
+            255,
+        ).round().long()
+        return (
+            torch.randn(1, frames, feat_dim, generator=gen),
+            torch.tensor([frames]).long(),
+            pitch,
+            f0,
+            torch.tensor([0]).long(),
+            torch.randn(1, net_g.inter_channels, frames, generator=gen) * 0.66666,
+        )
+
+    report = {
+        "version": model_data["version"],
+        "if_f0": model_data["if_f0"],
+        "inter_channels": int(net_g.inter_channels),
+        "tgt_sr": int(model_data["tgt_sr"]),
+        "parity": {},
+    }
+    names = ["phone", "phone_lengths", "pitch", "nsff0", "sid", "rnd"]
+    dynamic_axes = {"phone": {1: "frames"}, "pitch": {1: "frames"}, "nsff0": {1: "frames"}, "rnd": {2: "frames"}, "output": {2: "samples"}}
+    exported = []
+    for kind in kinds:
+        _, path, meta_path = infer_backend.artifact_paths(kind, model_file, now_dir)
+        print("Exporting %s -> %s" % (os.path.basename(model_file), path))
+        export_module(wrapper, example_inputs(200, 0), names, dynamic_axes, path, kind)
+        run = load_artifact(kind, path, names)
+        distances = []
+        for frames, seed in ((200, 1), (317, 2)):
+            inputs = example_inputs(frames, seed)
+            torch.manual_seed(seed)
+            with torch.no_grad():
+                ref = wrapper(*inputs).numpy()[0, 0]
+            torch.manual_seed(seed)
+            distances.append(log_spectral_distance(ref, run(*inputs)[0, 0]))
+        passed = max(distances) <= args.synth_tol_db
+        report["parity"][kind] = {"lsd_db": distances, "passed": passed}
+        print("  parity: log-spectral distance %s dB -> %s" % (["%.3f" % d for d in distances], "OK" if passed else "FAILED"))
+        if passed:
+            exported.append(meta_path)
+        else:
+            os.remove(path)
+    for meta_path in set(exported):
+        with open(meta_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def main():
+    if not args.hubert and not args.model_path:
+        parser.error("nothing to export: use --hubert and/or --model_path")
+    config = Config()
+    kinds = ["torchscript", "onnx"] if args.format == "both" else [args.format]
+    report = {}
+    if args.hubert:
+        report["hubert"] = export_hubert(config, kinds)
+    if args.model_path:
+        report["voice"] = export_voice(config, kinds)
+    print(json.dumps(report, indent=2))
+    failed = [k for k, v in report.get("hubert", {}).items() if not v["passed"]]
+    failed += [k for k, v in report.get("voice", {}).get("parity", {}).items() if not v["passed"]]
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import queue
+import threading
+from time import time as ttime
+
+import torch
+
+# Fork Feature: cross-request micro-batching of HuBERT feature extraction.
+# Concurrent conversions (server threads) each call extract_features with batch size 1.
+# HubertBatcher collects the pending calls for a few milliseconds and runs them as one
+# forward pass, then hands each caller its own features back.
+#
+# The batch is not a plain zero-padded waveform batch: HuBERT base normalizes its first
+# conv layer with GroupNorm over the whole time axis, so zero padding would change the
+# features of the shorter inputs. The convolutional front end (feature_extractor,
+# layer_norm, post_extract_proj - all per item or per frame) runs per input, and only the
+# transformer encoder - most of the compute - is batched, with a frame-level padding
+# mask. The encoder zeroes the padded frames before the positional convolution and masks
+# them in attention, so every item gets the same features as an unbatched call up to
+# float summation order.
+#
+# Only the eager (fairseq) module is batched; exported backends pass through unchanged.
+
+# Inputs are only batched together when the longest is at most this much longer than
+# the shortest, so little compute is spent on padding
+BUCKET_RATIO = 1.5
+
+
+class _Request(object):
+    __slots__ = ("model", "source", "version", "bf16", "done", "result", "error")
+
+    def __init__(self, model, source, version, bf16):
+        self.model = model
+        self.source = source
+        self.version = version
+        self.bf16 = bf16
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class HubertBatcher(object):
+    def __init__(self, max_batch=8, max_wait_ms=5.0):
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = {}
+        self.thread = threading.Thread(target=self._loop, name="hubert-batcher", daemon=True)
+        self.thread.start()
+
+    def wrap(self, backend):
+        """Backend whose extract_features goes through the batcher (eager backends only)"""
+        if backend.name != "eager":
+            return backend
+        return BatchingBackend(backend, self)
+
+    def extract(self, model, source, version):
+        # autocast is thread-local: carry the caller's bf16 mode over to the batch thread
+        request = _Request(model, source, version, torch.is_autocast_cpu_enabled())
+        self.queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = ttime() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - ttime()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            groups = {}
+            for request in batch:
+                key = (id(request.model), request.version, request.bf16, request.source.dtype, request.source.device)
+                groups.setdefault(key, []).append(request)
+            for requests in groups.values():
+                for bucket in buckets(requests):
+                    self._run(bucket)
+
+    def _run(self, requests):
+        try:
+            with torch.no_grad(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=requests[0].bf16):
+                features = batched_features(requests[0].model, [r.source for r in requests], requests[0].version)
+            for request, feats in zip(requests, features):
+                request.result = feats
+        except Exception as e:
+            for request in requests:
+                request.error = e
+        finally:
+            for request in requests:
+                request.done.set()
+        with self.lock:
+            self.batches += 1
+            self.items += len(requests)
+            self.batch_sizes[len(requests)] = self.batch_sizes.get(len(requests), 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": round(self.items / float(self.batches), 2) if self.batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            }
+
+
+class BatchingBackend(object):
+    """Delegates to an eager backend, with extract_features served by a HubertBatcher"""
+
+    def __init__(self, backend, batcher):
+        self.backend = backend
+        self.batcher = batcher
+        self.name = backend.name
+
+    def extract_features(self, model, source, padding_mask, version):
+        return self.batcher.extract(model, source, version)
+
+    def infer(self, net_g, feats, p_len, pitch, pitchf, sid):
+        return self.backend.infer(net_g, feats, p_len, pitch, pitchf, sid)
+
+
+def buckets(requests):
+    """Split requests (same model / version) into length buckets of at most BUCKET_RATIO"""
+    requests = sorted(requests, key=lambda r: r.source.shape[-1])
+    bucket = []
+    for request in requests:
+        if bucket and request.source.shape[-1] > BUCKET_RATIO * bucket[0].source.shape[-1]:
+            yield bucket
+            bucket = []
+        bucket.append(request)
+    if bucket:
+        yield bucket
+
+
+def front_end(model, source):
+    """Per-input part of HubertModel.forward: conv features -> layer_norm -> post_extract_proj"""
+    features = model.feature_extractor(source).transpose(1, 2)
+    features = model.layer_norm(features)
+    if model.post_extract_proj is not None:
+        features = model.post_extract_proj(features)
+    return features
+
+
+def batched_features(model, sources, version):
+    """HuBERT features of several (1, samples) sources, as VC.vc computes them one by one"""
+    output_layer = 9 if version == "v1" else 12
+    if len(sources) == 1:
+        logits = model.extract_features(source=sources[0], padding_mask=None, output_layer=output_layer)
+        return [model.final_proj(logits[0]) if version == "v1" else logits[0]]
+    fronts = [front_end(model, source) for source in sources]
+    lengths = [f.shape[1] for f in fronts]
+    n_frames = max(lengths)
+    x = fronts[0].new_zeros((len(fronts), n_frames, fronts[0].shape[2]))
+    padding_mask = torch.ones((len(fronts), n_frames), dtype=torch.bool, device=x.device)
+    for i, (f, length) in enumerate(zip(fronts, lengths)):
+        x[i, :length] = f[0]
+        padding_mask[i, :length] = False
+    x, _ = model.encoder(x, padding_mask=padding_mask, layer=output_layer - 1)
+    if version == "v1":
+        x = model.final_proj(x)
+    return [x[i : i + 1, :length] for i, length in enumerate(lengths)]
@@ -0,0 +1,62 @@
+import os
+
+import torch
+
+# Fork Feature: exact top-k feature retrieval on the inference device.
+# VC.vc used to copy every segment's HuBERT features to host memory, cast fp16 to fp32,
+# run faiss index.search, blend big_npy[ix] in NumPy and send the result back. For the
+# usual size of RVC .index files the same retrieval is a few batched matrix products on
+# the device and dtype the features already live in. Bigger indexes keep using FAISS.
+# Thresholds (number of vectors) can be overridden with RVC_TORCH_INDEX_MAX_VECTORS.
+MAX_VECTORS_ACCELERATOR = 300000
+# On CPU there is no transfer to save and an exact scan costs more than an IVF probe,
+# so only small indexes move to torch there.
+MAX_VECTORS_CPU = 20000
+# Elements of the (queries x vectors) distance block computed at once
+CHUNK_ELEMENTS = 1 << 24
+
+
+def max_vectors(device):
+    env = os.environ.get("RVC_TORCH_INDEX_MAX_VECTORS")
+    if env:
+        return int(env)
+    return MAX_VECTORS_CPU if str(device).startswith("cpu") else MAX_VECTORS_ACCELERATOR
+
+
+def use_torch_index(ntotal, device):
+    return ntotal <= max_vectors(device)
+
+
+class TorchIndex(object):
+    """Exact L2 top-k over the vectors of a FAISS index, kept on the inference device"""
+
+    def __init__(self, big_npy, device, dtype):
+        self.vectors = torch.from_numpy(big_npy).to(device=device, dtype=dtype)
+        self.sq_norms = self.vectors.float().pow(2).sum(1)
+        self.ntotal = self.vectors.shape[0]
+        self.d = self.vectors.shape[1]
+
+    def search(self, x, k=8):
+        """Same contract as faiss IndexFlatL2.search: squared distances (ascending) and ids"""
+        k = min(k, self.ntotal)
+        rows = max(1, CHUNK_ELEMENTS // self.ntotal)
+        x_sq = x.float().pow(2).sum(1, keepdim=True)
+        # Backends may hand fp32 features to an fp16 index (is_half): match the vectors' dtype
+        x = x.to(self.vectors.dtype)
+        scores, ids = [], []
+        for start in range(0, x.shape[0], rows):
+            dots = torch.matmul(x[start : start + rows], self.vectors.t()).float()
+            dist = x_sq[start : start + rows] - 2 * dots + self.sq_norms
+            score, ix = torch.topk(dist, k, dim=1, largest=False, sorted=True)
+            scores.append(score.clamp_min_(0))
+            ids.append(ix)
+        return torch.cat(scores), torch.cat(ids)
+
+    def retrieve(self, feats, k=8):
+        """Inverse-square distance weighted blend of the k nearest vectors (as in VC.vc)"""
+        score, ix = self.search(feats, k)
+        # An exact hit would give 1/0; clamp instead of producing NaN weights
+        weight = torch.square(1 / score.clamp_min(1e-12))
+        weight /= weight.sum(dim=1, keepdim=True)
+        blended = (self.vectors[ix].float() * weight.unsqueeze(2)).sum(dim=1)
+        return blended.to(feats.dtype)
@@ -0,0 +1,176 @@
+import json
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+# Fork Feature: pluggable inference backends for VC.vc.
+#   eager       - the fairseq HuBERT and infer_pack synthesizer modules (reference implementation)
+#   torchscript - frozen TorchScript artifacts written by export_models.py
+#   onnx        - ONNX artifacts run through ONNX Runtime (CPU graph optimizations / fusion)
+# The artifacts are exported from the same modules through the wrappers below, so the
+# eager path and the exported graphs compute exactly the same function.
+BACKENDS = ("eager", "torchscript", "onnx")
+ARTIFACT_SUFFIX = {"torchscript": ".ts.pt", "onnx": ".onnx"}
+
+
+class HubertFeatureExtractor(nn.Module):
+    """HuBERT features as used by VC.vc: layer 9 + final_proj for v1, layer 12 for v2"""
+
+    def __init__(self, hubert, version):
+        super().__init__()
+        self.hubert = hubert
+        self.version = version
+        self.output_layer = 9 if version == "v1" else 12
+
+    def forward(self, source):
+        logits = self.hubert.extract_features(source=source, padding_mask=None, output_layer=self.output_layer)
+        if self.version == "v1":
+            return self.hubert.final_proj(logits[0])
+        return logits[0]
+
+
+class SynthesizerInfer(nn.Module):
+    """net_g.infer with the prior noise taken as an input (rnd) so exports stay deterministic"""
+
+    def __init__(self, net_g, if_f0):
+        super().__init__()
+        self.net_g = net_g
+        self.if_f0 = if_f0
+
+    def forward(self, phone, phone_lengths, pitch, nsff0, sid, rnd):
+        g = self.net_g.emb_g(sid).unsqueeze(-1)
+        m_p, logs_p, x_mask = self.net_g.enc_p(phone, pitch if self.if_f0 == 1 else None, phone_lengths)
+        z_p = (m_p + torch.exp(logs_p) * rnd) * x_mask
+        z = self.net_g.flow(z_p, x_mask, g=g, reverse=True)
+        if self.if_f0 == 1:
+            return self.net_g.dec(z * x_mask, nsff0, g=g)
+        return self.net_g.dec(z * x_mask, g=g)
+
+
+class EagerBackend(object):
+    name = "eager"
+
+    def extract_features(self, model, source, padding_mask, version):
+        logits = model.extract_features(
+            source=source,
+            padding_mask=padding_mask,
+            output_layer=9 if version == "v1" else 12,
+        )
+        return model.final_proj(logits[0]) if version == "v1" else logits[0]
+
+    def infer(self, net_g, feats, p_len, pitch, pitchf, sid):
+        if pitch is not None and pitchf is not None:
+            return net_g.infer(feats, p_len, pitch, pitchf, sid)[0][0, 0]
+        return net_g.infer(feats, p_len, sid)[0][0, 0]
+
+
+class _ArtifactBackend(object):
+    """Common part of the exported backends: the model arguments of VC.vc are ignored"""
+
+    def __init__(self, hubert_paths, synth_path, meta, device):
+        self.hubert_paths = hubert_paths
+        self.synth_path = synth_path
+        self.meta = meta
+        self.device = device
+        self.if_f0 = meta["if_f0"]
+        self.inter_channels = meta["inter_channels"]
+
+    def prior_noise(self, n_frames):
+        return torch.randn(1, self.inter_channels, n_frames) * 0.66666
+
+
+class TorchScriptBackend(_ArtifactBackend):
+    name = "torchscript"
+
+    def __init__(self, hubert_paths, synth_path, meta, device):
+        super().__init__(hubert_paths, synth_path, meta, device)
+        self.hubert = {v: torch.jit.load(p, map_location=device) for v, p in hubert_paths.items()}
+        self.synth = torch.jit.load(synth_path, map_location=device)
+
+    def extract_features(self, model, source, padding_mask, version):
+        return self.hubert[version](source.float())
+
+    def infer(self, net_g, feats, p_len, pitch, pitchf, sid):
+        rnd = self.prior_noise(feats.shape[1]).to(feats.device)
+        if pitch is None:
+            pitch = torch.zeros(1, feats.shape[1], dtype=torch.long, device=feats.device)
+            pitchf = torch.zeros(1, feats.shape[1], device=feats.device)
+        return self.synth(feats.float(), p_len, pitch, pitchf.float(), sid, rnd)[0, 0]
+
+
+class OnnxBackend(_ArtifactBackend):
+    name = "onnx"
+
+    def __init__(self, hubert_paths, synth_path, meta, device, n_threads=0):
+        super().__init__(hubert_paths, synth_path, meta, device)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if n_threads:
+            options.intra_op_num_threads = n_threads
+        providers = ["CPUExecutionProvider"]
+        if str(device).startswith("cuda") and "CUDAExecutionProvider" in ort.get_available_providers():
+            providers.insert(0, "CUDAExecutionProvider")
+        self.hubert = {
+            v: ort.InferenceSession(p, sess_options=options, providers=providers) for v, p in hubert_paths.items()
+        }
+        self.synth = ort.InferenceSession(synth_path, sess_options=options, providers=providers)
+        self.synth_inputs = set(i.name for i in self.synth.get_inputs())
+
+    def extract_features(self, model, source, padding_mask, version):
+        session = self.hubert[version]
+        feats = session.run(None, {"source": source.float().cpu().numpy()})[0]
+        return torch.from_numpy(feats).to(source.device)
+
+    def infer(self, net_g, feats, p_len, pitch, pitchf, sid):
+        inputs = {
+            "phone": feats.float().cpu().numpy(),
+            "phone_lengths": p_len.cpu().numpy(),
+            "sid": sid.cpu().numpy(),
+            "rnd": self.prior_noise(feats.shape[1]).numpy(),
+        }
+        if pitch is not None:
+            inputs["pitch"] = pitch.cpu().numpy()
+            inputs["nsff0"] = pitchf.float().cpu().numpy()
+        inputs = {k: v for k, v in inputs.items() if k in self.synth_inputs}
+        audio = self.synth.run(None, inputs)[0]
+        return torch.from_numpy(audio[0, 0])
+
+
+_eager = EagerBackend()
+
+
+def eager_backend():
+    return _eager
+
+
+def artifact_paths(kind, model_file, hubert_dir):
+    """(hubert artifacts by version, synthesizer artifact, metadata json) for a voice"""
+    suffix = ARTIFACT_SUFFIX[kind]
+    stem = os.path.splitext(str(model_file))[0]
+    hubert_paths = {v: os.path.join(str(hubert_dir), "hubert_base_%s%s" % (v, suffix)) for v in ("v1", "v2")}
+    return hubert_paths, stem + suffix, stem + ".backend.json"
+
+
+def create_backend(kind, model_file=None, hubert_dir=None, device="cpu", n_threads=0):
+    kind = (kind or "eager").lower()
+    if kind not in BACKENDS:
+        raise ValueError("Unknown backend '%s' (expected one of: %s)" % (kind, ", ".join(BACKENDS)))
+    if kind == "eager":
+        return _eager
+    hubert_paths, synth_path, meta_path = artifact_paths(kind, model_file, hubert_dir)
+    if not os.path.exists(synth_path) or not os.path.exists(meta_path):
+        raise FileNotFoundError(
+            "No %s artifact for %s (run export_models.py --format %s)" % (kind, model_file, kind)
+        )
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    hubert_paths = {v: p for v, p in hubert_paths.items() if v == meta["version"]}
+    if not os.path.exists(hubert_paths[meta["version"]]):
+        raise FileNotFoundError("HuBERT %s artifact not found: %s" % (kind, hubert_paths[meta["version"]]))
+    if kind == "torchscript":
+        return TorchScriptBackend(hubert_paths, synth_path, meta, device)
+    return OnnxBackend(hubert_paths, synth_path, meta, device, n_threads)
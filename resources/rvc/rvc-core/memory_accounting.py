@@ -0,0 +1,186 @@
+import collections
+import os
+import threading
+import tracemalloc
+from time import time
+
+import torch
+
+# Fork Feature: per-conversion memory accounting.
+# MemoryAccountant is a stage_timing listener plus a sampler thread that reads the
+# process RSS every few milliseconds. When a stage ends, the samples inside its
+# interval give the stage's peak RSS (NumPy buffers, torch CPU tensors and model
+# weights all show up there). Optionally (track_allocations=True) tracemalloc is on
+# for the conversion: its peak is read and reset at every stage end, so it is the peak
+# of Python / NumPy allocations since the previous stage. The sampler also snapshots
+# the largest allocation sites whenever traced memory reaches a new high; the snapshot
+# is credited to the innermost stage whose interval contains it. On CUDA the torch
+# allocator peak is read and reset like the tracemalloc one.
+#
+# RSS, tracemalloc and the CUDA allocator are process-wide: with several conversions
+# running in the same process the per-stage figures include the others' memory.
+
+SAMPLE_INTERVAL = 0.02
+MAX_SAMPLES = 30000  # ~10 min of samples at 20 ms; older samples are dropped
+TOP_ALLOCATIONS = 5
+MB = 1024.0 * 1024.0
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def current_rss():
+    """Resident set size of this process in bytes (0 when not available)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return 0
+
+
+def process_peak_rss():
+    """Highest RSS of the process since it started, in bytes"""
+    try:
+        import resource
+
+        # Linux reports KiB, macOS bytes
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+    except Exception:
+        return 0
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class MemoryAccountant(object):
+    def __init__(self, track_allocations=False, interval=SAMPLE_INTERVAL):
+        self.track_allocations = track_allocations
+        self.interval = interval
+        self.samples = collections.deque(maxlen=MAX_SAMPLES)
+        self.stages = {}
+        self.top_allocations = []
+        self.top_time = None  # when top_allocations was captured
+        self.top_stage = None
+        self.traced_high = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.cuda = torch.cuda.is_available()
+        self.rss_start = self.rss_end = 0
+
+    def __enter__(self):
+        self.rss_start = current_rss()
+        self.samples.append((time(), self.rss_start))
+        if self.track_allocations:
+            _start_tracemalloc()
+            tracemalloc.reset_peak()
+        if self.cuda:
+            torch.cuda.reset_peak_memory_stats()
+        self.thread = threading.Thread(target=self._sample, name="memory-sampler", daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+        self.rss_end = current_rss()
+        self.samples.append((time(), self.rss_end))
+        if self.track_allocations:
+            _stop_tracemalloc()
+        return False
+
+    def _sample(self):
+        while not self.stop_event.wait(self.interval):
+            self.samples.append((time(), current_rss()))
+            if self.track_allocations and tracemalloc.is_tracing():
+                traced_current = tracemalloc.get_traced_memory()[0]
+                if traced_current > self.traced_high * 1.1:
+                    self.traced_high = traced_current
+                    self._capture_top()
+
+    def __call__(self, stage, start, seconds, labels):
+        """stage_timing listener: peak memory of the stage that just ended"""
+        end = time()
+        window = [rss for t, rss in list(self.samples) if start <= t <= end]
+        window.append(current_rss())
+        figures = {"rss_peak": max(window)}
+        if self.track_allocations and tracemalloc.is_tracing():
+            traced_current, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            figures["traced_peak"] = traced_peak
+        if self.cuda:
+            figures["cuda_peak"] = torch.cuda.max_memory_allocated()
+            torch.cuda.reset_peak_memory_stats()
+        with self.lock:
+            # Stages end innermost first: the first stage covering the snapshot is the innermost
+            if self.top_time is not None and self.top_stage is None and start <= self.top_time <= end:
+                self.top_stage = stage
+            entry = self.stages.setdefault(stage, {"count": 0})
+            entry["count"] += 1
+            for key, value in figures.items():
+                entry[key] = max(entry.get(key, 0), value)
+
+    def _capture_top(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, threading.__file__),
+            )
+        )
+        stats = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        with self.lock:
+            self.top_time = time()
+            self.top_stage = None
+            self.top_allocations = [
+                {
+                    "site": "%s:%d" % (os.path.basename(s.traceback[0].filename), s.traceback[0].lineno),
+                    "size_mb": round(s.size / MB, 1),
+                    "blocks": s.count,
+                }
+                for s in stats
+            ]
+
+    def peak_rss(self):
+        return max([rss for _, rss in self.samples] or [self.rss_start])
+
+    def report(self):
+        with self.lock:
+            stages = {
+                name: dict(
+                    {"count": entry["count"]},
+                    **{key + "_mb": round(value / MB, 1) for key, value in entry.items() if key != "count"}
+                )
+                for name, entry in self.stages.items()
+            }
+        peak_stage = max(stages, key=lambda name: stages[name].get("rss_peak_mb", 0)) if stages else None
+        return {
+            "rss_start_mb": round(self.rss_start / MB, 1),
+            "rss_peak_mb": round(self.peak_rss() / MB, 1),
+            "rss_end_mb": round(self.rss_end / MB, 1),
+            "process_peak_rss_mb": round(process_peak_rss() / MB, 1),
+            "peak_stage": peak_stage,
+            "stages": stages,
+            "top_allocations": [dict(a, stage=self.top_stage) for a in self.top_allocations],
+        }
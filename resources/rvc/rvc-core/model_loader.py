@@ -0,0 +1,72 @@
+import torch
+from fairseq import checkpoint_utils
+
+from infer_pack.models import SynthesizerTrnMs256NSFsid, SynthesizerTrnMs256NSFsid_nono
+from infer_pack.modelsv2 import SynthesizerTrnMs768NSFsid, SynthesizerTrnMs768NSFsid_nono
+from vc_infer_pipeline import VC
+import cpu_precision
+import shared_weights
+
+
+# Shared by rvc_wrapper.py, rvc_server.py and the command line tools so every
+# front end builds HuBERT and the synthesizers the same way.
+def load_hubert(hubert_path, config, precision="fp32"):
+    models, _, _ = checkpoint_utils.load_model_ensemble_and_task(
+        [str(hubert_path)],
+        suffix="",
+    )
+    hubert_model = models[0]
+    hubert_model = hubert_model.to(config.device)
+    if config.is_half:
+        hubert_model = hubert_model.half()
+    else:
+        hubert_model = hubert_model.float()
+    hubert_model.eval()
+    if shared_weights.enabled(config):
+        hubert_model = shared_weights.share_module(hubert_model, hubert_path)
+    return cpu_precision.prepare_hubert(hubert_model, precision)
+
+
+def build_synthesizer(synth_config, if_f0, version, is_half):
+    if version == "v1":
+        if if_f0 == 1:
+            return SynthesizerTrnMs256NSFsid(*synth_config, is_half=is_half)
+        return SynthesizerTrnMs256NSFsid_nono(*synth_config)
+    if if_f0 == 1:
+        return SynthesizerTrnMs768NSFsid(*synth_config, is_half=is_half)
+    return SynthesizerTrnMs768NSFsid_nono(*synth_config)
+
+
+def load_synthesizer(model_file, config, precision="fp32"):
+    shared = shared_weights.enabled(config)
+    if shared:
+        cpt = shared_weights.load_checkpoint(model_file)
+    else:
+        cpt = torch.load(str(model_file), map_location="cpu")
+    tgt_sr = cpt["config"][-1]
+    cpt["config"][-3] = cpt["weight"]["emb_g.weight"].shape[0]  # n_spk
+    if_f0 = cpt.get("f0", 1)
+    version = cpt.get("version", "v1")
+
+    net_g = build_synthesizer(cpt["config"], if_f0, version, config.is_half)
+    del net_g.enc_q
+    net_g.load_state_dict(cpt["weight"], strict=False)
+    net_g.eval().to(config.device)
+    if config.is_half:
+        net_g = net_g.half()
+    else:
+        net_g = net_g.float()
+    if shared:
+        net_g = shared_weights.share_module(net_g, model_file)
+        # The checkpoint weights are now redundant with the shared mapping
+        del cpt["weight"]
+    net_g = cpu_precision.prepare_synthesizer(net_g, precision)
+
+    return {
+        "net_g": net_g,
+        "cpt": cpt,
+        "version": version,
+        "tgt_sr": tgt_sr,
+        "vc": VC(tgt_sr, config),
+        "if_f0": if_f0,
+    }
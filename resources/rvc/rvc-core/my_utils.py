@@ -2,7 +2,14 @@ import ffmpeg
 import numpy as np
 
 
-def load_audio(file, sr):
+def load_audio(file, sr, start=None, duration=None):
+    # Fork Feature: start / duration (s) seek before decoding (-ss / -t on the input), so
+    # only that window of a long file is read and resampled (see time_range.py)
+    seek = {}
+    if start:
+        seek["ss"] = start
+    if duration is not None:
+        seek["t"] = duration
     try:
         # https://github.com/openai/whisper/blob/main/whisper/audio.py#L26
         # This launches a subprocess to decode audio while down-mixing and resampling as necessary.
@@ -11,7 +18,7 @@ def load_audio(file, sr):
             file.strip(" ").strip('"').strip("\n").strip('"').strip(" ")
         )  # 防止小白拷路径头尾带了空格和"和回车
         out, _ = (
-            ffmpeg.input(file, threads=0)
+            ffmpeg.input(file, threads=0, **seek)
             .output("-", format="f32le", acodec="pcm_f32le", ac=1, ar=sr)
             .run(cmd=["ffmpeg", "-nostdin"], capture_stdout=True, capture_stderr=True)
         )
@@ -0,0 +1,240 @@
+import collections
+from math import gcd
+from time import perf_counter
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from scipy import signal
+
+import cpu_precision
+import infer_backend
+from vc_infer_pipeline import bh, ah
+
+# Fork Feature: streaming (live monitoring) voice conversion on small blocks.
+# VC.pipeline works on complete files. StreamingConverter keeps a rolling 16 kHz buffer
+# of left context + the newest block and, for every block:
+#   1. high-passes the block (causal lfilter with carried state instead of filtfilt)
+#   2. runs HuBERT over context + block (the features need the left context)
+#   3. computes f0 only over the synthesized region plus a small margin
+#   4. blends the index and runs net_g on the synthesized region plus synth_margin
+#      frames of left context, i.e. block + crossfade + SOLA search window
+#   5. aligns the new output with the previous tail (SOLA: offset with the highest
+#      normalized cross-correlation inside the search window) and crossfades it
+# Each call returns exactly one block of output at the model rate.
+#
+# Algorithmic latency = block + crossfade + search window (the emitted audio ends that
+# long before the newest input sample); processing latency is measured per block.
+#
+# StreamingResampler brings live input (usually 48 kHz browser capture) to 16 kHz one
+# message at a time. resample_poly per message zero-pads both edges of every chunk, which
+# clicks at each boundary; here the same polyphase FIR keeps the last input samples as
+# state, so the concatenated output equals resample_poly over the whole stream.
+
+FRAME = 160  # samples per f0 / synthesis frame at 16 kHz (100 frames per second)
+HUBERT_FRAME = 320  # HuBERT hop at 16 kHz
+
+
+def _round_up(samples, multiple):
+    return int(-(-int(samples) // multiple) * multiple)
+
+
+class StreamingResampler(object):
+    """sr_in -> sr_out over consecutive chunks, with the filter history carried between calls"""
+
+    def __init__(self, sr_in, sr_out):
+        g = gcd(int(sr_in), int(sr_out))
+        self.up, self.down = int(sr_out) // g, int(sr_in) // g
+        if self.up == self.down:
+            return
+        # Same filter design as scipy.signal.resample_poly
+        max_rate = max(self.up, self.down)
+        half_len = 10 * max_rate
+        h = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)) * self.up
+        self.taps = _round_up(len(h), self.up) // self.up
+        h_pad = np.zeros(self.taps * self.up)
+        h_pad[: len(h)] = h
+        # phases[p, t] = h[p + t * up]: output m uses phase (m * down) % up
+        self.phases = h_pad.reshape(self.taps, self.up).T
+        self.history = np.zeros(self.taps - 1, dtype=np.float64)  # silence before the stream
+        self.n_in = 0
+        # Skip the filter delay, as resample_poly does (half_len is a multiple of down)
+        self.n_out = half_len // self.down
+
+    def process(self, chunk):
+        if self.up == self.down:
+            return np.asarray(chunk, dtype=np.float32)
+        x = np.concatenate([self.history, np.asarray(chunk, dtype=np.float64)])
+        base = self.n_in - (self.taps - 1)  # stream index of x[0]
+        self.n_in += len(chunk)
+        # Outputs whose newest input sample has arrived
+        m = np.arange(self.n_out, (self.n_in * self.up - 1) // self.down + 1)
+        pos = m * self.down
+        idx = (pos // self.up)[:, None] - np.arange(self.taps)[None, :] - base
+        out = np.sum(x[idx] * self.phases[pos % self.up], axis=1)
+        if len(m):
+            self.n_out = int(m[-1]) + 1
+        if self.taps > 1:
+            self.history = x[len(x) - (self.taps - 1) :]
+        return out.astype(np.float32)
+
+
+class StreamingConverter(object):
+    def __init__(
+        self,
+        vc,
+        hubert,
+        net_g,
+        version,
+        if_f0,
+        tgt_sr,
+        f0_method="pm",
+        f0_up_key=0,
+        index=None,
+        big_npy=None,
+        index_rate=0.0,
+        sid=0,
+        block_ms=200,
+        context_ms=800,
+        crossfade_ms=40,
+        search_ms=10,
+        synth_margin=16,
+        precision="fp32",
+        backend=None,
+        crepe_hop_length=128,
+    ):
+        self.vc = vc
+        self.hubert = hubert
+        self.net_g = net_g
+        self.version = version
+        self.if_f0 = if_f0
+        self.tgt_sr = tgt_sr
+        self.f0_method = f0_method
+        self.f0_up_key = f0_up_key
+        self.index = index
+        self.big_npy = big_npy
+        self.index_rate = index_rate
+        self.sid = torch.tensor([sid], device=vc.device).long()
+        self.precision = cpu_precision.resolve_precision(precision, vc.device)
+        self.backend = backend or infer_backend.eager_backend()
+        self.crepe_hop_length = crepe_hop_length
+        self.synth_margin = synth_margin
+
+        # Sizes at 16 kHz, aligned to the HuBERT hop so features map to whole frames
+        self.block = _round_up(block_ms * 16, HUBERT_FRAME)
+        self.context = _round_up(context_ms * 16, HUBERT_FRAME)
+        self.crossfade = _round_up(crossfade_ms * 16, FRAME)
+        self.search = _round_up(search_ms * 16, FRAME)
+        self.region = self.block + self.crossfade + self.search
+        if self.region > self.context + self.block:
+            raise ValueError("context_ms is too short for block + crossfade + search")
+
+        # Output sizes at the model rate
+        self.tgt_frame = tgt_sr // 100
+        self.block_tgt = self.block // FRAME * self.tgt_frame
+        self.crossfade_tgt = self.crossfade // FRAME * self.tgt_frame
+        self.search_tgt = self.search // FRAME * self.tgt_frame
+        fade = np.sin(0.5 * np.pi * np.linspace(0.0, 1.0, self.crossfade_tgt, dtype=np.float32)) ** 2
+        self.fade_in, self.fade_out = fade, 1.0 - fade
+
+        self.buffer = np.zeros(self.context + self.block, dtype=np.float32)
+        self.filter_state = signal.lfilter_zi(bh, ah) * 0.0
+        self.tail = None  # crossfade-length tail of the previous output
+        self.blocks = 0
+        self.processing = collections.deque(maxlen=200)
+        self.queue_waits = collections.deque(maxlen=200)
+
+    @property
+    def block_seconds(self):
+        return self.block / 16000.0
+
+    @property
+    def algorithmic_latency_ms(self):
+        return (self.block + self.crossfade + self.search) / 16.0
+
+    def process(self, block, queue_wait=0.0):
+        """Convert one block of self.block samples (16 kHz float32); returns self.block_tgt samples
+
+        queue_wait: seconds the block waited for a processing slot before this call (stats only)
+        """
+        start = perf_counter()
+        block = np.asarray(block, dtype=np.float32)
+        if block.shape[0] != self.block:
+            raise ValueError("expected %d samples, got %d" % (self.block, block.shape[0]))
+        filtered, self.filter_state = signal.lfilter(bh, ah, block, zi=self.filter_state)
+        self.buffer = np.concatenate([self.buffer[self.block :], filtered.astype(np.float32)])
+
+        with torch.no_grad(), cpu_precision.autocast(self.precision):
+            audio = self._convert_region()
+        out = self._crossfade(audio)
+
+        self.blocks += 1
+        self.processing.append(perf_counter() - start)
+        self.queue_waits.append(queue_wait)
+        return out
+
+    def _convert_region(self):
+        vc = self.vc
+        source = torch.from_numpy(self.buffer).to(vc.device)
+        source = source.half() if vc.is_half else source.float()
+        source = source.view(1, -1)
+        padding_mask = torch.zeros(source.shape, dtype=torch.bool, device=vc.device)
+        feats = self.backend.extract_features(self.hubert, source, padding_mask, self.version)
+        if self.precision == "bf16":
+            feats = feats.float()
+
+        # Synthesized frames (100 Hz): the region plus synth_margin frames of left context
+        n_frames = min(self.region // FRAME + self.synth_margin, 2 * feats.shape[1])
+        # Only the HuBERT frames (50 Hz) covering those frames go through the index
+        n_hubert = -(-n_frames // 2)
+        feats = feats[:, -n_hubert:]
+        feats = vc.blend_index(feats, self.index, self.big_npy, self.index_rate)
+        feats = F.interpolate(feats.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)[:, -n_frames:]
+
+        pitch = pitchf = None
+        if self.if_f0 == 1:
+            x = self.buffer[-n_frames * FRAME :].astype(np.float64)
+            coarse, f0 = vc.get_f0(x, n_frames, self.f0_up_key, self.f0_method, self.crepe_hop_length)
+            pitch = torch.tensor(coarse[-n_frames:], device=vc.device).unsqueeze(0).long()
+            pitchf = torch.tensor(f0[-n_frames:], device=vc.device).unsqueeze(0).float()
+        p_len = torch.tensor([n_frames], device=vc.device).long()
+        audio = self.backend.infer(self.net_g, feats, p_len, pitch, pitchf, self.sid).data.cpu().float().numpy()
+        audio = audio.reshape(-1)
+        # Drop the margin: keep the last region (block + crossfade + search) of output
+        return audio[-(self.region // FRAME) * self.tgt_frame :]
+
+    def _crossfade(self, audio):
+        if self.tail is None:
+            offset = 0
+        else:
+            # SOLA: align the new head with the previous tail inside the search window
+            head = audio[: self.crossfade_tgt + self.search_tgt]
+            corr = np.correlate(head, self.tail, "valid")
+            energy = np.sqrt(np.convolve(head ** 2, np.ones(self.crossfade_tgt), "valid") + 1e-8)
+            offset = int(np.argmax(corr / energy))
+        audio = audio[offset:].copy()
+        if self.tail is not None:
+            audio[: self.crossfade_tgt] = audio[: self.crossfade_tgt] * self.fade_in + self.tail * self.fade_out
+        out = audio[: self.block_tgt]
+        self.tail = audio[self.block_tgt : self.block_tgt + self.crossfade_tgt].copy()
+        return out
+
+    def stats(self):
+        processing = sorted(self.processing)
+        if not processing:
+            return {"blocks": self.blocks}
+        waits = sorted(self.queue_waits)
+        mean = sum(processing) / len(processing)
+        return {
+            "blocks": self.blocks,
+            "block_ms": self.block / 16.0,
+            "search_ms": self.search / 16.0,
+            "algorithmic_latency_ms": self.algorithmic_latency_ms,
+            "processing_ms_mean": round(1000 * mean, 1),
+            "processing_ms_p95": round(1000 * processing[min(len(processing) - 1, int(0.95 * len(processing)))], 1),
+            # Waiting for a processing slot adds to the latency of the block like processing does
+            "queue_wait_ms_mean": round(1000 * sum(waits) / len(waits), 1),
+            "queue_wait_ms_p95": round(1000 * waits[min(len(waits) - 1, int(0.95 * len(waits)))], 1),
+            # > 1: slower than real time, the input backlog grows
+            "rtf": round(mean / self.block_seconds, 3),
+        }
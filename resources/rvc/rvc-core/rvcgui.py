@@ -32,6 +32,7 @@ from vc_infer_pipeline import VC
 from fairseq import checkpoint_utils
 from scipy.io import wavfile
 from my_utils import load_audio
+from staged_executor import Stage, StagedExecutor # Fork Feature. Pipelined multi-file conversion
 from infer_pack.models import SynthesizerTrnMs256NSFsid, SynthesizerTrnMs256NSFsid_nono
 from infer_pack.modelsv2 import SynthesizerTrnMs768NSFsid_nono, SynthesizerTrnMs768NSFsid
 from multiprocessing import cpu_count
@@ -186,7 +187,11 @@ def vc_multi(
     f0_method,
     file_index,
     index_rate,
+    crepe_hop_length=128,
 ):
+    # Fork Feature: files go through a staged pipeline (see staged_executor.py), so
+    # decode/f0 of the next file and writing of the previous one overlap with inference
+    global tgt_sr, net_g, vc, hubert_model
     try:
         dir_path = (
             dir_path.strip(" ").strip('"').strip("\n").strip('"').strip(" ")
@@ -203,28 +208,62 @@ def vc_multi(
         except:
             traceback.print_exc()
             paths = [path.name for path in paths]
-        infos = []
-        for path in paths:
-            info, opt = vc_single(
-                sid,
-                path,
+        f0_up_key = int(f0_up_key)
+        if hubert_model == None:
+            load_hubert()
+        if_f0 = cpt.get("f0", 1)
+        file_index = (
+            file_index.strip(" ")
+            .strip('"')
+            .strip("\n")
+            .strip('"')
+            .strip(" ")
+            .replace("trained", "added")
+        )
+        times = {}
+
+        def decode(path, _):
+            times[path] = [0, 0, 0]
+            return load_audio(path, 16000)
+
+        def prepare(path, audio):
+            return vc.prepare(
+                audio,
+                times[path],
                 f0_up_key,
-                None,
                 f0_method,
                 file_index,
                 index_rate,
+                if_f0,
+                crepe_hop_length,
             )
-            if info == "Success":
-                try:
-                    tgt_sr, audio_opt = opt
-                    wavfile.write(
-                        "%s/%s" % (opt_root, os.path.basename(path)
-                                   ), tgt_sr, audio_opt
-                    )
-                except:
-                    info = traceback.format_exc()
+
+        def infer(path, prepared):
+            return vc.convert(hubert_model, net_g, sid, prepared, times[path], version)
+
+        def write(path, audio_opt):
+            wavfile.write("%s/%s" % (opt_root, os.path.basename(path)), tgt_sr, audio_opt)
+
+        executor = StagedExecutor(
+            [
+                Stage("decode", decode),
+                Stage("f0", prepare, workers=2),
+                Stage("infer", infer),
+                Stage("write", write),
+            ]
+        )
+        infos = []
+        for path, _, error in executor.run(paths):
+            if error is None:
+                info = "Success"
+                print(
+                    "%s npy: " % os.path.basename(path), times[path][0], "s, f0: ", times[path][1], "s, infer: ", times[path][2], "s", sep=""
+                )
+            else:
+                info = "".join(traceback.format_exception(type(error), error, error.__traceback__))
             infos.append("%s->%s" % (os.path.basename(path), info))
             yield "\n".join(infos)
+        print(executor.report())
         yield "\n".join(infos)
     except:
         yield traceback.format_exc()
@@ -496,7 +535,7 @@ def selected_model(choice):
         global pth_file_path
         pth_file_path = os.path.join(model_dir, pth_files[0])
         npy_files = [f for f in os.listdir(model_dir) if os.path.isfile(os.path.join(model_dir, f)) 
-                     and f.endswith(".index")]
+                     and f.endswith(".index") and not f.endswith(".compact.index")]
         if npy_files:
             npy_files_dir = [os.path.join(model_dir, f) for f in npy_files]
             if len(npy_files_dir) == 1:
@@ -0,0 +1,182 @@
+import numpy as np
+from scipy.ndimage import maximum_filter1d
+
+# Fork Feature: split-point search for VC.pipeline.
+# The pipeline cuts long inputs near every t_center samples, at the quietest point
+# (minimum |moving sum| over `window` samples) within +-t_query of the nominal cut.
+# The original implementation summed 160 shifted copies of the padded audio and ran a
+# fresh np.where(abs == abs.min()) per cut; here the moving sum is a single cumulative
+# sum and the argmin is batched over all query windows.
+#
+# policy="energy" (default) reproduces the original opt_ts exactly: the cumulative-sum
+# moving sum is only used to shortlist candidates, and the shortlisted positions are
+# re-summed in the original order before taking the first minimum.
+# policy="vad" prefers the middle of real pauses when the query window contains one.
+# policy="content" places cuts by content instead of by position (content-defined chunking,
+# local-maximum variant): a pause is a cut when it is longer (then quieter) than every other
+# pause within +-t_center / 4, and the cut is its quietest point. A cut depends only on the
+# audio around it, so an edit moves the cuts next to it while the others land on the same
+# content, however many samples were inserted or removed - what chunk_reuse needs to
+# recognize unchanged segments. (Hashing quantized frame levels instead is not stable:
+# shifting the audio by a fraction of a frame changes most levels.) Segments longer than
+# t_center + t_query get an extra cut at the quietest point near the limit.
+
+SPLIT_POLICIES = ("energy", "vad", "content")
+# Query windows processed per batch (bounds the temporary |moving sum| matrix)
+WINDOW_BATCH = 32
+CDC_QUIET_DB = -30.0  # quiet frame: this far below the loudest frame within +-1 s
+CDC_PEAK_FRAMES = 201
+CDC_MIN_PAUSE = 0.1  # s
+
+
+def moving_sum(audio, window):
+    """sum(audio_pad[j : j + window]) for every j, audio_pad = reflect-padded audio"""
+    audio_pad = np.pad(audio, (window // 2, window // 2), mode="reflect")
+    csum = np.concatenate(([0.0], np.cumsum(audio_pad, dtype=np.float64)))
+    return audio_pad, csum[window : window + len(audio)] - csum[: len(audio)]
+
+
+def exact_moving_sum(audio_pad, window, positions):
+    """Moving sum at `positions`, accumulated in the same order as the original loop"""
+    acc = np.zeros(len(positions), dtype=audio_pad.dtype)
+    for i in range(window):
+        acc += audio_pad[positions + i]
+    return acc
+
+
+def _window_argmins(audio_pad, approx, window, starts, lengths):
+    """First exact minimum of |moving sum| inside each [start, start + length) window"""
+    abs_approx = np.abs(approx)
+    # Cumulative sums differ from the sequential sums by a few ulps of the running
+    # total, and the sequential sums themselves (accumulated in the audio dtype, float32
+    # for raw input) are off by up to window * eps * sum|x| of the window; anything
+    # within that margin of the minimum is re-checked exactly.
+    abs_csum = np.concatenate(([0.0], np.cumsum(np.abs(audio_pad), dtype=np.float64)))
+    max_abs_window = np.max(abs_csum[window:] - abs_csum[:-window])
+    tolerance = 64 * np.finfo(np.float64).eps * (abs_csum[-1] + 1.0) + window * np.finfo(audio_pad.dtype).eps * max_abs_window
+    result = np.empty(len(starts), dtype=np.int64)
+    for b in range(0, len(starts), WINDOW_BATCH):
+        b_starts, b_lengths = starts[b : b + WINDOW_BATCH], lengths[b : b + WINDOW_BATCH]
+        width = int(b_lengths.max())
+        offsets = np.arange(width)
+        idx = b_starts[:, None] + offsets[None, :]
+        valid = offsets[None, :] < b_lengths[:, None]
+        block = np.where(valid, abs_approx[np.minimum(idx, len(abs_approx) - 1)], np.inf)
+        mins = block.min(axis=1)
+        for row in range(len(b_starts)):
+            candidates = np.nonzero(block[row] <= mins[row] + tolerance)[0]
+            exact = np.abs(exact_moving_sum(audio_pad, window, b_starts[row] + candidates))
+            result[b + row] = candidates[np.argmin(exact)]
+    return result
+
+
+def _pause_split(audio, start, length, frame, threshold_db, min_pause):
+    """(start, end) sample offsets, relative to start, of the longest pause inside
+    [start, start + length), or None"""
+    n_frames = length // frame
+    if n_frames == 0:
+        return None
+    frames = audio[start : start + n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-12)
+    level = 20 * np.log10(rms)
+    quiet = level < (np.percentile(level, 95) + threshold_db)
+    best, best_len, run_start = None, 0, None
+    for i, q in enumerate(np.append(quiet, False)):
+        if q and run_start is None:
+            run_start = i
+        elif not q and run_start is not None:
+            if i - run_start > best_len:
+                best, best_len = (run_start, i), i - run_start
+            run_start = None
+    if best is None or best_len * frame < min_pause:
+        return None
+    return best[0] * frame, best[1] * frame
+
+
+def find_split_points(
+    audio,
+    window,
+    t_center,
+    t_query,
+    t_max,
+    policy="energy",
+    sr=16000,
+    pause_threshold_db=-35.0,
+    min_pause=0.15,
+):
+    """Split points (opt_ts) for VC.pipeline; see the module comment for the policies"""
+    if policy not in SPLIT_POLICIES:
+        raise ValueError("Unknown split policy '%s'" % policy)
+    audio_pad, approx = moving_sum(audio, window)
+    if audio_pad.shape[0] <= t_max:
+        return []
+    if policy == "content":
+        return content_split_points(audio, audio_pad, approx, window, t_center, t_query, sr)
+    centers = np.arange(t_center, audio.shape[0], t_center, dtype=np.int64)
+    if len(centers) == 0:
+        return []
+    starts = centers - t_query
+    lengths = np.minimum(centers + t_query, audio.shape[0]) - starts
+    opt = starts + _window_argmins(audio_pad, approx, window, starts, lengths)
+
+    if policy == "vad":
+        frame = sr // 100
+        for i, (start, length) in enumerate(zip(starts, lengths)):
+            pause = _pause_split(audio, int(start), int(length), frame, pause_threshold_db, int(min_pause * sr))
+            if pause is None:
+                continue
+            # Quietest point inside the pause (the pause only narrows the search)
+            p_start = int(start) + pause[0]
+            p_len = pause[1] - pause[0]
+            opt[i] = p_start + _window_argmins(
+                audio_pad, approx, window, np.array([p_start]), np.array([p_len])
+            )[0]
+    return [int(t) for t in opt]
+
+
+
+def _quiet_runs(audio, frame):
+    """(start sample, end sample, mean level) of every run of quiet frames"""
+    n_frames = len(audio) // frame
+    frames = audio[: n_frames * frame].reshape(n_frames, frame).astype(np.float64)
+    level = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-12)
+    quiet = level < maximum_filter1d(level, size=CDC_PEAK_FRAMES, mode="nearest") + CDC_QUIET_DB
+    edges = np.diff(np.concatenate(([0], quiet.astype(np.int8), [0])))
+    starts, ends = np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]
+    return [(int(a) * frame, int(b) * frame, float(level[a:b].mean())) for a, b in zip(starts, ends)]
+
+
+def content_split_points(audio, audio_pad, approx, window, t_center, t_query, sr=16000):
+    """Content-defined split points (see the module comment)"""
+    frame = sr // 100
+    radius = t_center // 4
+    runs = _quiet_runs(audio, frame)
+    centers = np.array([(a + b) // 2 for a, b, _ in runs], dtype=np.int64)
+    # Longer pause wins, then the quieter one
+    scores = [(b - a, -level) for a, b, level in runs]
+    selected = []
+    for i, (a, b, _) in enumerate(runs):
+        if b - a < CDC_MIN_PAUSE * sr or a < radius or b > len(audio) - radius:
+            continue
+        lo, hi = np.searchsorted(centers, centers[i] - radius), np.searchsorted(centers, centers[i] + radius, "right")
+        if all(scores[i] > scores[j] for j in range(lo, hi) if j != i):
+            selected.append((a, b))
+    cuts = []
+    if selected:
+        starts = np.array([a for a, _ in selected], dtype=np.int64)
+        lengths = np.array([b - a for a, b in selected], dtype=np.int64)
+        cuts = [int(t) for t in starts + _window_argmins(audio_pad, approx, window, starts, lengths)]
+
+    # Segments longer than t_center + t_query get extra cuts at the quietest point near the limit
+    max_len = t_center + t_query
+    opt_ts = []
+    prev = 0
+    for cut in cuts + [len(audio)]:
+        while cut - prev > max_len:
+            start = prev + max_len - 2 * t_query
+            prev = start + int(_window_argmins(audio_pad, approx, window, np.array([start]), np.array([2 * t_query]))[0])
+            opt_ts.append(prev)
+        if cut < len(audio):
+            opt_ts.append(cut)
+            prev = cut
+    return opt_ts
@@ -0,0 +1,186 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import torch
+
+import stage_timing
+
+# Fork Feature: one long file converted by several CPU worker processes.
+# VC.pipeline already cuts long inputs at quiet points (opt_ts) and converts every
+# segment on its own, with t_pad of context on both sides that is trimmed afterwards
+# (t_pad_tgt). Segments therefore do not depend on each other: here the parent runs
+# VC.prepare once (high-pass, split points and f0 over the whole file), groups the
+# segments into contiguous shards and sends each shard's padded audio and f0 slice to
+# a pool of processes that hold HuBERT and the voice (shared weights, see
+# shared_weights.py). The trimmed segment outputs are concatenated in order exactly
+# as VC.convert does.
+#
+# With a seed the prior noise of net_g is seeded per segment (VC.convert_segments seeds),
+# so the result matches VC.pipeline(..., seed=seed) run serially; without one (the
+# default, as in the serial path) the noise is unseeded on both paths. Float reductions
+# may still differ in the last bits when the processes use a different number of torch
+# threads. Shards are submitted as pool slots free up, so an aborted conversion
+# (segment_callback raising) only waits for the shards already running.
+# The stage timings of the workers (hubert, index search, synthesis) are sent back with
+# each shard and replayed to the parent's stage listener.
+
+# Shards per worker process: smaller shards balance better at the end of the file
+SHARDS_PER_WORKER = 2
+
+_worker = {}
+
+
+def _init_worker(hubert_path, model_file, precision, backend, hubert_dir, n_threads):
+    # Imported here: the worker builds its own Config (device / x_pad, ...) like the parent
+    from config import Config
+    import infer_backend
+    import model_loader
+
+    torch.set_num_threads(n_threads)
+    config = Config()
+    model_data = model_loader.load_synthesizer(model_file, config, precision)
+    try:
+        runtime_backend = infer_backend.create_backend(backend, model_file, hubert_dir, config.device, n_threads)
+    except FileNotFoundError:
+        runtime_backend = infer_backend.eager_backend()
+    _worker.update(
+        hubert=model_loader.load_hubert(hubert_path, config, precision),
+        model_data=model_data,
+        backend=runtime_backend,
+        precision=precision,
+    )
+
+
+def _convert_shard(shard):
+    vc = _worker["model_data"]["vc"]
+    index = big_npy = None
+    if shard["file_index"] and shard["index_rate"] != 0 and os.path.exists(shard["file_index"]):
+        index, big_npy = vc.load_index(shard["file_index"])
+    prepared = {
+        "audio_pad": shard["audio_pad"],
+        "pitch": None if shard["pitch"] is None else torch.from_numpy(shard["pitch"]).to(vc.device),
+        "pitchf": None if shard["pitchf"] is None else torch.from_numpy(shard["pitchf"]).to(vc.device),
+        "index": index,
+        "big_npy": big_npy,
+        "index_rate": shard["index_rate"],
+    }
+    times = [0, 0, 0]
+    events = []
+    with stage_timing.listen(stage_timing.collector(events)):
+        audio_opt = vc.convert_segments(
+            _worker["hubert"],
+            _worker["model_data"]["net_g"],
+            shard["sid"],
+            prepared,
+            shard["bounds"],
+            times,
+            _worker["model_data"]["version"],
+            _worker["precision"],
+            _worker["backend"],
+            shard["seeds"],
+        )
+    return audio_opt, times, events
+
+
+def group_segments(bounds, n_groups, total_len):
+    """Contiguous groups of segment indices with about the same amount of audio each"""
+    n_groups = max(1, min(n_groups, len(bounds)))
+    lengths = [(a1 if a1 is not None else total_len) - a0 for a0, a1, _, _ in bounds]
+    target = sum(lengths) / float(n_groups)
+    groups, current, acc = [], [], 0.0
+    for i, length in enumerate(lengths):
+        current.append(i)
+        acc += length
+        # Close a group whenever the running total passes the next multiple of target
+        if acc >= target * (len(groups) + 1) and len(groups) < n_groups - 1:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return groups
+
+
+def make_shard(prepared, bounds, indices, sid, seeds, file_index):
+    """Padded audio / f0 slice covering the segments `indices`, with bounds made relative"""
+    a_start, f_start = bounds[indices[0]][0], bounds[indices[0]][2]
+    a_end, f_end = bounds[indices[-1]][1], bounds[indices[-1]][3]
+    pitch, pitchf = prepared["pitch"], prepared["pitchf"]
+    return {
+        "audio_pad": prepared["audio_pad"][a_start:a_end],
+        "pitch": None if pitch is None else pitch[:, f_start:f_end].cpu().numpy(),
+        "pitchf": None if pitchf is None else pitchf[:, f_start:f_end].cpu().numpy(),
+        "bounds": [
+            (a0 - a_start, None if a1 is None else a1 - a_start, f0 - f_start, None if f1 is None else f1 - f_start)
+            for a0, a1, f0, f1 in (bounds[i] for i in indices)
+        ],
+        "seeds": None if seeds is None else [seeds[i] for i in indices],
+        "sid": sid,
+        "file_index": file_index,
+        "index_rate": prepared["index_rate"],
+    }
+
+
+class ShardedConverter(object):
+    """Pool of worker processes holding one voice; convert() splits one file across them"""
+
+    def __init__(self, hubert_path, model_file, workers, precision="fp32", backend="eager", hubert_dir=None):
+        self.key = (str(hubert_path), str(model_file), precision, backend)
+        self.workers = max(1, int(workers))
+        n_threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                str(hubert_path),
+                str(model_file),
+                precision,
+                backend,
+                str(hubert_dir or os.path.dirname(str(hubert_path))),
+                n_threads,
+            ),
+        )
+
+    def convert(self, vc, prepared, sid, times, file_index, seed=None, segment_callback=None):
+        """Same output as vc.convert(..., seed=seed) for a prepared file.
+        segment_callback(index, total) runs before each shard result is collected, with at
+        most one shard per worker in flight; if it raises, no further shard is submitted."""
+        bounds = vc.segment_bounds(prepared["opt_ts"])
+        seeds = None if seed is None else [seed + i for i in range(len(bounds))]
+        groups = group_segments(bounds, self.workers * SHARDS_PER_WORKER, len(prepared["audio_pad"]))
+        futures = []
+
+        def submit_ready():
+            # One shard per free worker (shards may complete out of order)
+            while len(futures) < len(groups) and sum(not f.done() for f in futures) < self.workers:
+                indices = groups[len(futures)]
+                futures.append(
+                    self.pool.submit(_convert_shard, make_shard(prepared, bounds, indices, sid, seeds, file_index))
+                )
+
+        audio_opt = []
+        for i in range(len(groups)):
+            if segment_callback is not None:
+                try:
+                    segment_callback(i, len(groups))
+                except BaseException:
+                    for pending in futures[i:]:
+                        pending.cancel()
+                    raise
+            submit_ready()
+            while not futures[i].done():
+                wait([f for f in futures[i:] if not f.done()], return_when=FIRST_COMPLETED)
+                submit_ready()
+            segments, shard_times, events = futures[i].result()
+            audio_opt.extend(segments)
+            for name, start, seconds, labels in events:
+                stage_timing.record(name, seconds, start, shard=i, **labels)
+            # Per-process time summed: the busy time of the pool, not the wall time
+            times[0] += shard_times[0]
+            times[2] += shard_times[2]
+        return np.concatenate(audio_opt)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
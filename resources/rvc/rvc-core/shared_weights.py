@@ -0,0 +1,111 @@
+import hashlib
+import os
+
+import torch
+
+# Fork Feature: model weights shared between inference processes.
+# Every rvc_wrapper.py run, server and pool worker used to keep a private copy of
+# HuBERT (~360 MB in fp32) and of each voice. Here the fp32 state_dict of a module is
+# written once to a cache file and every process maps that file (torch.load(mmap=True))
+# and points the module parameters at the mapping (load_state_dict(assign=True)).
+# The mapping is copy-on-write, but inference never writes to the weights, so all
+# processes read the same page-cache pages: one physical copy per host.
+#
+# Only applies to fp32 CPU inference: half precision and GPU copies are private by
+# nature, and the int8 variants (cpu_precision) quantize into new private tensors.
+# RVC_SHARED_WEIGHTS=0 disables it; RVC_SHARED_WEIGHTS_DIR moves the cache.
+
+CACHE_VERSION = 1
+
+
+def supported():
+    """torch.load(mmap=True) and load_state_dict(assign=True) need torch >= 2.1"""
+    try:
+        major, minor = (int(v) for v in torch.__version__.split(".")[:2])
+    except ValueError:
+        return False
+    return (major, minor) >= (2, 1)
+
+
+def enabled(config):
+    if os.environ.get("RVC_SHARED_WEIGHTS", "1").lower() in ("0", "false", "no"):
+        return False
+    return str(config.device).startswith("cpu") and not config.is_half and supported()
+
+
+def cache_dir():
+    path = os.environ.get("RVC_SHARED_WEIGHTS_DIR") or os.path.join(os.getcwd(), "cache", "shared_weights")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def cache_path(source_path, tag=""):
+    """Cache file for a source checkpoint; changes whenever the source file changes"""
+    stat = os.stat(str(source_path))
+    key = "%s|%d|%d|%s|%d" % (os.path.abspath(str(source_path)), stat.st_size, int(stat.st_mtime), tag, CACHE_VERSION)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(str(source_path)))[0]
+    return os.path.join(cache_dir(), "%s-%s%s.pt" % (stem, tag, digest))
+
+
+def load_checkpoint(path):
+    """torch.load of a checkpoint, memory-mapped when the file format allows it"""
+    if supported():
+        try:
+            return torch.load(str(path), map_location="cpu", mmap=True)
+        except RuntimeError:
+            # Legacy (non-zip) checkpoints cannot be mapped
+            pass
+    return torch.load(str(path), map_location="cpu")
+
+
+def share_module(module, source_path, tag=""):
+    """Point the parameters and buffers of `module` at a shared read-only mapping"""
+    path = cache_path(source_path, tag)
+    if not os.path.exists(path):
+        state = {k: v.detach().float().contiguous() if v.is_floating_point() else v for k, v in module.state_dict().items()}
+        # Several processes may race to create the file; the rename is atomic
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)
+        del state
+    shared = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    module.load_state_dict(shared, assign=True)
+    return module
+
+
+def _read_smaps_rollup(pid):
+    fields = {}
+    with open("/proc/%s/smaps_rollup" % pid, "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return fields
+
+
+def memory_usage(pid=None):
+    """RSS / PSS / USS / shared bytes of a process (MB); {} when not available.
+    RSS counts shared pages in full in every process; PSS splits them between the
+    processes that map them and USS only counts the private ones."""
+    mb = 1024.0 * 1024.0
+    try:
+        fields = _read_smaps_rollup(pid or "self")
+        return {
+            "rss_mb": round(fields.get("Rss", 0) / mb, 1),
+            "pss_mb": round(fields.get("Pss", 0) / mb, 1),
+            "uss_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / mb, 1),
+            "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / mb, 1),
+        }
+    except OSError:
+        pass
+    try:
+        import psutil
+
+        info = psutil.Process(pid or os.getpid()).memory_full_info()
+        usage = {"rss_mb": round(info.rss / mb, 1), "uss_mb": round(info.uss / mb, 1)}
+        if hasattr(info, "pss"):
+            usage["pss_mb"] = round(info.pss / mb, 1)
+        return usage
+    except Exception:
+        return {}
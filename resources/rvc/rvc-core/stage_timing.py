@@ -0,0 +1,65 @@
+import contextvars
+from contextlib import contextmanager
+from time import perf_counter, time
+
+# Fork Feature: per-stage timing hooks for telemetry and tracing.
+# VC.prepare / VC.vc report how long each stage took (filter, segmentation, f0,
+# hubert, index search, synthesis...) to the listeners installed in the current context
+# (thread). Without a listener a stage costs one ContextVar lookup, so the hooks stay in
+# place in production; the server installs a listener per job and turns the events
+# into /metrics histograms, and trace_profiler records them as a timeline.
+#
+# A listener is called as callback(stage, start, seconds, labels), with start in epoch
+# seconds (comparable across processes) and seconds measured with perf_counter.
+# Listeners nest: listen() inside listen() sends the events to both.
+
+_listener = contextvars.ContextVar("rvc_stage_listener", default=None)
+
+
+@contextmanager
+def listen(callback):
+    """Send the stage events of this context to callback (and to the listeners already installed)"""
+    outer = _listener.get()
+    if outer is not None:
+        inner = callback
+
+        def callback(name, start, seconds, labels):
+            inner(name, start, seconds, labels)
+            outer(name, start, seconds, labels)
+
+    token = _listener.set(callback)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def active():
+    return _listener.get() is not None
+
+
+def record(stage, seconds, start=None, **labels):
+    """Report a stage measured by the caller; start defaults to `seconds` ago"""
+    callback = _listener.get()
+    if callback is not None:
+        callback(stage, time() - seconds if start is None else start, seconds, labels)
+
+
+@contextmanager
+def stage(name, **labels):
+    """Time the body as stage `name` (only when a listener is installed).
+    The labels dict may be filled in by the body (e.g. output sizes)."""
+    callback = _listener.get()
+    if callback is None:
+        yield labels
+        return
+    start, t0 = time(), perf_counter()
+    try:
+        yield labels
+    finally:
+        callback(name, start, perf_counter() - t0, labels)
+
+
+def collector(events):
+    """Listener that appends (stage, start, seconds, labels) tuples to `events`"""
+    return lambda name, start, seconds, labels: events.append((name, start, seconds, labels))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# rvc-core modules import each other as top-level modules (the GUI runs with CWD = rvc-core)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,70 @@
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")  # compact_index
+
+import chunk_reuse
+import compact_index
+
+
+def _params(vc, model_file, index_file):
+    return chunk_reuse.conversion_params(vc, model_file, index_file, "v2", 40000, 1, 0, "rmvpe", 0.75, "fp32", "torch")
+
+
+def test_compacting_a_voice_changes_the_chunk_keys(tmp_path):
+    vc = SimpleNamespace(x_pad=3)
+    model_file = tmp_path / "voice.pth"
+    model_file.write_bytes(b"weights")
+    index_file = tmp_path / "voice.index"
+    index_file.write_bytes(b"original index")
+    raw_audio = np.random.default_rng(0).standard_normal(16000).astype(np.float32)
+
+    before, _ = chunk_reuse.chunk_keys(raw_audio, [8000], 160, _params(vc, model_file, str(index_file)))
+    compact = compact_index.compact_path(str(index_file))
+    with open(compact, "wb") as f:
+        f.write(b"compacted index")
+    stat = os.stat(index_file)
+    os.utime(compact, (stat.st_atime, stat.st_mtime + 1))
+    after, _ = chunk_reuse.chunk_keys(raw_audio, [8000], 160, _params(vc, model_file, str(index_file)))
+
+    assert compact_index.resolve_index_file(str(index_file)) == compact
+    assert not set(before) & set(after)
+
+
+class _SlowVC(object):
+    t_pad = 160
+
+    def segment_bounds(self, opt_ts):
+        cuts = [0] + list(opt_ts) + [16000]
+        return [(a, b, a, b) for a, b in zip(cuts[:-1], cuts[1:])]
+
+    def convert_segments(self, model, net_g, sid, prepared, bounds, times, version, precision, backend, seeds, callback):
+        callback(0, 1)
+        time.sleep(0.05)
+        return [np.zeros(bounds[0][1] - bounds[0][0], dtype=np.float32)]
+
+
+def test_preempted_time_is_not_stored_as_conversion_time(tmp_path):
+    store = chunk_reuse.ChunkStore(tmp_path)
+    raw_audio = np.random.default_rng(1).standard_normal(16000).astype(np.float32)
+    prepared = {"opt_ts": [8000]}
+
+    def preempted(_n, _total):
+        time.sleep(0.5)
+
+    _, report = chunk_reuse.convert_with_reuse(
+        _SlowVC(), store, {"model": "x"}, raw_audio, prepared, None, None, 0, {}, "v2", segment_callback=preempted
+    )
+    assert report["reused_segments"] == 0
+    keys, _ = chunk_reuse.chunk_keys(raw_audio, [8000], 160, {"model": "x"})
+    for key in keys:
+        assert store.get(key)[1] < 0.4
+    _, report = chunk_reuse.convert_with_reuse(
+        _SlowVC(), store, {"model": "x"}, raw_audio, prepared, None, None, 0, {}, "v2", segment_callback=preempted
+    )
+    assert report["reused_segments"] == 2
+    assert report["saved_s"] < 0.8
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import index_search
+
+
+def test_fp32_queries_on_fp16_index():
+    # is_half keeps the index in fp16 while TorchScript / ONNX backends return fp32 features
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    rng = np.random.default_rng(0)
+    big_npy = rng.standard_normal((500, 64)).astype(np.float32)
+    index = index_search.TorchIndex(big_npy, device, torch.float16)
+    feats = torch.from_numpy(big_npy[:10] + 0.01 * rng.standard_normal((10, 64)).astype(np.float32)).to(device)
+
+    score, ix = index.search(feats, k=8)
+    assert ix[:, 0].cpu().tolist() == list(range(10))
+    assert score.dtype == torch.float32
+
+    blended = index.retrieve(feats, k=8)
+    assert blended.dtype == torch.float32
+    assert blended.shape == feats.shape
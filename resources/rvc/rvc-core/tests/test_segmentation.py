@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import segmentation
+
+SR = 16000
+WINDOW = 160
+# (x_pad, x_query, x_center, x_max) of Config.device_config
+X_CONFIGS = [(3, 10, 60, 65), (1, 6, 38, 41), (1, 5, 30, 32)]
+
+
+def legacy_split_points(audio, window, t_center, t_query, t_max):
+    """The original VC.pipeline implementation, kept as the reference"""
+    audio_pad = np.pad(audio, (window // 2, window // 2), mode="reflect")
+    opt_ts = []
+    if audio_pad.shape[0] > t_max:
+        audio_sum = np.zeros_like(audio)
+        for i in range(window):
+            audio_sum += audio_pad[i : i - window]
+        for t in range(t_center, audio.shape[0], t_center):
+            opt_ts.append(
+                t
+                - t_query
+                + np.where(
+                    np.abs(audio_sum[t - t_query : t + t_query])
+                    == np.abs(audio_sum[t - t_query : t + t_query]).min()
+                )[0][0]
+            )
+    return opt_ts
+
+
+def _noise(seconds, seed, dtype):
+    rng = np.random.default_rng(seed)
+    return (0.3 * rng.standard_normal(int(seconds * SR))).astype(dtype)
+
+
+def _with_silences(seconds, seed, dtype):
+    audio = _noise(seconds, seed, dtype)
+    rng = np.random.default_rng(seed + 1)
+    # Exact digital silence (ties in |moving sum|) and quiet pauses
+    for start in rng.integers(0, len(audio) - SR, 40):
+        audio[start : start + rng.integers(SR // 20, SR)] = 0
+    for start in rng.integers(0, len(audio) - SR, 40):
+        audio[start : start + SR // 2] *= 1e-3
+    return audio
+
+
+@pytest.mark.parametrize("x_pad, x_query, x_center, x_max", X_CONFIGS)
+@pytest.mark.parametrize("make_audio", [_noise, _with_silences])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_energy_policy_reproduces_legacy_opt_ts(x_pad, x_query, x_center, x_max, make_audio, dtype):
+    t_query, t_center, t_max = SR * x_query, SR * x_center, SR * x_max
+    for seed, seconds in ((0, 3.5 * x_center), (1, 5 * x_center + 7.3)):
+        audio = make_audio(seconds, seed, dtype)
+        expected = legacy_split_points(audio, WINDOW, t_center, t_query, t_max)
+        assert len(expected) > 0
+        assert segmentation.find_split_points(audio, WINDOW, t_center, t_query, t_max) == [int(t) for t in expected]
+
+
+@pytest.mark.parametrize("x_pad, x_query, x_center, x_max", X_CONFIGS)
+def test_short_audio_is_not_split(x_pad, x_query, x_center, x_max):
+    audio = _noise(x_max - 1, 0, np.float32)
+    assert segmentation.find_split_points(audio, WINDOW, SR * x_center, SR * x_query, SR * x_max) == []
@@ -0,0 +1,30 @@
+from my_utils import load_audio
+
+# Fork Feature: convert only a time range of the input (previews of long files).
+# FFmpeg seeks to the range and decodes it plus `context` seconds on each side, so f0,
+# HuBERT and net_g run on a few seconds instead of the whole upload. The context stands in
+# for what surrounds the range in a full conversion: the high-pass filtfilt and the f0
+# estimators see real audio instead of the reflected padding at the edges, and HuBERT /
+# net_g get real neighbours, like the t_pad context every segment of a full conversion has
+# (callers pass vc.x_pad).
+# The converted context is then trimmed off. Where the full conversion puts a split point
+# inside the range the output differs slightly around that point (it is one segment here).
+
+DEFAULT_CONTEXT_S = 1.0
+
+
+def load_range(file, sr, start=None, end=None, context=DEFAULT_CONTEXT_S):
+    """Audio of [start, end] (s; None = beginning / end of file) plus up to `context` s on
+    each side, and the offset (s) of `start` inside it"""
+    start = start or 0.0
+    decode_start = max(0.0, start - context)
+    duration = None if end is None else end + context - decode_start
+    return load_audio(file, sr, decode_start, duration), start - decode_start
+
+
+def trim_range(audio_opt, tgt_sr, offset, start=None, end=None):
+    """Converted range without its context (offset as returned by load_range)"""
+    first = int(round(offset * tgt_sr))
+    if end is None:
+        return audio_opt[first:]
+    return audio_opt[first : first + int(round((end - (start or 0.0)) * tgt_sr))]
@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+
+# Fork Feature: Chrome-trace timelines of a conversion.
+# TraceRecorder is a stage_timing listener: every stage reported while it is installed
+# (decode, filter, segmentation, f0, per-segment hubert / index search / synthesis,
+# empty_cache, write...) becomes a complete ("X") event with its process, thread and
+# labels (sizes, methods). save() writes the Trace Event JSON that chrome://tracing and
+# https://ui.perfetto.dev open directly. Nested stages show up nested because their
+# intervals are nested. When no recorder is installed nothing is recorded or allocated.
+#
+# Events replayed from sharded_convert workers carry a "shard" label and are drawn on
+# one track per shard.
+
+
+class TraceRecorder(object):
+    def __init__(self, name="conversion"):
+        self.name = name
+        self.events = []
+        self.threads = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def __call__(self, stage, start, seconds, labels):
+        if "shard" in labels:
+            tid = "shard %s" % labels["shard"]
+        else:
+            thread = threading.current_thread()
+            tid = "%s (%d)" % (thread.name, thread.ident)
+        event = {
+            "name": stage,
+            "cat": "rvc",
+            "ph": "X",
+            "ts": start * 1e6,
+            "dur": seconds * 1e6,
+            "pid": self.pid,
+            "tid": tid,
+        }
+        if labels:
+            event["args"] = {k: v if isinstance(v, (int, float, str, bool)) else str(v) for k, v in labels.items()}
+        with self.lock:
+            self.events.append(event)
+
+    def to_json(self):
+        with self.lock:
+            events = sorted(self.events, key=lambda e: e["ts"])
+        if events:
+            # Relative timestamps: the timeline starts at 0 instead of the epoch
+            origin = events[0]["ts"]
+            events = [dict(e, ts=round(e["ts"] - origin, 1), dur=round(e["dur"], 1)) for e in events]
+        tids = sorted({e["tid"] for e in events})
+        # String thread ids are mapped to integers, named with metadata events
+        ids = {tid: i + 1 for i, tid in enumerate(tids)}
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": self.name}}]
+        metadata += [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": ids[tid], "args": {"name": tid}} for tid in tids
+        ]
+        return {
+            "traceEvents": metadata + [dict(e, tid=ids[e["tid"]]) for e in events],
+            "displayTimeUnit": "ms",
+        }
+
+    def save(self, path):
+        directory = os.path.dirname(str(path))
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(str(path), "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f)
+        return str(path)
+
+    def summary(self):
+        """Total seconds per stage (top-level view of the trace)"""
+        totals = {}
+        with self.lock:
+            for event in self.events:
+                totals[event["name"]] = totals.get(event["name"], 0.0) + event["dur"] / 1e6
+        return dict(sorted(totals.items(), key=lambda item: -item[1]))
@@ -6,6 +6,12 @@ import scipy.signal as signal
 import pyworld, os, traceback, faiss
 from scipy import signal
 from torch import Tensor # Fork Feature. Used for pitch prediction for the torchcrepe f0 inference computation
+import cpu_precision # Fork Feature. Reduced precision modes for CPU inference
+import infer_backend # Fork Feature. Eager / TorchScript / ONNX Runtime backends
+import index_search # Fork Feature. Exact top-k retrieval on the inference device
+import compact_index # Fork Feature. Compacted (k-means / IVF) indexes written by compact_index.py
+import segmentation # Fork Feature. Vectorized split-point search
+import stage_timing # Fork Feature. Per-stage timing events (metrics / traces)
 
 bh, ah = signal.butter(N=5, Wn=48, btype="high", fs=16000)
 
@@ -27,6 +33,8 @@ class VC(object):
         self.t_center = self.sr * self.x_center  # 查询切点位置
         self.t_max = self.sr * self.x_max  # 免查询时长阈值
         self.device = config.device
+        self.cpu_precision = getattr(config, "cpu_precision", "fp32")
+        self.index_cache = None  # (path, mtime, index, big_npy) of the last index used
 
     #region f0 Overhaul Region
     # Fork Feature: Get the best torch device to use for f0 algorithms that require a torch device. Will return the type (torch.device)
@@ -182,7 +190,10 @@ class VC(object):
         big_npy,
         index_rate,
         version,
+        precision="fp32",
+        backend=None,
     ):  # ,file_index,file_big_npy
+        backend = backend or infer_backend.eager_backend()
         feats = torch.from_numpy(audio0)
         if self.is_half:
             feats = feats.half()
@@ -194,17 +205,51 @@ class VC(object):
         feats = feats.view(1, -1)
         padding_mask = torch.BoolTensor(feats.shape).to(self.device).fill_(False)
 
-        inputs = {
-            "source": feats.to(self.device),
-            "padding_mask": padding_mask,
-            "output_layer": 9 if version == "v1" else 12,
-        }
         t0 = ttime()
-        with torch.no_grad():
-            logits = model.extract_features(**inputs)
-            feats = model.final_proj(logits[0]) if version == "v1" else logits[0]
+        with torch.no_grad(), cpu_precision.autocast(precision):
+            feats = backend.extract_features(model, feats.to(self.device), padding_mask, version)
+        if precision == "bf16":
+            feats = feats.float()
+        t_hubert = ttime()
+        stage_timing.record("hubert", t_hubert - t0, samples=audio0.shape[0], frames=feats.shape[1])
 
-        if (
+        feats = self.blend_index(feats, index, big_npy, index_rate)
+        if index is not None and index_rate != 0:
+            stage_timing.record("index_search", ttime() - t_hubert, frames=feats.shape[1], index_rate=index_rate)
+        feats = F.interpolate(feats.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)
+        t1 = ttime()
+        p_len = audio0.shape[0] // self.window
+        if feats.shape[1] < p_len:
+            p_len = feats.shape[1]
+            if pitch != None and pitchf != None:
+                pitch = pitch[:, :p_len]
+                pitchf = pitchf[:, :p_len]
+        p_len = torch.tensor([p_len], device=self.device).long()
+        with torch.no_grad(), cpu_precision.autocast(precision):
+            audio1 = (
+                backend.infer(net_g, feats, p_len, pitch, pitchf, sid)
+                .data.cpu()
+                .float()
+                .numpy()
+            )
+        if stage_timing.active():
+            stage_timing.record("synthesis", ttime() - t1, frames=feats.shape[1], output_samples=audio1.shape[-1])
+        del feats, p_len, padding_mask
+        if torch.cuda.is_available():
+            with stage_timing.stage("empty_cache"):
+                torch.cuda.empty_cache()
+        t2 = ttime()
+        times[0] += t1 - t0
+        times[2] += t2 - t1
+        return audio1
+
+    # Fork Feature: retrieval blend of VC.vc as its own step (also used by realtime_vc)
+    def blend_index(self, feats, index, big_npy, index_rate):
+        """Mix (1 - index_rate) of the HuBERT features with the weighted top-8 index neighbours"""
+        if isinstance(index, index_search.TorchIndex) and index_rate != 0:
+            npy = index.retrieve(feats[0], k=8)
+            feats = npy.unsqueeze(0) * index_rate + (1 - index_rate) * feats
+        elif (
             isinstance(index, type(None)) == False
             and isinstance(big_npy, type(None)) == False
             and index_rate != 0
@@ -227,53 +272,39 @@ class VC(object):
                 torch.from_numpy(npy).unsqueeze(0).to(self.device) * index_rate
                 + (1 - index_rate) * feats
             )
+        return feats
 
-        feats = F.interpolate(feats.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)
-        t1 = ttime()
-        p_len = audio0.shape[0] // self.window
-        if feats.shape[1] < p_len:
-            p_len = feats.shape[1]
-            if pitch != None and pitchf != None:
-                pitch = pitch[:, :p_len]
-                pitchf = pitchf[:, :p_len]
-        p_len = torch.tensor([p_len], device=self.device).long()
-        with torch.no_grad():
-            if pitch != None and pitchf != None:
-                audio1 = (
-                    (net_g.infer(feats, p_len, pitch, pitchf, sid)[0][0, 0])
-                    .data.cpu()
-                    .float()
-                    .numpy()
-                )
-            else:
-                audio1 = (
-                    (net_g.infer(feats, p_len, sid)[0][0, 0]).data.cpu().float().numpy()
-                )
-        del feats, p_len, padding_mask
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-        t2 = ttime()
-        times[0] += t1 - t0
-        times[2] += t2 - t1
-        return audio1
+    # Fork Feature: keep the last index in memory (one per voice) and prefer its compacted version
+    def load_index(self, file_index):
+        file_index = compact_index.resolve_index_file(file_index)
+        mtime = os.path.getmtime(file_index)
+        if self.index_cache is not None and self.index_cache[:2] == (file_index, mtime):
+            return self.index_cache[2], self.index_cache[3]
+        index = faiss.read_index(file_index)
+        # big_npy = np.load(file_big_npy)
+        big_npy = index.reconstruct_n(0, index.ntotal)
+        if index_search.use_torch_index(index.ntotal, self.device):
+            index = index_search.TorchIndex(
+                big_npy, self.device, torch.float16 if self.is_half else torch.float32
+            )
+        self.index_cache = (file_index, mtime, index, big_npy)
+        return index, big_npy
 
-    def pipeline(
+    def prepare(
         self,
-        model,
-        net_g,
-        sid,
         audio,
         times,
         f0_up_key,
         f0_method,
         file_index,
-        # file_big_npy,
         index_rate,
         if_f0,
-        version,
         crepe_hop_length,
         f0_file=None,
+        split_policy="energy",
     ):
+        """Fork Feature: everything before HuBERT/net_g (index, high-pass, split points, f0).
+        Needs no model, so it can run for the next file while the current one is converted."""
         if (
             file_index != ""
             # and file_big_npy != ""
@@ -282,33 +313,19 @@ class VC(object):
             and index_rate != 0
         ):
             try:
-                index = faiss.read_index(file_index)
-                # big_npy = np.load(file_big_npy)
-                big_npy = index.reconstruct_n(0, index.ntotal)
+                with stage_timing.stage("index_load"):
+                    index, big_npy = self.load_index(file_index)
             except:
                 traceback.print_exc()
                 index = big_npy = None
         else:
             index = big_npy = None
-        audio = signal.filtfilt(bh, ah, audio)
-        audio_pad = np.pad(audio, (self.window // 2, self.window // 2), mode="reflect")
-        opt_ts = []
-        if audio_pad.shape[0] > self.t_max:
-            audio_sum = np.zeros_like(audio)
-            for i in range(self.window):
-                audio_sum += audio_pad[i : i - self.window]
-            for t in range(self.t_center, audio.shape[0], self.t_center):
-                opt_ts.append(
-                    t
-                    - self.t_query
-                    + np.where(
-                        np.abs(audio_sum[t - self.t_query : t + self.t_query])
-                        == np.abs(audio_sum[t - self.t_query : t + self.t_query]).min()
-                    )[0][0]
-                )
-        s = 0
-        audio_opt = []
-        t = None
+        with stage_timing.stage("filter", samples=len(audio)):
+            audio = signal.filtfilt(bh, ah, audio)
+        with stage_timing.stage("segmentation", policy=split_policy):
+            opt_ts = segmentation.find_split_points(
+                audio, self.window, self.t_center, self.t_query, self.t_max, policy=split_policy
+            )
         t1 = ttime()
         audio_pad = np.pad(audio, (self.t_pad, self.t_pad), mode="reflect")
         p_len = audio_pad.shape[0] // self.window
@@ -323,7 +340,6 @@ class VC(object):
                 inp_f0 = np.array(inp_f0, dtype="float32")
             except:
                 traceback.print_exc()
-        sid = torch.tensor(sid, device=self.device).unsqueeze(0).long()
         pitch, pitchf = None, None
         if if_f0 == 1:
             pitch, pitchf = self.get_f0(audio_pad, p_len, f0_up_key, f0_method, crepe_hop_length, inp_f0)
@@ -333,75 +349,115 @@ class VC(object):
             pitchf = torch.tensor(pitchf, device=self.device).unsqueeze(0).float()
         t2 = ttime()
         times[1] += t2 - t1
+        if if_f0 == 1:
+            stage_timing.record("f0", t2 - t1, method=f0_method, frames=p_len)
+        return {
+            "audio_pad": audio_pad,
+            "opt_ts": opt_ts,
+            "pitch": pitch,
+            "pitchf": pitchf,
+            "index": index,
+            "big_npy": big_npy,
+            "index_rate": index_rate,
+        }
+
+    def segment_bounds(self, opt_ts):
+        """(audio start, audio end, f0 start, f0 end) of every segment; None = open end"""
+        bounds = []
+        s = 0
+        t = None
         for t in opt_ts:
             t = t // self.window * self.window
-            if if_f0 == 1:
+            bounds.append((s, t + self.t_pad2 + self.window, s // self.window, (t + self.t_pad2) // self.window))
+            s = t
+        if t is None:
+            bounds.append((0, None, 0, None))
+        else:
+            bounds.append((t, None, t // self.window, None))
+        return bounds
+
+    def convert_segments(
+        self, model, net_g, sid, prepared, bounds, times, version, precision=None, backend=None, seeds=None, segment_callback=None
+    ):
+        """Fork Feature: trimmed net_g output of each (a0, a1, f0, f1) segment of a prepare() result.
+        seeds (one per segment) makes every segment reproducible on its own, whatever
+        ran before it; sharded_convert relies on it to match the serial output.
+        segment_callback(index, total) runs before every segment: it may raise to abort the
+        conversion (cancellation) or block to yield the device to other work (scheduling)."""
+        precision = cpu_precision.resolve_precision(precision or self.cpu_precision, self.device)
+        audio_pad, pitch, pitchf = prepared["audio_pad"], prepared["pitch"], prepared["pitchf"]
+        sid = torch.tensor(sid, device=self.device).unsqueeze(0).long()
+        audio_opt = []
+        for i, (a0, a1, f0, f1) in enumerate(bounds):
+            if segment_callback is not None:
+                segment_callback(i, len(bounds))
+            if seeds is not None:
+                torch.manual_seed(seeds[i])
+            with stage_timing.stage("segment", index=i, samples=len(audio_pad[a0:a1])):
                 audio_opt.append(
                     self.vc(
                         model,
                         net_g,
                         sid,
-                        audio_pad[s : t + self.t_pad2 + self.window],
-                        pitch[:, s // self.window : (t + self.t_pad2) // self.window],
-                        pitchf[:, s // self.window : (t + self.t_pad2) // self.window],
+                        audio_pad[a0:a1],
+                        pitch[:, f0:f1] if pitch is not None else None,
+                        pitchf[:, f0:f1] if pitchf is not None else None,
                         times,
-                        index,
-                        big_npy,
-                        index_rate,
+                        prepared["index"],
+                        prepared["big_npy"],
+                        prepared["index_rate"],
                         version,
+                        precision,
+                        backend,
                     )[self.t_pad_tgt : -self.t_pad_tgt]
                 )
-            else:
-                audio_opt.append(
-                    self.vc(
-                        model,
-                        net_g,
-                        sid,
-                        audio_pad[s : t + self.t_pad2 + self.window],
-                        None,
-                        None,
-                        times,
-                        index,
-                        big_npy,
-                        index_rate,
-                         version,
-                    )[self.t_pad_tgt : -self.t_pad_tgt]
-                )
-            s = t
-        if if_f0 == 1:
-            audio_opt.append(
-                self.vc(
-                    model,
-                    net_g,
-                    sid,
-                    audio_pad[t:],
-                    pitch[:, t // self.window :] if t is not None else pitch,
-                    pitchf[:, t // self.window :] if t is not None else pitchf,
-                    times,
-                    index,
-                    big_npy,
-                    index_rate,
-                     version,
-                )[self.t_pad_tgt : -self.t_pad_tgt]
-            )
-        else:
-            audio_opt.append(
-                self.vc(
-                    model,
-                    net_g,
-                    sid,
-                    audio_pad[t:],
-                    None,
-                    None,
-                    times,
-                    index,
-                    big_npy,
-                    index_rate,
-                     version,
-                )[self.t_pad_tgt : -self.t_pad_tgt]
-            )
-        audio_opt = np.concatenate(audio_opt)
         del pitch, pitchf, sid
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
-        return audio_opt
\ No newline at end of file
+        return audio_opt
+
+    def convert(self, model, net_g, sid, prepared, times, version, precision=None, backend=None, seed=None, segment_callback=None):
+        """Fork Feature: HuBERT + net_g over the segments of a prepare() result"""
+        bounds = self.segment_bounds(prepared["opt_ts"])
+        seeds = None if seed is None else [seed + i for i in range(len(bounds))]
+        return np.concatenate(
+            self.convert_segments(
+                model, net_g, sid, prepared, bounds, times, version, precision, backend, seeds, segment_callback
+            )
+        )
+
+    def pipeline(
+        self,
+        model,
+        net_g,
+        sid,
+        audio,
+        times,
+        f0_up_key,
+        f0_method,
+        file_index,
+        # file_big_npy,
+        index_rate,
+        if_f0,
+        version,
+        crepe_hop_length,
+        f0_file=None,
+        precision=None,
+        backend=None,
+        split_policy="energy",
+        seed=None,
+        segment_callback=None,
+    ):
+        prepared = self.prepare(
+            audio,
+            times,
+            f0_up_key,
+            f0_method,
+            file_index,
+            index_rate,
+            if_f0,
+            crepe_hop_length,
+            f0_file,
+            split_policy,
+        )
+        return self.convert(model, net_g, sid, prepared, times, version, precision, backend, seed, segment_callback)
\ No newline at end of file
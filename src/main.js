@@ -271,6 +271,37 @@ async function convertWithRVC(inputPath, rvcVoice, pitch, outputPath, f0Method =
     });
 }
 
+/**
+ * Compactar o .index de uma voz baixada (k-means + IVF) em segundo plano
+ * Vozes com índices grandes ganham um .compact.index que o pipeline RVC usa automaticamente
+ */
+function compactVoiceIndex(voicePath) {
+    const rvcGuiPath = path.join(app.getPath('userData'), 'turbovoicer', 'rvc-gui', 'RVC-GUI');
+    const pythonPath = path.join(rvcGuiPath, 'runtime', 'python.exe');
+    const scriptPath = path.join(rvcGuiPath, 'compact_index.py');
+    
+    if (!fs.existsSync(pythonPath) || !fs.existsSync(scriptPath)) {
+        return;
+    }
+    
+    const compactProcess = spawn(pythonPath, [scriptPath, voicePath], {
+        cwd: rvcGuiPath,
+        windowsHide: true
+    });
+    
+    compactProcess.stdout.on('data', (data) => {
+        console.log('[Index Compact]', data.toString().trim());
+    });
+    
+    compactProcess.stderr.on('data', (data) => {
+        console.error('[Index Compact STDERR]', data.toString().trim());
+    });
+    
+    compactProcess.on('error', (error) => {
+        console.error('[Index Compact] Erro:', error.message);
+    });
+}
+
 // ============================================
 // IPC HANDLERS - BASIC
 // ============================================
@@ -418,6 +449,10 @@ ipcMain.handle('turbovoicer:downloadVoice', async (event, voiceId) => {
             }
         });
         
+        if (result && result.installPath) {
+            compactVoiceIndex(result.installPath);
+        }
+        
         return { success: true, result };
     } catch (error) {
         console.error('[TurboVoicer] Erro no download:', error);
@@ -0,0 +1,203 @@
+"""
+TurboRVC Cost Model
+Previsão da duração das conversões a partir do histórico de jobs.
+
+Cada conversão concluída grava uma linha JSONL com as características do job
+(duração do áudio, versão do modelo, método de f0, dispositivo, precisão,
+backend, tamanho do .index, shards) e os tempos medidos (npy, f0, infer e o
+tempo de serviço total). O modelo é um ajuste por mínimos quadrados (com um
+pouco de regularização) do tempo de serviço como custo fixo + custo por
+segundo de áudio, em que o custo por segundo varia com cada característica:
+
+    tempo ≈ w0 + dur * (w1 + Σ w_k · característica_k)
+
+Com poucos jobs no histórico a previsão cai para a razão mediana
+tempo / segundo de áudio. O erro de cada previsão (feita na admissão) é
+comparado com o tempo real e exposto em stats().
+
+Só os últimos max_records jobs entram no ajuste; quando o arquivo passa de
+2 × max_records linhas ele é reescrito com esses jobs (no início e durante o uso).
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Jobs necessários antes de confiar no ajuste (abaixo disso: razão mediana)
+MIN_FIT_RECORDS = 8
+# Reajuste a cada N jobs novos
+REFIT_EVERY = 5
+# Regularização (ridge) dos pesos, exceto o custo fixo e o custo base por segundo
+RIDGE = 1e-3
+# Segundos de processamento por segundo de áudio antes de qualquer histórico
+DEFAULT_SECONDS_PER_AUDIO_SECOND = 0.5
+
+CATEGORICAL = ("version", "f0_method", "device", "precision", "backend")
+
+
+def job_features(audio_seconds, version, f0_method, device, precision, backend, index_bytes, shards):
+    """Características de um job (dict serializável)"""
+    return {
+        "audio_s": round(float(audio_seconds), 3),
+        "version": str(version or "unknown"),
+        "f0_method": str(f0_method),
+        "device": str(device).split(":")[0],
+        "precision": str(precision),
+        "backend": str(backend or "eager"),
+        "index_mb": round(index_bytes / (1024.0 * 1024.0), 1),
+        "shards": int(shards),
+    }
+
+
+class CostModel:
+    def __init__(self, history_path, max_records=2000):
+        self.history_path = str(history_path)
+        self.records = deque(maxlen=max_records)
+        self.lock = threading.Lock()
+        self.columns = []
+        self.weights = None
+        self.pending_refit = 0
+        self.errors = deque(maxlen=500)  # (previsto, real) dos últimos jobs
+        self.file_lock = threading.Lock()
+        self.file_lines = 0  # linhas no arquivo de histórico
+        self._load()
+        if self.file_lines > 2 * max_records:
+            self._compact()
+        self._fit()
+
+    def _load(self):
+        if not os.path.exists(self.history_path):
+            return
+        try:
+            with open(self.history_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self.file_lines += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("service_s", 0) > 0 and "features" in record:
+                        self.records.append(record)
+        except OSError as e:
+            print(f"⚠️ Histórico de custo ilegível ({e}) - começando vazio")
+
+    def _columns(self, records):
+        """Colunas do ajuste: base + uma por valor categórico visto + numéricas"""
+        columns = [("const", None), ("audio_s", None)]
+        for name in CATEGORICAL:
+            for value in sorted({r["features"][name] for r in records}):
+                columns.append((name, value))
+        columns += [("index_mb", None), ("shards", None)]
+        return columns
+
+    def _row(self, features, columns):
+        audio_s = features["audio_s"]
+        row = []
+        for name, value in columns:
+            if name == "const":
+                row.append(1.0)
+            elif name == "audio_s":
+                row.append(audio_s)
+            elif name == "index_mb":
+                row.append(audio_s * math.log1p(features["index_mb"]))
+            elif name == "shards":
+                # Processos dividem o trabalho: custo por segundo ~ 1/shards
+                row.append(audio_s / max(1, features["shards"]))
+            else:
+                row.append(audio_s if features[name] == value else 0.0)
+        return row
+
+    def _fit(self):
+        records = list(self.records)
+        if len(records) < MIN_FIT_RECORDS:
+            self.weights = None
+            return
+        columns = self._columns(records)
+        x = np.array([self._row(r["features"], columns) for r in records], dtype=np.float64)
+        y = np.array([r["service_s"] for r in records], dtype=np.float64)
+        penalty = np.full(len(columns), RIDGE * len(records))
+        penalty[:2] = 0.0
+        weights = np.linalg.solve(x.T @ x + np.diag(penalty) + 1e-9 * np.eye(len(columns)), x.T @ y)
+        self.columns, self.weights = columns, weights
+
+    def _fallback(self, features):
+        rates = [r["service_s"] / r["features"]["audio_s"] for r in self.records if r["features"]["audio_s"] > 0]
+        rate = float(np.median(rates)) if rates else DEFAULT_SECONDS_PER_AUDIO_SECOND
+        return rate * features["audio_s"]
+
+    def predict(self, features):
+        """Tempo de serviço previsto (s) para um job"""
+        with self.lock:
+            if self.weights is None:
+                return self._fallback(features)
+            prediction = float(np.dot(self._row(features, self.columns), self.weights))
+            # Categoria nunca vista ou extrapolação ruim: não confiar em valores absurdos
+            if not math.isfinite(prediction) or prediction <= 0:
+                return self._fallback(features)
+            return prediction
+
+    def record(self, features, service_s, times=None, predicted_s=None):
+        """Guarda um job concluído no histórico (e o erro da previsão feita para ele)"""
+        record = {
+            "ts": round(time.time(), 1),
+            "features": features,
+            "service_s": round(float(service_s), 3),
+            "times": {k: round(float(v), 3) for k, v in zip(("npy", "f0", "infer"), times or [])},
+        }
+        with self.lock:
+            self.records.append(record)
+            if predicted_s is not None:
+                self.errors.append((float(predicted_s), float(service_s)))
+            self.pending_refit += 1
+            if self.pending_refit >= REFIT_EVERY or (self.weights is None and len(self.records) >= MIN_FIT_RECORDS):
+                self.pending_refit = 0
+                self._fit()
+        try:
+            with self.file_lock:
+                with open(self.history_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+                self.file_lines += 1
+            if self.file_lines > 2 * self.records.maxlen:
+                self._compact()
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar o histórico de custo: {e}")
+
+    def _compact(self):
+        """Reescreve o histórico só com os jobs mantidos em memória"""
+        with self.lock:
+            records = list(self.records)
+        partial = f"{self.history_path}.{os.getpid()}.part"
+        try:
+            with self.file_lock:
+                with open(partial, "w", encoding="utf-8") as f:
+                    for record in records:
+                        f.write(json.dumps(record) + "\n")
+                os.replace(partial, self.history_path)
+                self.file_lines = len(records)
+        except OSError as e:
+            print(f"⚠️ Não foi possível compactar o histórico de custo: {e}")
+
+    def stats(self):
+        with self.lock:
+            result = {
+                "records": len(self.records),
+                "fitted": self.weights is not None,
+                "predictions": len(self.errors),
+            }
+            if self.errors:
+                predicted = np.array([p for p, _ in self.errors])
+                actual = np.array([a for _, a in self.errors])
+                abs_error = np.abs(predicted - actual)
+                rel_error = abs_error / np.maximum(actual, 1e-3)
+                result.update({
+                    "mae_s": round(float(abs_error.mean()), 2),
+                    "mape": round(float(rel_error.mean()), 3),
+                    "p90_relative_error": round(float(np.percentile(rel_error, 90)), 3),
+                    "bias_s": round(float((predicted - actual).mean()), 2),
+                })
+            return result
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TurboRVC Load Test
+Gerador de carga HTTP para o rvc_server.py, com o app FastAPI no mesmo processo.
+
+Os clientes (asyncio, httpx com transporte ASGI - sem sockets) disparam
+/convert, /tts e /models em laços fechados com N clientes simultâneos por
+nível de concorrência e o relatório traz, por nível e endpoint: vazão,
+latência p50/p95/p99, taxa de erro e de rejeição (429) e o tempo em que o
+event loop ficou travado (atraso de um timer de 10 ms).
+
+Motor de inferência:
+- mock (padrão): _run_conversion é substituído por um job que dorme a latência
+  sorteada (dividida em segmentos, passando pelo segment_callback - cancelamento
+  e preempção funcionam como no real) e o Edge TTS por uma espera; não precisa
+  de GPU, modelos nem rede. Modelos, entradas, saídas e o histórico do modelo
+  de custo ficam em uma pasta temporária.
+- real: o servidor roda como está (modelos de verdade, --model e --input).
+
+Latência do mock (--latency):
+  fixed:0.5              sempre 0.5 s
+  uniform:0.2,2.0        uniforme entre 0.2 e 2.0 s
+  lognormal:0.8,0.5      mediana 0.8 s, sigma 0.5
+  rtf:0.3                0.3 s por segundo de áudio da entrada (--input_durations)
+
+Exemplos:
+python rvc_loadtest.py --concurrency 1,4,16 --duration 20 --latency rtf:0.2
+python rvc_loadtest.py --slots 2 --max_queue 8 --scheduling fifo --priorities interactive=0.3,bulk=0.7
+python rvc_loadtest.py --script 12 --tts_latency 1.0 --latency fixed:1.0   (roteiro em /tts/convert)
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+parser = argparse.ArgumentParser(description="Teste de carga do TurboRVC Server")
+parser.add_argument("--engine", default="mock", choices=["mock", "real"], help="Motor de inferência")
+parser.add_argument("--concurrency", default="1,4,16", help="Níveis de clientes simultâneos (separados por vírgula)")
+parser.add_argument("--duration", type=float, default=15.0, help="Segundos de carga por nível")
+parser.add_argument("--mix", default="convert=0.8,tts=0.1,models=0.1", help="Proporção de cada endpoint")
+parser.add_argument("--priorities", default="normal=1", help="Proporção de cada prioridade nas conversões")
+parser.add_argument("--latency", default="lognormal:0.8,0.5", help="Latência do mock (fixed|uniform|lognormal|rtf)")
+parser.add_argument("--segments", type=int, default=8, help="Segmentos por conversão no mock")
+parser.add_argument("--tts_latency", type=float, default=0.3, help="Latência do TTS no mock (s)")
+parser.add_argument("--input_durations", default="5,30", help="Durações (s) das entradas sintéticas do mock")
+parser.add_argument("--model", default="mock-voice", help="Modelo usado nas conversões (motor real)")
+parser.add_argument("--input", default=None, help="Áudio de entrada (motor real)")
+parser.add_argument("--slots", type=int, default=None, help="TURBORVC_CONCURRENCY do servidor")
+parser.add_argument("--max_queue", type=int, default=None, help="TURBORVC_MAX_QUEUE do servidor")
+parser.add_argument("--scheduling", default=None, help="TURBORVC_SCHEDULING do servidor (fifo | sjf)")
+parser.add_argument("--script", type=int, default=0, help="Trechos de um roteiro enviados a /tts/convert (pipeline TTS -> RVC) em vez dos níveis de carga")
+parser.add_argument("--tts_concurrency", type=int, default=2, help="TTS simultâneos no roteiro (--script)")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--output_json", default=None, help="Gravar o relatório neste arquivo")
+args = parser.parse_args()
+
+# O servidor lê a configuração do ambiente na importação
+for env, value in (("TURBORVC_CONCURRENCY", args.slots), ("TURBORVC_MAX_QUEUE", args.max_queue), ("TURBORVC_SCHEDULING", args.scheduling)):
+    if value is not None:
+        os.environ[env] = str(value)
+if args.engine == "mock":
+    # Os processos do pool importariam o servidor sem o mock
+    os.environ["TURBORVC_WORKERS"] = "0"
+# Config() do RVC faz parse de sys.argv
+sys.argv = [sys.argv[0]]
+
+try:
+    import httpx
+except ImportError:
+    print("❌ httpx é necessário para o teste de carga (pip install httpx)", file=sys.stderr)
+    sys.exit(1)
+
+import numpy as np
+import soundfile as sf
+
+import rvc_server
+import stage_timing
+from rvc_cost_model import CostModel
+from rvc_render_cache import RenderCache
+
+
+def parse_weights(spec):
+    weights = {}
+    for part in spec.split(","):
+        if part.strip():
+            name, _, weight = part.partition("=")
+            weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(math.ceil(q / 100.0 * len(values))) - 1)]
+
+
+class MockEngine:
+    """Substitui a inferência: dorme a latência sorteada, segmento a segmento"""
+
+    def __init__(self, latency_spec, segments, seed):
+        kind, _, params = latency_spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        self.segments = max(1, segments)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self, audio_seconds):
+        with self.lock:
+            if self.kind == "fixed":
+                return self.params[0]
+            if self.kind == "uniform":
+                return self.random.uniform(self.params[0], self.params[1])
+            if self.kind == "lognormal":
+                return self.params[0] * math.exp(self.random.gauss(0, self.params[1]))
+            if self.kind == "rtf":
+                return self.params[0] * audio_seconds
+        raise ValueError(f"Latência inválida: {self.kind}")
+
+    def run_conversion(self, job):
+        job['version'] = "v2"
+        job['times'] = [0, 0, 0]
+        audio_seconds = sf.info(job['input_audio']).duration
+        latency = self.sample(audio_seconds)
+        callback = rvc_server.make_segment_callback(job)
+        for i in range(self.segments):
+            callback(i, self.segments)
+            time.sleep(latency / self.segments)
+            job['times'][2] += latency / self.segments
+            stage_timing.record("synthesis", latency / self.segments)
+        # Saída silenciosa na taxa de um modelo de 40 kHz (o /render lê as frases convertidas)
+        sf.write(job['output_path'], np.zeros(int(audio_seconds * 40000), dtype=np.float32), 40000)
+        return job['output_path']
+
+
+def install_mock(workdir):
+    """Aponta o servidor para uma pasta temporária e troca a inferência e o TTS pelo mock"""
+    engine = MockEngine(args.latency, args.segments, args.seed)
+    models_dir = os.path.join(workdir, "models")
+    os.makedirs(os.path.join(models_dir, args.model), exist_ok=True)
+    with open(os.path.join(models_dir, args.model, "mock.pth"), "wb") as f:
+        f.write(b"\0" * 1024)
+    for name, sub in (("MODELS_DIR", "models"), ("OUTPUT_DIR", "output"), ("TEMP_DIR", "TEMP"), ("TRACES_DIR", "traces")):
+        path = os.path.join(workdir, sub)
+        os.makedirs(path, exist_ok=True)
+        setattr(rvc_server, name, rvc_server.Path(path))
+    rvc_server.cost_model = CostModel(os.path.join(workdir, "job_history.jsonl"))
+    rvc_server.render_cache = RenderCache(os.path.join(workdir, "renders"))
+    rvc_server._run_conversion = engine.run_conversion
+
+    async def fake_tts(text, voice, rate, pitch, output_path):
+        await asyncio.sleep(args.tts_latency)
+        # ~15 caracteres por segundo de fala (a conversão lê a duração do arquivo)
+        sf.write(output_path, np.zeros(int(max(1.0, len(text) / 15.0) * 16000), dtype=np.float32), 16000)
+        return output_path
+
+    rvc_server.generate_tts = fake_tts
+
+    inputs = []
+    for seconds in [float(d) for d in args.input_durations.split(",") if d]:
+        path = os.path.join(workdir, f"input_{seconds:g}s.wav")
+        sf.write(path, np.zeros(int(seconds * 16000), dtype=np.float32), 16000)
+        inputs.append(path)
+    return inputs
+
+
+async def monitor_loop(stop, lags, interval=0.01):
+    """Atraso do event loop: quanto um sleep de 10 ms acorda depois do previsto"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def client(http, deadline, inputs, endpoints, priorities, rng, samples):
+    names, weights = zip(*endpoints.items())
+    priority_names, priority_weights = zip(*priorities.items())
+    while time.monotonic() < deadline:
+        endpoint = rng.choices(names, weights)[0]
+        priority = None
+        start = time.monotonic()
+        try:
+            if endpoint == "convert":
+                priority = rng.choices(priority_names, priority_weights)[0]
+                response = await http.post("/convert", json={
+                    "input_audio": rng.choice(inputs),
+                    "model_name": args.model,
+                    "priority": priority,
+                    "output_name": f"loadtest_{uuid.uuid4().hex}.wav"
+                })
+            elif endpoint == "tts":
+                response = await http.post("/tts", json={"text": "Teste de carga do TurboRVC."})
+            else:
+                response = await http.get("/models")
+            status = response.status_code
+            if status == 429:
+                # Cliente educado: respeita o Retry-After (limitado para não parar o nível)
+                await asyncio.sleep(min(float(response.headers.get("Retry-After", "1")), 1.0))
+        except Exception:
+            status = "exception"
+        samples.append((endpoint, priority, status, time.monotonic() - start))
+
+
+def summarize(samples, elapsed):
+    groups = defaultdict(list)
+    for endpoint, priority, status, latency in samples:
+        groups[endpoint].append((status, latency))
+        if priority is not None:
+            groups[f"convert[{priority}]"].append((status, latency))
+    summary = {}
+    for name, items in sorted(groups.items()):
+        ok = [latency for status, latency in items if status == 200]
+        statuses = defaultdict(int)
+        for status, _ in items:
+            statuses[str(status)] += 1
+        errors = sum(1 for status, _ in items if status == "exception" or (isinstance(status, int) and status >= 500))
+        summary[name] = {
+            "requests": len(items),
+            "throughput_rps": round(len(ok) / elapsed, 2),
+            "p50_s": round(percentile(ok, 50), 3) if ok else None,
+            "p95_s": round(percentile(ok, 95), 3) if ok else None,
+            "p99_s": round(percentile(ok, 99), 3) if ok else None,
+            "error_rate": round(errors / len(items), 4),
+            "rejected_rate": round(statuses.get("429", 0) / len(items), 4),
+            "statuses": dict(statuses),
+        }
+    return summary
+
+
+async def run_level(http, n_clients, inputs, endpoints, priorities):
+    stop = asyncio.Event()
+    lags, samples = [], []
+    monitor = asyncio.create_task(monitor_loop(stop, lags))
+    counters_before = dict(rvc_server.job_counters)
+    preemptions_before = rvc_server.scheduler.stats()["preemptions"]
+    deadline = time.monotonic() + args.duration
+    start = time.monotonic()
+    await asyncio.gather(*(
+        client(http, deadline, inputs, endpoints, priorities, random.Random(args.seed * 1000 + i), samples)
+        for i in range(n_clients)
+    ))
+    elapsed = time.monotonic() - start
+    # Esperar os jobs em andamento antes do próximo nível
+    while rvc_server.jobs:
+        await asyncio.sleep(0.05)
+    stop.set()
+    await monitor
+    return {
+        "clients": n_clients,
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": summarize(samples, elapsed),
+        "loop_lag": {
+            "p99_ms": round(1000 * percentile(lags, 99), 2) if lags else None,
+            "max_ms": round(1000 * max(lags), 2) if lags else None,
+            # Tempo total em que o loop ficou mais de 50 ms sem atender
+            "stalled_s": round(sum(lag for lag in lags if lag > 0.05), 3),
+        },
+        "server_counters": {k: v - counters_before.get(k, 0) for k, v in rvc_server.job_counters.items()},
+        "preemptions": rvc_server.scheduler.stats()["preemptions"] - preemptions_before,
+        "cost_model": rvc_server.cost_model.stats(),
+    }
+
+
+def print_level(result):
+    print(f"\n👥 {result['clients']} clientes ({result['elapsed_s']}s) - loop: p99 {result['loop_lag']['p99_ms']}ms, "
+          f"máx {result['loop_lag']['max_ms']}ms, travado {result['loop_lag']['stalled_s']}s, preempções {result['preemptions']}")
+    print(f"   {'endpoint':<22}{'req':>6}{'rps':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'erro':>8}{'429':>8}")
+    for name, s in result["endpoints"].items():
+        fmt = lambda v: f"{v:.2f}" if v is not None else "-"
+        print(f"   {name:<22}{s['requests']:>6}{s['throughput_rps']:>8.2f}{fmt(s['p50_s']):>8}{fmt(s['p95_s']):>8}"
+              f"{fmt(s['p99_s']):>8}{s['error_rate']:>8.1%}{s['rejected_rate']:>8.1%}")
+
+
+async def run_script(http):
+    """Um roteiro de --script trechos em /tts/convert: tempo total x soma de TTS e RVC"""
+    partitions = [f"Trecho {i} do roteiro de teste do TurboRVC. " * 4 for i in range(args.script)]
+    lines = []
+    async with http.stream("POST", "/tts/convert", json={
+        "partitions": partitions,
+        "model_name": args.model,
+        "tts_concurrency": args.tts_concurrency
+    }) as response:
+        if response.status_code != 200:
+            print(f"❌ /tts/convert: {response.status_code} {(await response.aread()).decode(errors='ignore')}")
+            return None
+        async for raw in response.aiter_lines():
+            if not raw.strip():
+                continue
+            # elapsed_s vem do servidor: o transporte ASGI do httpx entrega o corpo de uma vez
+            line = json.loads(raw)
+            lines.append(line)
+            if line["type"] == "partition":
+                status = "✅" if line["success"] else f"❌ {line.get('detail')}"
+                print(f"   trecho {line['index']:>3}: {line['elapsed_s']:>7.2f}s {status}")
+    done = lines[-1] if lines and lines[-1]["type"] == "done" else {}
+    if done:
+        print(f"\n📜 Roteiro: {done['partitions']} trechos em {done['elapsed_s']}s "
+              f"(sequencial: {done['sequential_s']}s = TTS {done['tts_s']}s + RVC {done['rvc_s']}s, "
+              f"ideal max(TTS, RVC) ≈ {max(done['tts_s'] / max(1, args.tts_concurrency), done['rvc_s']):.2f}s)")
+    return {"partitions": lines[:-1] if done else lines, "summary": done}
+
+
+async def main():
+    workdir = tempfile.mkdtemp(prefix="turborvc_loadtest_")
+    if args.engine == "mock":
+        inputs = install_mock(workdir)
+    else:
+        if not args.input:
+            print("❌ --input é obrigatório com --engine real", file=sys.stderr)
+            sys.exit(1)
+        inputs = [os.path.abspath(args.input)]
+
+    endpoints = parse_weights(args.mix)
+    priorities = parse_weights(args.priorities)
+    levels = [int(n) for n in args.concurrency.split(",") if n]
+    print(f"🚦 Teste de carga ({args.engine}): níveis {levels}, {args.duration:.0f}s cada, mix {endpoints}, "
+          f"vagas {rvc_server.CONVERSION_CONCURRENCY}, fila {rvc_server.MAX_QUEUE}, agendamento {rvc_server.scheduler.policy}")
+
+    await rvc_server.on_startup()
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=rvc_server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as http:
+            if args.script:
+                script = await run_script(http)
+                levels = []
+            for n_clients in levels:
+                result = await run_level(http, n_clients, inputs, endpoints, priorities)
+                print_level(result)
+                results.append(result)
+    finally:
+        await rvc_server.on_shutdown()
+
+    report = {
+        "engine": args.engine,
+        "latency": args.latency if args.engine == "mock" else None,
+        "slots": rvc_server.CONVERSION_CONCURRENCY,
+        "max_queue": rvc_server.MAX_QUEUE,
+        "scheduling": rvc_server.scheduler.policy,
+        "mix": endpoints,
+        "priorities": priorities,
+        "levels": results,
+    }
+    if args.script:
+        report["script"] = script
+    if args.output_json:
+        with open(args.output_json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📄 Relatório: {args.output_json}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""
+TurboRVC Render Cache
+Cache de áudio renderizado (TTS + RVC) por frase.
+
+Editar uma frase de um roteiro não deveria refazer a partição inteira: o
+servidor divide o texto em frases (mesma regra do TextPartitioner), procura
+cada frase normalizada aqui - a chave inclui voz/rate/pitch do TTS, o hash do
+modelo de voz (.pth + .index), pitch, método de f0, index_rate, precisão e backend - e só renderiza
+as que faltam. A partição é montada com as frases em ordem, com crossfade
+curto nas emendas. Frases repetidas entre projetos (aberturas, encerramentos)
+também saem do cache.
+
+Cada entrada é um WAV com o nome da chave; o acesso atualiza o mtime e, passando
+de max_bytes, as entradas menos usadas recentemente são removidas.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import soundfile as sf
+
+SENTENCE_RE = re.compile(r"[^.!?]+[.!?]?")
+
+
+def normalize_sentence(text):
+    """Forma canônica de uma frase: NFC, espaços colapsados, sem espaços nas pontas"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def split_sentences(text):
+    """Frases do texto (terminadas em . ! ou ?), como o TextPartitioner as separa"""
+    sentences = (normalize_sentence(match) for match in SENTENCE_RE.findall(normalize_sentence(text)))
+    return [sentence for sentence in sentences if sentence]
+
+
+def crossfade_concat(pieces, crossfade_samples):
+    """Concatena os trechos com crossfade de cosseno elevado nas emendas"""
+    pieces = [np.asarray(p, dtype=np.float32) for p in pieces if len(p)]
+    if not pieces:
+        return np.zeros(0, dtype=np.float32)
+    out = pieces[0]
+    for piece in pieces[1:]:
+        n = min(crossfade_samples, len(out), len(piece))
+        if n == 0:
+            out = np.concatenate([out, piece])
+            continue
+        fade_in = np.sin(0.5 * np.pi * np.linspace(0.0, 1.0, n, dtype=np.float32)) ** 2
+        joint = out[-n:] * (1.0 - fade_in) + piece[:n] * fade_in
+        out = np.concatenate([out[:-n], joint, piece[n:]])
+    return out
+
+
+class RenderCache:
+    """Frases renderizadas em disco, com remoção LRU acima de max_bytes"""
+
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(sentence, settings):
+        """Chave da frase: texto normalizado + configurações de TTS e RVC que mudam o áudio"""
+        payload = json.dumps({"text": normalize_sentence(sentence), **settings}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def get(self, key):
+        """(áudio, taxa) da frase ou None"""
+        path = self.path(key)
+        try:
+            audio, sample_rate = sf.read(path, dtype="float32")
+            os.utime(path)
+        except (OSError, RuntimeError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return audio, sample_rate
+
+    def put(self, key, audio, sample_rate):
+        path = self.path(key)
+        partial = f"{path}.{threading.get_ident()}.part"
+        sf.write(partial, audio, sample_rate, format="WAV")
+        os.replace(partial, path)
+        self.evict()
+
+    def entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".wav"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        with self.lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+
+    def stats(self):
+        entries = self.entries()
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(entries),
+                "size_mb": round(sum(size for _, size, _ in entries) / (1024 * 1024), 1),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+            }
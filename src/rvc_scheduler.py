@@ -0,0 +1,129 @@
+"""
+TurboRVC Scheduler
+Agendamento por prioridade das conversões no processo do servidor.
+
+As conversões rodam em threads, mas só `capacity` delas usam o dispositivo
+ao mesmo tempo. A vaga vai sempre para o job de maior prioridade em espera
+(interactive > normal > bulk; FIFO dentro da mesma classe). Um job longo
+consulta o agendador entre segmentos (segment_callback do VC.pipeline): se há
+um job de prioridade maior esperando e nenhuma vaga livre, ele cede a vaga,
+espera sua vez e continua do segmento seguinte - o estado do pipeline fica
+na própria thread, nada é refeito.
+
+Com policy="sjf" a ordem dentro de cada classe passa a ser o menor tempo
+previsto primeiro (previsão do rvc_cost_model), com a ordem de chegada como
+desempate. Para um job longo não esperar para sempre atrás de jobs curtos que
+não param de chegar, o custo envelhece: cada segundo de espera desconta `aging`
+segundos do custo previsto. Como todos os jobs em espera envelhecem no mesmo
+ritmo, isso equivale a ordenar por custo + aging * chegada (chave fixa no heap);
+com aging=1 um job espera no máximo cerca da diferença entre o seu tempo
+previsto e o dos jobs que chegam depois dele.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+PRIORITIES = {"interactive": 0, "normal": 1, "bulk": 2}
+POLICIES = ("fifo", "sjf")
+
+
+class Ticket:
+    """Posição de um job no agendador (classe + custo previsto + ordem de chegada)"""
+
+    def __init__(self, rank, seq, cost=0.0):
+        self.rank = rank
+        self.seq = seq
+        self.cost = cost
+        self.held = False
+        self.preemptions = 0
+
+    def key(self):
+        return (self.rank, self.cost, self.seq)
+
+
+class PriorityGate:
+    def __init__(self, capacity, policy="fifo", aging=1.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Política '{policy}' inválida (use: {', '.join(POLICIES)})")
+        self.capacity = max(1, int(capacity))
+        self.policy = policy
+        self.aging = max(0.0, float(aging))
+        self.epoch = time.monotonic()
+        self.running = 0
+        self.waiting = []  # heap de (rank, custo, seq)
+        self.cond = threading.Condition()
+        self.seq = itertools.count()
+        self.preemptions = 0
+
+    def ticket(self, priority, cost=0.0):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioridade '{priority}' inválida (use: {', '.join(PRIORITIES)})")
+        if self.policy != "sjf":
+            return Ticket(PRIORITIES[priority], next(self.seq))
+        # Envelhecimento: a chegada entra no custo (ver o comentário do módulo)
+        return Ticket(PRIORITIES[priority], next(self.seq), cost + self.aging * (time.monotonic() - self.epoch))
+
+    def acquire(self, ticket, should_abort=None, poll=0.5):
+        """
+        Espera a vez do ticket: vaga livre e nenhum job mais prioritário (ou mais
+        antigo da mesma classe) esperando. should_abort() pode levantar para desistir.
+        """
+        key = ticket.key()
+        with self.cond:
+            heapq.heappush(self.waiting, key)
+            try:
+                while not (self.running < self.capacity and self.waiting[0] == key):
+                    self.cond.wait(poll)
+                    if should_abort is not None:
+                        should_abort()
+            except BaseException:
+                self.waiting.remove(key)
+                heapq.heapify(self.waiting)
+                self.cond.notify_all()
+                raise
+            heapq.heappop(self.waiting)
+            self.running += 1
+            ticket.held = True
+            # Pode haver outra vaga para o próximo da fila
+            self.cond.notify_all()
+
+    def release(self, ticket):
+        with self.cond:
+            if ticket.held:
+                ticket.held = False
+                self.running -= 1
+                self.cond.notify_all()
+
+    def should_yield(self, ticket):
+        """True se um job mais prioritário espera e não há vaga livre para ele"""
+        with self.cond:
+            return (
+                ticket.held
+                and self.running >= self.capacity
+                and bool(self.waiting)
+                and self.waiting[0][0] < ticket.rank
+            )
+
+    def yield_slot(self, ticket, should_abort=None):
+        """Cede a vaga e volta para a fila com a posição original na sua classe"""
+        with self.cond:
+            self.preemptions += 1
+            ticket.preemptions += 1
+        self.release(ticket)
+        self.acquire(ticket, should_abort)
+
+    def stats(self):
+        with self.cond:
+            by_class = {name: 0 for name in PRIORITIES}
+            names = {rank: name for name, rank in PRIORITIES.items()}
+            for key in self.waiting:
+                by_class[names[key[0]]] += 1
+            return {
+                "capacity": self.capacity,
+                "policy": self.policy,
+                "running": self.running,
+                "waiting": by_class,
+                "preemptions": self.preemptions,
+            }
@@ -9,7 +9,15 @@ import os
 import sys
 import json
 import asyncio
+import threading
+import multiprocessing
 import hashlib
+import math
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, List
 from datetime import datetime
@@ -17,9 +25,9 @@ from datetime import datetime
 # Adicionar diretório atual ao path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket
+from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
@@ -28,13 +36,29 @@ import torch
 import warnings
 warnings.filterwarnings("ignore")
 
-from vc_infer_pipeline import VC
-from fairseq import checkpoint_utils
+import numpy as np
 import soundfile as sf
 from my_utils import load_audio
-from infer_pack.models import SynthesizerTrnMs256NSFsid, SynthesizerTrnMs256NSFsid_nono
-from infer_pack.modelsv2 import SynthesizerTrnMs768NSFsid_nono, SynthesizerTrnMs768NSFsid
 from config import Config
+import model_loader
+import cpu_precision
+import infer_backend
+import compact_index
+from hubert_batcher import HubertBatcher
+import shared_weights
+import stage_timing
+from trace_profiler import TraceRecorder
+from memory_accounting import MemoryAccountant
+from sharded_convert import ShardedConverter
+from realtime_vc import StreamingConverter, StreamingResampler
+from chunk_reuse import ChunkStore, convert_with_reuse, conversion_params, model_digest
+from time_range import load_range, trim_range
+from rvc_worker_pool import WorkerPool, WorkerError
+from rvc_scheduler import PriorityGate, PRIORITIES
+from rvc_cost_model import CostModel, job_features
+from rvc_metrics import Registry, RTF_BUCKETS
+from rvc_tts_stream import stream_sentences
+from rvc_render_cache import RenderCache, split_sentences, crossfade_concat
 
 # Edge TTS
 try:
@@ -53,6 +77,7 @@ MODELS_DIR = BASE_DIR / "models"
 OUTPUT_DIR = BASE_DIR / "output"
 CACHE_DIR = BASE_DIR / "cache"
 TEMP_DIR = BASE_DIR / "TEMP"
+TRACES_DIR = CACHE_DIR / "traces"
 
 # Criar diretórios
 for dir_path in [MODELS_DIR, OUTPUT_DIR, CACHE_DIR, TEMP_DIR]:
@@ -62,16 +87,106 @@ config = Config()
 
 # Variáveis globais RVC
 hubert_model = None
+hubert_variants = {}  # precisão CPU (int8) -> Hubert quantizado
 device = config.device
 is_half = config.is_half
+# Precisão padrão do servidor na CPU (RVC_CPU_PRECISION ou --cpu_precision): fp32, int8 ou bf16
+default_precision = config.cpu_precision
+# Backend de inferência padrão: eager (referência), torchscript ou onnx (artefatos de export_models.py)
+default_backend = os.environ.get("TURBORVC_BACKEND", "eager").lower()
 current_model = {
     'name': None,
     'net_g': None,
     'cpt': None,
     'version': None,
     'tgt_sr': None,
-    'vc': None
+    'vc': None,
+    'model_file': None,
+    'variants': {},
+    'backends': {}
 }
+# Cache LRU de modelos carregados (nome -> dados do modelo); current_model é o último usado
+MODEL_CACHE_SIZE = max(1, int(os.environ.get("TURBORVC_MODEL_CACHE", "2")))
+model_cache = OrderedDict()
+# Número de processos de inferência (0 = inferência no próprio processo do servidor)
+NUM_WORKERS = int(os.environ.get("TURBORVC_WORKERS", "0"))
+worker_pool = None
+# Processos que convertem partes de um arquivo longo (recriado quando modelo/precisão/backend/shards mudam)
+sharded_converter = None
+# Conversões rodam em threads: o lock protege o carregamento de modelos/variantes
+model_lock = threading.RLock()
+# Micro-batching do Hubert entre requisições simultâneas (TURBORVC_HUBERT_BATCH > 1 ativa)
+HUBERT_BATCH = max(1, int(os.environ.get("TURBORVC_HUBERT_BATCH", "1")))
+HUBERT_BATCH_WAIT_MS = float(os.environ.get("TURBORVC_HUBERT_BATCH_WAIT_MS", "5"))
+hubert_batcher = HubertBatcher(HUBERT_BATCH, HUBERT_BATCH_WAIT_MS) if HUBERT_BATCH > 1 else None
+# Conversões simultâneas no processo do servidor (padrão: o tamanho do batch do Hubert)
+CONVERSION_CONCURRENCY = max(1, int(os.environ.get("TURBORVC_CONCURRENCY", str(HUBERT_BATCH))))
+# Agendador por prioridade (interactive > normal > bulk, preempção entre segmentos);
+# TURBORVC_SCHEDULING=sjf ordena cada classe pelo menor tempo previsto, fifo pela chegada
+SCHEDULING_POLICY = os.environ.get("TURBORVC_SCHEDULING", "sjf").lower()
+# sjf: segundos de custo previsto descontados por segundo de espera (evita que jobs longos esperem para sempre)
+SJF_AGING = float(os.environ.get("TURBORVC_SJF_AGING", "1.0"))
+scheduler = PriorityGate(CONVERSION_CONCURRENCY, SCHEDULING_POLICY, SJF_AGING)
+# Traces de todas as conversões (TURBORVC_TRACE=1); por requisição com "trace": true
+TRACE_ALL = os.environ.get("TURBORVC_TRACE", "0").lower() in ("1", "true", "yes")
+# Pico de RSS por job e por estágio: ligado por padrão (amostragem de /proc a cada 20 ms,
+# ~17 ms de CPU por segundo de job); TURBORVC_MEMORY_ACCOUNTING=0 desliga. O tracemalloc é
+# opcional: por requisição com "memory_profile": true ou em todas com TURBORVC_MEMORY_PROFILE=1
+MEMORY_ACCOUNTING = os.environ.get("TURBORVC_MEMORY_ACCOUNTING", "1").lower() not in ("0", "false", "no")
+MEMORY_PROFILE_ALL = os.environ.get("TURBORVC_MEMORY_PROFILE", "0").lower() in ("1", "true", "yes")
+# Modelo de custo: histórico de tempos por job -> previsão de duração (ETA, SJF). Como o
+# executor de jobs e o cache de frases, é criado em on_startup: os processos spawn (pool de
+# workers, conversão sharded) reimportam este módulo e não devem abrir os mesmos arquivos
+cost_model = None
+model_versions = {}  # nome do modelo -> versão (v1/v2), conhecida após o primeiro carregamento
+# Controle de admissão: jobs aceitos (em espera + em execução) além disso recebem 429
+MAX_QUEUE = max(1, int(os.environ.get("TURBORVC_MAX_QUEUE", "16")))
+# Trechos de pedidos em várias partes (/tts/convert, /render, /tts/stream) esperam vaga até isso em vez de 429
+PART_ADMISSION_TIMEOUT_S = float(os.environ.get("TURBORVC_PART_ADMISSION_TIMEOUT_S", "600"))
+# Uma thread por job aceito (a espera pela vez acontece na thread, no agendador)
+job_executor = None
+# Latência (criação -> fim) dos últimos jobs concluídos por classe de prioridade
+latency_history = {name: deque(maxlen=200) for name in PRIORITIES}
+jobs = {}  # job_id -> JobState dos jobs ativos
+# Conversão em tempo real (/ws/realtime): entrada acumulada além disso é descartada (mais antiga primeiro)
+REALTIME_MAX_BACKLOG_MS = max(100, int(os.environ.get("TURBORVC_REALTIME_MAX_BACKLOG_MS", "1000")))
+# Blocos em tempo real têm vagas próprias (TURBORVC_REALTIME_SLOTS), fora do agendador dos jobs:
+# lá esperariam um job soltar a vaga, o que só acontece entre segmentos (segundos de inferência)
+REALTIME_SLOTS = max(1, int(os.environ.get("TURBORVC_REALTIME_SLOTS", "1")))
+realtime_gate = PriorityGate(REALTIME_SLOTS)
+realtime_sessions = 0
+# Reaproveitamento de segmentos convertidos (TURBORVC_CHUNK_REUSE=1 liga para todas as conversões)
+CHUNK_REUSE_ALL = os.environ.get("TURBORVC_CHUNK_REUSE", "0").lower() in ("1", "true", "yes")
+CHUNK_CACHE_MB = max(1, int(os.environ.get("TURBORVC_CHUNK_CACHE_MB", "4096")))
+chunk_store = None  # criado no primeiro uso (get_chunk_store), no servidor ou no worker que converte
+chunk_store_lock = threading.Lock()
+# Cache de frases renderizadas (TTS + RVC) do /render; TURBORVC_RENDER_CACHE_MB limita o disco
+RENDER_CACHE_MB = max(1, int(os.environ.get("TURBORVC_RENDER_CACHE_MB", "2048")))
+render_cache = None
+job_counters = {"admitted": 0, "rejected": 0, "cancelled": 0, "completed": 0, "failed": 0}
+
+# Telemetria (/metrics, formato Prometheus); os gauges são calculados na coleta
+metrics = Registry()
+stage_seconds = metrics.histogram("turborvc_stage_seconds", "Duração de cada estágio da conversão", ("stage", "method"))
+jobs_total = metrics.counter("turborvc_jobs_total", "Jobs por resultado", ("status", "priority"))
+job_seconds = metrics.histogram("turborvc_job_service_seconds", "Tempo de processamento dos jobs concluídos (sem esperas)", ("priority",))
+audio_seconds_total = metrics.counter("turborvc_audio_seconds_total", "Segundos de áudio convertidos")
+realtime_factor = metrics.histogram("turborvc_realtime_factor", "Segundos de processamento por segundo de áudio", buckets=RTF_BUCKETS)
+model_loads = metrics.counter("turborvc_model_loads_total", "Modelos de voz carregados do disco")
+model_evictions = metrics.counter("turborvc_model_evictions_total", "Modelos de voz removidos do cache LRU")
+model_cache_hits = metrics.counter("turborvc_model_cache_hits_total", "Conversões que reaproveitaram um modelo em cache")
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (256, 512, 768, 1024, 1536, 2048, 3072, 4096, 6144, 8192, 12288, 16384))
+job_peak_rss = metrics.histogram("turborvc_job_peak_rss_bytes", "Pico de RSS do processo durante cada job", buckets=MEMORY_BUCKETS)
+stage_peak_rss = metrics.histogram("turborvc_stage_peak_rss_bytes", "Pico de RSS do processo durante cada estágio", ("stage",), buckets=MEMORY_BUCKETS)
+tts_first_audio = metrics.histogram("turborvc_tts_first_audio_seconds", "Requisição -> primeira amostra decodificada do TTS em streaming")
+tts_first_output = metrics.histogram("turborvc_tts_first_output_seconds", "Requisição -> primeira frase pronta (TTS + conversão) em streaming")
+render_sentences = metrics.counter("turborvc_render_sentences_total", "Frases do /render por origem", ("source",))
+chunk_reused_seconds = metrics.counter("turborvc_chunk_reused_audio_seconds_total", "Segundos de áudio com segmentos reaproveitados")
+chunk_saved_seconds = metrics.counter("turborvc_chunk_saved_seconds_total", "Tempo de conversão economizado pelos segmentos reaproveitados")
+realtime_block_seconds = metrics.histogram("turborvc_realtime_block_seconds", "Processamento de cada bloco da conversão em tempo real")
+realtime_dropped_seconds = metrics.counter("turborvc_realtime_dropped_seconds_total", "Segundos de entrada descartados por atraso no tempo real")
+# Picos de memória dos últimos jobs (orçamento de cache de modelos e tamanho de trechos)
+memory_history = deque(maxlen=50)
 
 # FastAPI App
 app = FastAPI(title="TurboRVC Server", version="1.0.0")
@@ -96,6 +211,16 @@ class ConvertRequest(BaseModel):
     f0_method: str = "rmvpe"
     index_rate: float = 0.75
     output_name: Optional[str] = None
+    precision: Optional[str] = None  # fp32 | int8 | bf16 (apenas CPU); None = padrão do servidor
+    backend: Optional[str] = None  # eager | torchscript | onnx; None = padrão do servidor
+    shards: int = 1  # > 1: arquivo dividido entre N processos (arquivos longos)
+    job_id: Optional[str] = None  # id escolhido pelo cliente (permite cancelar antes da resposta)
+    priority: str = "normal"  # interactive (prévias) | normal | bulk (renders longos)
+    trace: bool = False  # grava a linha do tempo da conversão (Chrome trace / Perfetto)
+    memory_profile: bool = False  # tracemalloc: pico de alocações Python/NumPy e maiores alocações por estágio
+    reuse: bool = False  # reaproveita segmentos já convertidos de áudios quase iguais (cortes por conteúdo)
+    start: Optional[float] = None  # converte só o trecho [start, end] (s) - prévias de arquivos longos
+    end: Optional[float] = None
 
 class TTSRequest(BaseModel):
     text: str
@@ -103,49 +228,167 @@ class TTSRequest(BaseModel):
     rate: int = 0
     pitch: int = 0
 
+class ScriptRequest(BaseModel):
+    partitions: List[str]  # trechos do roteiro (TextPartitioner), na ordem
+    model_name: str
+    voice: str = "pt-BR-FranciscaNeural"
+    rate: int = 0
+    tts_pitch: int = 0
+    speed: float = 1.0  # atempo aplicado ao TTS antes da conversão (como no main.js)
+    pitch: int = 0
+    f0_method: str = "rmvpe"
+    index_rate: float = 0.75
+    precision: Optional[str] = None
+    backend: Optional[str] = None
+    priority: str = "normal"
+    tts_concurrency: int = 2  # TTS simultâneos (e trechos prontos à frente da conversão)
+    output_prefix: Optional[str] = None
+
+class TTSStreamRequest(BaseModel):
+    text: str
+    voice: str = "pt-BR-FranciscaNeural"
+    rate: int = 0
+    pitch: int = 0
+    model_name: Optional[str] = None  # None: devolve as frases do TTS sem conversão
+    rvc_pitch: int = 0
+    f0_method: str = "rmvpe"
+    index_rate: float = 0.75
+    precision: Optional[str] = None
+    backend: Optional[str] = None
+    priority: str = "interactive"  # prévias passam à frente dos renders
+    output_prefix: Optional[str] = None
+
+class RenderRequest(BaseModel):
+    text: str  # partição do roteiro; renderizada frase a frase com cache
+    model_name: str
+    voice: str = "pt-BR-FranciscaNeural"
+    rate: int = 0
+    tts_pitch: int = 0
+    pitch: int = 0
+    f0_method: str = "rmvpe"
+    index_rate: float = 0.75
+    precision: Optional[str] = None
+    backend: Optional[str] = None
+    priority: str = "normal"
+    crossfade_ms: int = 20  # emenda entre frases
+    tts_concurrency: int = 2
+    output_name: Optional[str] = None
+
 class ModelInfo(BaseModel):
     name: str
     path: str
     has_index: bool
     size_mb: float
 
+class ConversionCancelled(Exception):
+    """Levantada entre segmentos quando o job foi cancelado"""
+
+class JobState:
+    """Estado de um job ativo (fila, progresso, cancelamento)"""
+    
+    def __init__(self, job_id: str, model_name: str, priority: str = "normal", features: Optional[dict] = None):
+        self.id = job_id
+        self.model_name = model_name
+        self.priority = priority
+        self.features = features
+        self.predicted_s = cost_model.predict(features) if features else 0.0
+        self.ticket = scheduler.ticket(priority, self.predicted_s)
+        self.status = "queued"
+        self.created = time.time()
+        self.started = None
+        self.paused_s = 0.0
+        self.paused_since = None
+        self.service_s = None  # tempo de processamento medido (sem esperas/pausas)
+        self.times = None  # [npy, f0, infer] do pipeline
+        self.stages = []  # (estágio, início, segundos, labels) para a telemetria
+        self.memory = None  # picos de memória do job (MemoryAccountant.report)
+        self.segments_done = 0
+        self.segments_total = 0
+        self.cancel_event = threading.Event()
+    
+    def on_segment(self, index: int, total: int):
+        self.segments_done = index
+        self.segments_total = total
+    
+    def remaining_s(self) -> float:
+        """Tempo de processamento previsto que ainda falta"""
+        if self.started is None:
+            return self.predicted_s
+        done = time.time() - self.started - self.paused_s
+        if self.paused_since is not None:
+            done -= time.time() - self.paused_since
+        return max(0.0, self.predicted_s - done)
+    
+    def to_dict(self):
+        now = time.time()
+        return {
+            "job_id": self.id,
+            "model": self.model_name,
+            "priority": self.priority,
+            "status": self.status,
+            "preemptions": self.ticket.preemptions,
+            "predicted_s": round(self.predicted_s, 2),
+            "cancel_requested": self.cancel_event.is_set(),
+            "waiting_s": round((self.started or now) - self.created, 2),
+            "running_s": round(now - self.started, 2) if self.started else 0.0,
+            "segments_done": self.segments_done,
+            "segments_total": self.segments_total
+        }
+
 # ============================================
 # FUNÇÕES RVC
 # ============================================
 
-def load_hubert():
-    """Carrega modelo Hubert"""
+def load_hubert(precision: str = "fp32"):
+    """Carrega modelo Hubert (e a variante da precisão CPU pedida)"""
+    with model_lock:
+        return _load_hubert(precision)
+
+def _load_hubert(precision: str):
     global hubert_model
     
-    if hubert_model is not None:
-        return
-    
-    hubert_path = BASE_DIR / "hubert_base.pt"
-    if not hubert_path.exists():
-        raise HTTPException(status_code=500, detail="hubert_base.pt não encontrado")
+    if hubert_model is None:
+        hubert_path = BASE_DIR / "hubert_base.pt"
+        if not hubert_path.exists():
+            raise HTTPException(status_code=500, detail="hubert_base.pt não encontrado")
+        
+        hubert_model = model_loader.load_hubert(hubert_path, config)
+        print("✅ Hubert carregado")
     
-    models, _, _ = checkpoint_utils.load_model_ensemble_and_task(
-        [str(hubert_path)],
-        suffix="",
-    )
-    hubert_model = models[0]
-    hubert_model = hubert_model.to(config.device)
+    if precision == "fp32":
+        return hubert_model
     
-    if is_half:
-        hubert_model = hubert_model.half()
-    else:
-        hubert_model = hubert_model.float()
+    if precision not in hubert_variants:
+        hubert_variants[precision] = cpu_precision.prepare_hubert(hubert_model, precision)
+        print(f"✅ Hubert preparado em {precision}")
     
-    hubert_model.eval()
-    print("✅ Hubert carregado")
+    return hubert_variants[precision]
+
+def resolve_request_precision(precision: Optional[str]) -> str:
+    """Resolve a precisão de uma requisição (fp32 fora da CPU ou sem suporte a bf16)"""
+    try:
+        return cpu_precision.resolve_precision(precision or default_precision, device)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 def load_rvc_model(model_name: str):
-    """Carrega modelo RVC"""
+    """Carrega modelo RVC (ou reaproveita do cache LRU) e retorna seus dados"""
+    with model_lock:
+        return _load_rvc_model(model_name)
+
+def _load_rvc_model(model_name: str):
     global current_model
     
     # Se já está carregado, não recarregar
     if current_model['name'] == model_name:
-        return
+        model_cache_hits.inc()
+        return current_model
+    
+    if model_name in model_cache:
+        model_cache_hits.inc()
+        model_cache.move_to_end(model_name)
+        current_model = model_cache[model_name]
+        return current_model
     
     # Encontrar arquivo .pth
     model_dir = MODELS_DIR / model_name
@@ -161,67 +404,170 @@ def load_rvc_model(model_name: str):
     model_path = pth_files[0]
     
     # Carregar modelo
-    cpt = torch.load(str(model_path), map_location="cpu")
-    tgt_sr = cpt["config"][-1]
-    cpt["config"][-3] = cpt["weight"]["emb_g.weight"].shape[0]
-    
-    if_f0 = cpt.get("f0", 1)
-    version = cpt.get("version", "v1")
-    
-    if version == "v1":
-        if if_f0 == 1:
-            net_g = SynthesizerTrnMs256NSFsid(*cpt["config"], is_half=is_half)
-        else:
-            net_g = SynthesizerTrnMs256NSFsid_nono(*cpt["config"])
-    elif version == "v2":
-        if if_f0 == 1:
-            net_g = SynthesizerTrnMs768NSFsid(*cpt["config"], is_half=is_half)
-        else:
-            net_g = SynthesizerTrnMs768NSFsid_nono(*cpt["config"])
-    
-    del net_g.enc_q
-    net_g.load_state_dict(cpt["weight"], strict=False)
-    net_g.eval().to(device)
-    
-    if is_half:
-        net_g = net_g.half()
-    else:
-        net_g = net_g.float()
-    
-    vc = VC(tgt_sr, config)
+    model_data = model_loader.load_synthesizer(model_path, config)
+    model_loads.inc()
     
     # Atualizar modelo atual
     current_model = {
         'name': model_name,
-        'net_g': net_g,
-        'cpt': cpt,
-        'version': version,
-        'tgt_sr': tgt_sr,
-        'vc': vc
+        'net_g': model_data['net_g'],
+        'cpt': model_data['cpt'],
+        'version': model_data['version'],
+        'tgt_sr': model_data['tgt_sr'],
+        'vc': model_data['vc'],
+        'model_file': str(model_path),
+        'variants': {},
+        'backends': {}
     }
+    model_cache[model_name] = current_model
+    
+    # Descartar os modelos menos usados além do limite do cache
+    while len(model_cache) > MODEL_CACHE_SIZE:
+        evicted, _ = model_cache.popitem(last=False)
+        model_evictions.inc()
+        print(f"♻️ Modelo removido do cache: {evicted}")
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
     
     print(f"✅ Modelo RVC carregado: {model_name}")
+    return current_model
 
-def convert_audio(input_path: str, pitch: int, f0_method: str, index_file: str, index_rate: float, output_path: str):
-    """Converte áudio usando RVC"""
-    global hubert_model, current_model
+def get_net_g(precision: str, model: Optional[dict] = None):
+    """Retorna o sintetizador do modelo (padrão: o atual) na precisão pedida"""
+    model = model or current_model
+    if precision == "fp32":
+        return model['net_g']
     
-    if hubert_model is None:
-        load_hubert()
+    with model_lock:
+        variants = model['variants']
+        if precision not in variants:
+            variants[precision] = cpu_precision.prepare_synthesizer(model['net_g'], precision)
+        
+        return variants[precision]
+
+def get_backend(kind: Optional[str], model: Optional[dict] = None):
+    """Retorna o backend de inferência do modelo (eager se os artefatos não existirem)"""
+    model = model or current_model
+    kind = (kind or default_backend).lower()
+    if kind not in infer_backend.BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Backend '{kind}' inválido")
+    
+    with model_lock:
+        backends = model['backends']
+        if kind not in backends:
+            try:
+                backends[kind] = infer_backend.create_backend(kind, model['model_file'], BASE_DIR, device)
+                print(f"✅ Backend {kind} carregado para {model['name']}")
+            except FileNotFoundError as e:
+                print(f"⚠️ {e} - usando eager")
+                backends[kind] = infer_backend.eager_backend()
+        
+        return backends[kind]
+
+def get_sharded_converter(shards: int, precision: str, backend_name: str, model: dict):
+    """Pool de processos da conversão particionada para o modelo"""
+    global sharded_converter
+    
+    hubert_path = BASE_DIR / "hubert_base.pt"
+    key = (str(hubert_path), model['model_file'], precision, backend_name)
+    if sharded_converter is not None and (sharded_converter.key != key or sharded_converter.workers != shards):
+        sharded_converter.close()
+        sharded_converter = None
+    
+    if sharded_converter is None:
+        sharded_converter = ShardedConverter(hubert_path, model['model_file'], shards, precision, backend_name, BASE_DIR)
+        print(f"✅ Conversão particionada: {shards} processos para {model['name']}")
+    
+    return sharded_converter
+
+def get_chunk_store() -> ChunkStore:
+    """Armazenamento de segmentos convertidos (reuse), criado no processo que converte"""
+    global chunk_store
+    
+    with chunk_store_lock:
+        if chunk_store is None:
+            chunk_store = ChunkStore(CACHE_DIR / "chunks", CHUNK_CACHE_MB * 1024 * 1024)
+        return chunk_store
+
+def convert_audio(input_path: str, pitch: int, f0_method: str, index_file: str, index_rate: float, output_path: str, precision: str = "fp32", backend: Optional[str] = None, shards: int = 1, model: Optional[dict] = None, segment_callback=None, times: Optional[list] = None, reuse: bool = False, reuse_report: Optional[dict] = None, start: Optional[float] = None, end: Optional[float] = None):
+    """
+    Converte áudio usando RVC (com o modelo informado ou o atual); times recebe [npy, f0, infer].
+    Com reuse, segmentos iguais aos de conversões anteriores saem do chunk_store e
+    reuse_report recebe a proporção reaproveitada e o tempo economizado.
+    Com start/end (s), só esse trecho (mais x_pad s de contexto) é decodificado e convertido.
+    """
+    model = model or current_model
     
-    if current_model['net_g'] is None:
+    if model['net_g'] is None:
         raise HTTPException(status_code=400, detail="Nenhum modelo carregado")
     
-    # Carregar áudio
-    audio = load_audio(input_path, 16000)
-    times = [0, 0, 0]
+    runtime_backend = get_backend(backend, model)
     
-    if_f0 = current_model['cpt'].get("f0", 1)
+    # Carregar áudio (só o trecho pedido, com contexto, quando há start/end)
+    range_offset = None
+    with stage_timing.stage("decode"):
+        if start is None and end is None:
+            audio = load_audio(input_path, 16000)
+        else:
+            audio, range_offset = load_range(input_path, 16000, start, end, model['vc'].x_pad)
+    if len(audio) == 0:
+        raise HTTPException(status_code=400, detail="Trecho vazio (start além do fim do áudio?)")
+    if times is None:
+        times = [0, 0, 0]
+    
+    if_f0 = model['cpt'].get("f0", 1)
+    
+    def write_output(audio_opt):
+        if range_offset is not None:
+            audio_opt = trim_range(audio_opt, model['tgt_sr'], range_offset, start, end)
+        with stage_timing.stage("write"):
+            sf.write(output_path, audio_opt, model['tgt_sr'], format='WAV')
+    
+    # Workers do pool são daemon e não podem criar processos
+    if shards > 1 and multiprocessing.current_process().daemon:
+        print("⚠️ Conversão particionada indisponível dentro de um worker - usando 1 processo")
+        shards = 1
+    
+    if shards > 1:
+        # f0 e pontos de corte uma vez aqui, segmentos convertidos em paralelo
+        vc = model['vc']
+        prepared = vc.prepare(audio, times, pitch, f0_method, index_file, index_rate, if_f0, 128)
+        with model_lock:
+            converter = get_sharded_converter(shards, precision, runtime_backend.name, model)
+        audio_opt = converter.convert(vc, prepared, 0, times, index_file, segment_callback=segment_callback)
+        
+        write_output(audio_opt)
+        print(f"⏱️ Tempo ({precision}, {runtime_backend.name}, {shards} processos): f0={times[1]:.2f}s, npy+infer (soma dos processos)={times[0] + times[2]:.2f}s")
+        return output_path
+    
+    hubert = load_hubert(precision)
+    
+    # Requisições simultâneas compartilham o forward do Hubert (workers do pool convertem uma por vez)
+    if hubert_batcher is not None and not multiprocessing.current_process().daemon:
+        runtime_backend = hubert_batcher.wrap(runtime_backend)
+    
+    if reuse:
+        # Cortes definidos pelo conteúdo: trechos iguais caem nos mesmos segmentos
+        vc = model['vc']
+        prepared = vc.prepare(audio, times, pitch, f0_method, index_file, index_rate, if_f0, 128, split_policy="content")
+        params = conversion_params(
+            vc, model['model_file'], index_file, model['version'], model['tgt_sr'], if_f0,
+            pitch, f0_method, index_rate, precision, runtime_backend.name
+        )
+        audio_opt, report = convert_with_reuse(
+            vc, get_chunk_store(), params, audio, prepared, hubert, get_net_g(precision, model), 0, times,
+            model['version'], precision, runtime_backend, segment_callback=segment_callback
+        )
+        if reuse_report is not None:
+            reuse_report.update(report)
+        print(f"♻️ Reaproveitado: {report['reused_segments']}/{report['segments']} segmentos ({report['reuse_ratio']:.0%} do áudio, ~{report['saved_s']:.1f}s economizados)")
+        write_output(audio_opt)
+        return output_path
     
     # Converter
-    audio_opt = current_model['vc'].pipeline(
-        hubert_model,
-        current_model['net_g'],
+    audio_opt = model['vc'].pipeline(
+        hubert,
+        get_net_g(precision, model),
         0,  # sid
         audio,
         times,
@@ -230,18 +576,265 @@ def convert_audio(input_path: str, pitch: int, f0_method: str, index_file: str,
         index_file,
         index_rate,
         if_f0,
-        current_model['version'],
+        model['version'],
         128,  # crepe_hop_length
         None,
+        precision=precision,
+        backend=runtime_backend,
+        segment_callback=segment_callback,
     )
     
     # Salvar
-    sf.write(output_path, audio_opt, current_model['tgt_sr'], format='WAV')
+    write_output(audio_opt)
     
-    print(f"⏱️ Tempo: npy={times[0]:.2f}s, f0={times[1]:.2f}s, infer={times[2]:.2f}s")
+    print(f"⏱️ Tempo ({precision}, {runtime_backend.name}): npy={times[0]:.2f}s, f0={times[1]:.2f}s, infer={times[2]:.2f}s")
     
     return output_path
 
+def make_segment_callback(job: dict):
+    """Callback chamado pelo pipeline antes de cada segmento (cancelamento e progresso)"""
+    is_cancelled = job.get('is_cancelled')
+    on_segment = job.get('on_segment')
+    checkpoint = job.get('checkpoint')
+    
+    def callback(index: int, total: int):
+        if is_cancelled is not None and is_cancelled():
+            raise ConversionCancelled()
+        if checkpoint is not None:
+            checkpoint()
+        if on_segment is not None:
+            on_segment(index, total)
+    
+    return callback
+
+def run_conversion(job: dict):
+    """
+    Executa uma conversão descrita por um job (no servidor ou em um worker).
+    Preenche job['times'] ([npy, f0, infer]) e job['version'] para o modelo de custo,
+    job['stages'] com os tempos de cada estágio (telemetria) e job['memory'] com os
+    picos de memória.
+    """
+    job['stages'] = []
+    job['memory'] = None
+    recorder = accountant = None
+    try:
+        with ExitStack() as stack:
+            stack.enter_context(stage_timing.listen(stage_timing.collector(job['stages'])))
+            if job.get('trace_path'):
+                recorder = TraceRecorder(f"rvc {job['model_name']} ({job.get('job_id')})")
+                stack.enter_context(stage_timing.listen(recorder))
+            if MEMORY_ACCOUNTING or job.get('memory_profile'):
+                accountant = stack.enter_context(MemoryAccountant(track_allocations=job.get('memory_profile', False)))
+                stack.enter_context(stage_timing.listen(accountant))
+            return _run_conversion(job)
+    finally:
+        if recorder is not None:
+            recorder.save(job['trace_path'])
+            print(f"🔎 Trace salvo: {job['trace_path']}")
+        if accountant is not None:
+            job['memory'] = accountant.report()
+            print(f"🧠 Memória: pico RSS={job['memory']['rss_peak_mb']}MB (estágio: {job['memory']['peak_stage']})")
+
+def _run_conversion(job: dict):
+    with stage_timing.stage("model_load", model=job['model_name']):
+        model = load_rvc_model(job['model_name'])
+    job['version'] = model['version']
+    job['times'] = [0, 0, 0]
+    return convert_audio(
+        job['input_audio'],
+        job['pitch'],
+        job['f0_method'],
+        job['index_file'],
+        job['index_rate'],
+        job['output_path'],
+        job['precision'],
+        job['backend'],
+        job.get('shards', 1),
+        model,
+        make_segment_callback(job),
+        job['times'],
+        job.get('reuse', False),
+        job.setdefault('reuse_report', {}),
+        job.get('start'),
+        job.get('end')
+    )
+
+def worker_convert(job: dict):
+    """Handler dos processos do pool: resultado (saída + tempos) + modelos em cache (para a afinidade)"""
+    try:
+        start = time.time()
+        output_path = run_conversion(job)
+        result = {
+            'output_path': output_path,
+            'times': job['times'],
+            'version': job['version'],
+            'service_s': time.time() - start,
+            'stages': job['stages'],
+            'memory': job['memory'],
+            'reuse': job.get('reuse_report')
+        }
+        return result, list(model_cache)
+    except HTTPException as e:
+        raise WorkerError(e.status_code, e.detail)
+    except ConversionCancelled:
+        raise WorkerError(409, "Conversão cancelada")
+
+def run_scheduled(job: dict, state: JobState):
+    """Roda o job na thread quando o agendador der a vez, cedendo-a entre segmentos"""
+    def abort_if_cancelled():
+        if state.cancel_event.is_set():
+            raise ConversionCancelled()
+    
+    def checkpoint():
+        if scheduler.should_yield(state.ticket):
+            state.status = "paused"
+            state.paused_since = time.time()
+            try:
+                with stage_timing.stage("preempted", priority=state.priority):
+                    scheduler.yield_slot(state.ticket, abort_if_cancelled)
+            finally:
+                state.paused_s += time.time() - state.paused_since
+                state.paused_since = None
+            state.status = "running"
+    
+    scheduler.acquire(state.ticket, abort_if_cancelled)
+    try:
+        state.status = "running"
+        state.started = time.time()
+        job['checkpoint'] = checkpoint
+        output_path = run_conversion(job)
+        state.service_s = time.time() - state.started - state.paused_s
+        state.times = job['times']
+        model_versions[job['model_name']] = job['version']
+        return output_path
+    finally:
+        state.stages = job.get('stages', [])
+        state.memory = job.get('memory')
+        scheduler.release(state.ticket)
+
+def request_features(request: ConvertRequest, index_file: str, precision: str) -> dict:
+    """Características de uma requisição para o modelo de custo"""
+    try:
+        audio_seconds = sf.info(request.input_audio).duration
+    except Exception:
+        # Formato que o soundfile não lê (mp3, m4a...): ~128 kbps
+        audio_seconds = os.path.getsize(request.input_audio) / 16000.0
+    if request.start is not None or request.end is not None:
+        # Só o trecho pedido é convertido
+        audio_seconds = min(audio_seconds, request.end or audio_seconds) - min(audio_seconds, request.start or 0.0)
+    return job_features(
+        audio_seconds,
+        model_versions.get(request.model_name),
+        request.f0_method,
+        device,
+        precision,
+        request.backend or default_backend,
+        os.path.getsize(index_file) if index_file else 0,
+        request.shards
+    )
+
+def model_fingerprint(model_name: str) -> str:
+    """
+    Hash do modelo de voz (.pth e .index): muda quando qualquer um dos arquivos muda.
+    O .index considerado é o que o pipeline carrega (o compactado, quando está em dia).
+    """
+    model_dir = MODELS_DIR / model_name
+    pth_files = [f for f in model_dir.glob("*.pth") if not f.name.startswith(("G_", "D_")) and f.stat().st_size < 200 * 1024 * 1024]
+    index_files = [f for f in model_dir.glob("*.index") if not compact_index.is_compact(f)]
+    if not pth_files:
+        raise HTTPException(status_code=404, detail=f"Arquivo .pth não encontrado em '{model_name}'")
+    return model_digest(pth_files[0], compact_index.resolve_index_file(str(index_files[0])) if index_files else "")
+
+def job_etas() -> dict:
+    """
+    Previsão de término (s a partir de agora) de cada job ativo: os jobs em
+    espera são atendidos na ordem do agendador, dividindo o paralelismo.
+    """
+    parallel = NUM_WORKERS or CONVERSION_CONCURRENCY
+    active = sorted(jobs.values(), key=lambda state: (state.started is None, state.ticket.key()))
+    etas = {}
+    ahead = 0.0
+    for state in active:
+        remaining = state.remaining_s()
+        if state.started is None:
+            etas[state.id] = ahead / parallel + remaining
+        else:
+            etas[state.id] = remaining
+        ahead += remaining
+    return etas
+
+def estimate_wait(predicted_s: float = 0.0) -> float:
+    """Espera estimada (s) para um novo job: trabalho previsto dos jobs ativos / paralelismo"""
+    parallel = NUM_WORKERS or CONVERSION_CONCURRENCY
+    return sum(state.remaining_s() for state in jobs.values()) / parallel + predicted_s
+
+def admit_job(job_id: Optional[str], model_name: str, priority: str = "normal", features: Optional[dict] = None) -> JobState:
+    """Aceita um job ou responde 429 (fila cheia) com Retry-After"""
+    if len(jobs) >= MAX_QUEUE:
+        job_counters["rejected"] += 1
+        jobs_total.inc(status="rejected", priority=priority)
+        wait = estimate_wait(cost_model.predict(features) if features else 0.0)
+        raise HTTPException(
+            status_code=429,
+            detail={"message": "Fila de conversão cheia", "queue_size": len(jobs), "estimated_wait_s": round(wait, 1)},
+            headers={"Retry-After": str(max(1, math.ceil(wait)))}
+        )
+    
+    job_id = job_id or uuid.uuid4().hex
+    if job_id in jobs:
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' já está ativo")
+    
+    state = JobState(job_id, model_name, priority, features)
+    jobs[job_id] = state
+    job_counters["admitted"] += 1
+    return state
+
+def finish_job(state: JobState, status: str):
+    """Remove o job ativo, atualiza contadores, latências e o histórico do modelo de custo"""
+    jobs.pop(state.id, None)
+    state.status = status
+    job_counters[status] += 1
+    jobs_total.inc(status=status, priority=state.priority)
+    for name, _, seconds, labels in state.stages:
+        stage_seconds.observe(seconds, stage=name, method=labels.get("method", ""))
+    if state.memory:
+        job_peak_rss.observe(state.memory["rss_peak_mb"] * 1024 * 1024)
+        for name, figures in state.memory["stages"].items():
+            stage_peak_rss.observe(figures["rss_peak_mb"] * 1024 * 1024, stage=name)
+        memory_history.append({
+            "job_id": state.id,
+            "model": state.model_name,
+            "status": status,
+            "audio_s": state.features["audio_s"] if state.features else None,
+            "rss_peak_mb": state.memory["rss_peak_mb"],
+            "peak_stage": state.memory["peak_stage"]
+        })
+    if status == "completed" and state.started:
+        latency_history[state.priority].append(time.time() - state.created)
+        if state.service_s:
+            job_seconds.observe(state.service_s, priority=state.priority)
+        if state.service_s and state.features and state.features["audio_s"] > 0:
+            audio_seconds_total.inc(state.features["audio_s"])
+            realtime_factor.observe(state.service_s / state.features["audio_s"])
+        if state.features and state.service_s:
+            # A versão só é conhecida depois de carregar o modelo
+            features = dict(state.features, version=model_versions.get(state.model_name, state.features["version"]))
+            cost_model.record(features, state.service_s, state.times, state.predicted_s)
+
+def latency_percentiles():
+    """p50/p95 da latência (s) por classe de prioridade"""
+    result = {}
+    for name, history in latency_history.items():
+        values = sorted(history)
+        if not values:
+            continue
+        result[name] = {
+            "count": len(values),
+            "p50_s": round(values[len(values) // 2], 2),
+            "p95_s": round(values[min(len(values) - 1, int(0.95 * len(values)))], 2)
+        }
+    return result
+
 async def generate_tts(text: str, voice: str, rate: int, pitch: int, output_path: str):
     """Gera áudio usando Edge TTS"""
     if not EDGE_TTS_AVAILABLE:
@@ -255,6 +848,29 @@ async def generate_tts(text: str, voice: str, rate: int, pitch: int, output_path
     
     return output_path
 
+async def adjust_speed(input_path: str, speed: float, output_path: str):
+    """Muda a velocidade com o atempo do FFmpeg (mesma cadeia do adjustAudioSpeed do main.js)"""
+    filters = []
+    current = speed
+    while current > 2.0:
+        filters.append("atempo=2.0")
+        current /= 2.0
+    while current < 0.5:
+        filters.append("atempo=0.5")
+        current /= 0.5
+    if current != 1.0:
+        filters.append(f"atempo={current:.2f}")
+
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-nostdin", "-i", input_path, "-filter:a", ",".join(filters), "-vn", "-y", output_path,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"FFmpeg falhou: {stderr.decode(errors='ignore')[-500:]}")
+    return output_path
+
 # ============================================
 # ENDPOINTS
 # ============================================
@@ -267,6 +883,11 @@ async def root():
         "version": "1.0.0",
         "status": "running",
         "device": str(device),
+        "cpu_precision": default_precision,
+        "backend": default_backend,
+        "bf16_supported": cpu_precision.cpu_supports_bf16(),
+        "workers": NUM_WORKERS,
+        "shared_weights": shared_weights.enabled(config),
         "edge_tts": EDGE_TTS_AVAILABLE,
         "base_dir": str(BASE_DIR)
     }
@@ -290,8 +911,8 @@ async def list_models():
         if not pth_files:
             continue
         
-        # Verificar se tem .index
-        index_files = list(model_dir.glob("*.index"))
+        # Verificar se tem .index (o .compact.index é derivado do original)
+        index_files = [f for f in model_dir.glob("*.index") if not compact_index.is_compact(f)]
         
         models.append(ModelInfo(
             name=model_dir.name,
@@ -311,12 +932,41 @@ async def load_model(model_name: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/models/compact_index")
+async def compact_model_index(model_name: str, force: bool = False):
+    """Compacta o .index do modelo (k-means + IVF); o pipeline passa a usar o .compact.index"""
+    model_dir = MODELS_DIR / model_name
+    index_files = [f for f in model_dir.glob("*.index") if not compact_index.is_compact(f)]
+    if not index_files:
+        raise HTTPException(status_code=404, detail=f"Arquivo .index não encontrado em '{model_name}'")
+    
+    index_file = str(index_files[0])
+    if not force and compact_index.resolve_index_file(index_file) != index_file:
+        return {"success": True, "compacted": False, "index": compact_index.compact_path(index_file)}
+    
+    try:
+        out_path, report = await asyncio.to_thread(compact_index.compact_index, index_file)
+        return {"success": True, "compacted": True, "index": out_path, "report": report}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/convert")
 async def convert(request: ConvertRequest):
     """Converte áudio usando RVC"""
+    state = None
+    status = "failed"
     try:
-        # Carregar modelo se necessário
-        load_rvc_model(request.model_name)
+        precision = resolve_request_precision(request.precision)
+        if request.priority not in PRIORITIES:
+            raise HTTPException(status_code=400, detail=f"Prioridade '{request.priority}' inválida (use: {', '.join(PRIORITIES)})")
+        if not 1 <= request.shards <= (os.cpu_count() or 1):
+            raise HTTPException(status_code=400, detail=f"shards deve estar entre 1 e {os.cpu_count()}")
+        if (request.start is not None and request.start < 0) or (request.end is not None and request.end <= (request.start or 0)):
+            raise HTTPException(status_code=400, detail="Trecho inválido: use 0 <= start < end")
+        
+        # Verificar se o modelo existe (o carregamento acontece na conversão)
+        if not (MODELS_DIR / request.model_name).exists():
+            raise HTTPException(status_code=404, detail=f"Modelo '{request.model_name}' não encontrado")
         
         # Verificar se arquivo de entrada existe
         if not Path(request.input_audio).exists():
@@ -324,7 +974,7 @@ async def convert(request: ConvertRequest):
         
         # Encontrar arquivo .index
         model_dir = MODELS_DIR / request.model_name
-        index_files = list(model_dir.glob("*.index"))
+        index_files = [f for f in model_dir.glob("*.index") if not compact_index.is_compact(f)]
         index_file = str(index_files[0]) if index_files else ""
         
         # Gerar nome de saída
@@ -334,24 +984,114 @@ async def convert(request: ConvertRequest):
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_path = OUTPUT_DIR / f"converted_{timestamp}.wav"
         
-        # Converter
-        result_path = convert_audio(
-            request.input_audio,
-            request.pitch,
-            request.f0_method,
-            index_file,
-            request.index_rate,
-            str(output_path)
-        )
+        job = {
+            'model_name': request.model_name,
+            'input_audio': request.input_audio,
+            'pitch': request.pitch,
+            'f0_method': request.f0_method,
+            'index_file': index_file,
+            'index_rate': request.index_rate,
+            'output_path': str(output_path),
+            'precision': precision,
+            'backend': request.backend,
+            'shards': request.shards,
+            'start': request.start,
+            'end': request.end
+        }
         
+        # Admissão: fila cheia -> 429 com Retry-After
+        state = admit_job(request.job_id, request.model_name, request.priority, request_features(request, index_file, precision))
+        job['job_id'] = state.id
+        job['memory_profile'] = request.memory_profile or MEMORY_PROFILE_ALL
+        job['reuse'] = request.reuse or CHUNK_REUSE_ALL
+        # Prioridade no worker do pool (agendador local, preempção entre segmentos)
+        job['priority'] = request.priority
+        job['predicted_s'] = state.predicted_s
+        if request.trace or TRACE_ALL:
+            job['trace_path'] = str(TRACES_DIR / f"{state.id}.json")
+        
+        # Converter (no pool, roteado para um worker com a voz já carregada)
+        if worker_pool is not None:
+            state.status = "submitted"
+            state.started = time.time()
+            try:
+                future = worker_pool.submit(job, key=request.model_name, urgent=request.priority == "interactive")
+                result = await asyncio.wrap_future(future)
+                result_path = result['output_path']
+                state.service_s = result['service_s']
+                state.times = result['times']
+                state.stages = result['stages']
+                state.memory = result['memory']
+                job['reuse_report'] = result.get('reuse')
+                model_versions[request.model_name] = result['version']
+            except WorkerError as e:
+                if e.status_code == 409 and state.cancel_event.is_set():
+                    raise ConversionCancelled()
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
+        else:
+            # Em thread: o event loop continua atendendo (e o Hubert pode agrupar requisições);
+            # a vez de usar o dispositivo é decidida pelo agendador de prioridades
+            job['is_cancelled'] = state.cancel_event.is_set
+            job['on_segment'] = state.on_segment
+            loop = asyncio.get_running_loop()
+            result_path = await loop.run_in_executor(job_executor, run_scheduled, job, state)
+        
+        reuse_report = job.get('reuse_report')
+        if reuse_report:
+            chunk_reused_seconds.inc(reuse_report['reused_audio_s'])
+            chunk_saved_seconds.inc(reuse_report['saved_s'])
+        
+        status = "completed"
         return {
             "success": True,
+            "job_id": state.id,
             "output_path": str(result_path),
-            "model": request.model_name
+            "model": request.model_name,
+            "precision": precision,
+            "predicted_s": round(state.predicted_s, 2),
+            "service_s": round(state.service_s or 0.0, 2),
+            "trace_path": job.get('trace_path'),
+            "memory": state.memory,
+            "reuse": job.get('reuse_report') or None
         }
         
+    except ConversionCancelled:
+        status = "cancelled"
+        raise HTTPException(status_code=409, detail={"message": "Conversão cancelada", "job_id": state.id})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if state is not None:
+            finish_job(state, status)
+
+@app.get("/jobs")
+async def list_jobs():
+    """Jobs ativos e contadores de admissão/cancelamento"""
+    etas = job_etas()
+    return {
+        "jobs": [dict(state.to_dict(), eta_s=round(etas.get(state.id, 0.0), 1)) for state in jobs.values()],
+        "max_queue": MAX_QUEUE,
+        "estimated_wait_s": round(estimate_wait(), 1),
+        "cost_model": cost_model.stats(),
+        "counters": job_counters,
+        "scheduler": scheduler.stats(),
+        "latency": latency_percentiles()
+    }
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancela um job: na fila sai sem rodar, em execução para no próximo segmento"""
+    state = jobs.get(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' não encontrado")
+    
+    state.cancel_event.set()
+    if worker_pool is not None:
+        worker_pool.cancel(job_id)
+    
+    return {"success": True, "job_id": job_id, "status": state.status}
 
 @app.post("/tts")
 async def text_to_speech(request: TTSRequest):
@@ -376,6 +1116,346 @@ async def text_to_speech(request: TTSRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def convert_part(request: ConvertRequest):
+    """
+    convert() de um trecho de roteiro / render / TTS em streaming já em andamento: com a
+    fila cheia (429) espera o Retry-After e tenta de novo, até PART_ADMISSION_TIMEOUT_S,
+    em vez de falhar no meio do pedido.
+    """
+    deadline = time.time() + PART_ADMISSION_TIMEOUT_S
+    while True:
+        try:
+            return await convert(request)
+        except HTTPException as e:
+            remaining = deadline - time.time()
+            if e.status_code != 429 or remaining <= 0:
+                raise
+            retry_after = float((e.headers or {}).get("Retry-After", 1))
+            await asyncio.sleep(min(retry_after, remaining))
+
+async def run_script(request: ScriptRequest, prefix: str):
+    """
+    TTS -> (atempo) -> RVC de um roteiro em pipeline: o TTS dos próximos trechos
+    (até tts_concurrency simultâneos e à frente da conversão) roda enquanto o trecho
+    atual é convertido. Cada trecho é emitido (NDJSON) assim que sua conversão termina.
+    """
+    lookahead = max(1, request.tts_concurrency)
+    tts_slots = asyncio.Semaphore(lookahead)
+    converted = asyncio.Condition()
+    done_count = 0
+    start = time.time()
+    tts_total = rvc_total = 0.0
+
+    def temp_files(i: int):
+        """Áudios intermediários do trecho (TTS e, com speed, o TTS acelerado)"""
+        return TEMP_DIR / f"{prefix}_{i:03d}_tts.wav", TEMP_DIR / f"{prefix}_{i:03d}_speed.wav"
+
+    async def synthesize(i: int, text: str):
+        # Não gerar mais que lookahead trechos à frente do que já foi convertido
+        async with converted:
+            await converted.wait_for(lambda: i < done_count + lookahead)
+        async with tts_slots:
+            tts_start = time.time()
+            tts_path, speed_path = temp_files(i)
+            await generate_tts(text, request.voice, request.rate, request.tts_pitch, str(tts_path))
+            if request.speed != 1.0:
+                return await adjust_speed(str(tts_path), request.speed, str(speed_path)), time.time() - tts_start
+            return str(tts_path), time.time() - tts_start
+
+    tasks = [asyncio.ensure_future(synthesize(i, text)) for i, text in enumerate(request.partitions)]
+    failed = 0
+    try:
+        for i, task in enumerate(tasks):
+            line = {"type": "partition", "index": i}
+            try:
+                tts_path, tts_s = await task
+                tts_total += tts_s
+                rvc_start = time.time()
+                result = await convert_part(ConvertRequest(
+                    input_audio=tts_path,
+                    model_name=request.model_name,
+                    pitch=request.pitch,
+                    f0_method=request.f0_method,
+                    index_rate=request.index_rate,
+                    output_name=f"{prefix}_{i:03d}.wav",
+                    precision=request.precision,
+                    backend=request.backend,
+                    priority=request.priority
+                ))
+                rvc_s = time.time() - rvc_start
+                rvc_total += rvc_s
+                line.update(success=True, output_path=result["output_path"], job_id=result["job_id"],
+                            tts_s=round(tts_s, 2), rvc_s=round(rvc_s, 2))
+            except HTTPException as e:
+                failed += 1
+                line.update(success=False, status_code=e.status_code, detail=e.detail)
+            except Exception as e:
+                failed += 1
+                line.update(success=False, status_code=500, detail=str(e))
+            finally:
+                for path in temp_files(i):
+                    path.unlink(missing_ok=True)
+                async with converted:
+                    done_count += 1
+                    converted.notify_all()
+            line["elapsed_s"] = round(time.time() - start, 2)
+            yield json.dumps(line) + "\n"
+
+        elapsed = time.time() - start
+        print(f"📜 Roteiro {prefix}: {len(tasks)} trechos em {elapsed:.1f}s (TTS {tts_total:.1f}s + RVC {rvc_total:.1f}s em sequência)")
+        yield json.dumps({
+            "type": "done",
+            "partitions": len(tasks),
+            "failed": failed,
+            "elapsed_s": round(elapsed, 2),
+            "tts_s": round(tts_total, 2),
+            "rvc_s": round(rvc_total, 2),
+            # Tempo que o fluxo sequencial (TTS e depois RVC, trecho a trecho) levaria
+            "sequential_s": round(tts_total + rvc_total, 2)
+        }) + "\n"
+    finally:
+        # Cliente desconectou ou terminou: TTS ainda pendentes não são mais necessários,
+        # nem os áudios dos trechos que já estavam prontos mas não foram convertidos
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for i in range(len(tasks)):
+            for path in temp_files(i):
+                path.unlink(missing_ok=True)
+
+@app.post("/tts/convert")
+async def script_to_voice(request: ScriptRequest):
+    """TTS + conversão RVC de um roteiro particionado, em pipeline, com resultados em NDJSON"""
+    if not request.partitions:
+        raise HTTPException(status_code=400, detail="Nenhum trecho informado")
+    if not (MODELS_DIR / request.model_name).exists():
+        raise HTTPException(status_code=404, detail=f"Modelo '{request.model_name}' não encontrado")
+    if request.priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Prioridade '{request.priority}' inválida (use: {', '.join(PRIORITIES)})")
+    if request.speed <= 0:
+        raise HTTPException(status_code=400, detail="speed deve ser maior que zero")
+
+    prefix = Path(request.output_prefix).name if request.output_prefix else f"script_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    return StreamingResponse(run_script(request, prefix), media_type="application/x-ndjson")
+
+@app.post("/render")
+async def render_partition(request: RenderRequest):
+    """
+    Renderiza uma partição frase a frase: frases já renderizadas com a mesma voz,
+    modelo e parâmetros saem do cache, as demais passam por TTS + RVC (TTS das
+    próximas enquanto a atual converte) e a partição é montada com crossfade.
+    """
+    start = time.time()
+    sentences = split_sentences(request.text)
+    if not sentences:
+        raise HTTPException(status_code=400, detail="Texto vazio")
+    if not (MODELS_DIR / request.model_name).exists():
+        raise HTTPException(status_code=404, detail=f"Modelo '{request.model_name}' não encontrado")
+    if request.priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Prioridade '{request.priority}' inválida (use: {', '.join(PRIORITIES)})")
+
+    settings = {
+        "voice": request.voice,
+        "rate": request.rate,
+        "tts_pitch": request.tts_pitch,
+        "model": await asyncio.to_thread(model_fingerprint, request.model_name),
+        "pitch": request.pitch,
+        "f0_method": request.f0_method,
+        "index_rate": request.index_rate,
+        # int8/bf16 ou outro backend mudam o áudio: não servir uma variante no lugar de outra
+        "precision": resolve_request_precision(request.precision),
+        "backend": (request.backend or default_backend).lower()
+    }
+    keys = [render_cache.key(sentence, settings) for sentence in sentences]
+    pieces = [await asyncio.to_thread(render_cache.get, key) for key in keys]
+    missing = [i for i, piece in enumerate(pieces) if piece is None]
+    render_sentences.inc(len(sentences) - len(missing), source="cache")
+    render_sentences.inc(len(missing), source="rendered")
+
+    prefix = f"render_{uuid.uuid4().hex[:8]}"
+    tts_slots = asyncio.Semaphore(max(1, request.tts_concurrency))
+
+    async def synthesize(i: int):
+        async with tts_slots:
+            tts_path = str(TEMP_DIR / f"{prefix}_{i:03d}_tts.wav")
+            return await generate_tts(sentences[i], request.voice, request.rate, request.tts_pitch, tts_path)
+
+    tasks = {i: asyncio.ensure_future(synthesize(i)) for i in missing}
+    try:
+        for i in missing:
+            try:
+                tts_path = await tasks[i]
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=502, detail=f"TTS falhou na frase {i + 1}: {e}")
+            result = await convert_part(ConvertRequest(
+                input_audio=tts_path,
+                model_name=request.model_name,
+                pitch=request.pitch,
+                f0_method=request.f0_method,
+                index_rate=request.index_rate,
+                output_name=f"{prefix}_{i:03d}.wav",
+                precision=request.precision,
+                backend=request.backend,
+                priority=request.priority
+            ))
+            audio, sample_rate = await asyncio.to_thread(sf.read, result["output_path"], dtype="float32")
+            await asyncio.to_thread(render_cache.put, keys[i], audio, sample_rate)
+            pieces[i] = (audio, sample_rate)
+            for path in (tts_path, result["output_path"]):
+                Path(path).unlink(missing_ok=True)
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+    sample_rate = pieces[0][1]
+    if any(rate != sample_rate for _, rate in pieces):
+        raise HTTPException(status_code=500, detail="Frases em cache com taxas de amostragem diferentes")
+    audio = crossfade_concat([piece for piece, _ in pieces], int(sample_rate * request.crossfade_ms / 1000))
+
+    output_path = OUTPUT_DIR / (request.output_name or f"render_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav")
+    await asyncio.to_thread(sf.write, str(output_path), audio, sample_rate, format='WAV')
+    print(f"🧩 Render: {len(sentences)} frases ({len(sentences) - len(missing)} do cache) em {time.time() - start:.1f}s")
+
+    return {
+        "success": True,
+        "output_path": str(output_path),
+        "sentences": len(sentences),
+        "cached": len(sentences) - len(missing),
+        "rendered": len(missing),
+        "duration_s": round(len(audio) / sample_rate, 2),
+        "elapsed_s": round(time.time() - start, 2)
+    }
+
+@app.get("/render/cache")
+async def render_cache_status():
+    """Entradas, tamanho e acertos do cache de frases"""
+    return await asyncio.to_thread(render_cache.stats)
+
+async def run_tts_stream(request: TTSStreamRequest, prefix: str):
+    """
+    Frases do TTS em streaming, gravadas (e convertidas, com model_name) assim que
+    chegam; a síntese das frases seguintes continua durante a conversão.
+    """
+    start = time.time()
+    stats = {}
+    sentences = asyncio.Queue()
+
+    async def synthesize():
+        try:
+            communicate = edge_tts.Communicate(request.text, request.voice, rate=f"{request.rate:+d}%", pitch=f"{request.pitch:+d}Hz")
+            index = 0
+            async for pcm, offset_s in stream_sentences(communicate, 16000, stats=stats):
+                if index == 0 and "first_audio_s" in stats:
+                    tts_first_audio.observe(stats["first_audio_s"])
+                tts_path = str(TEMP_DIR / f"{prefix}_{index:03d}_tts.wav")
+                sf.write(tts_path, pcm, 16000, format='WAV')
+                await sentences.put((index, tts_path, offset_s, len(pcm) / 16000))
+                index += 1
+        except Exception as e:
+            await sentences.put(e)
+        finally:
+            await sentences.put(None)
+
+    producer = asyncio.ensure_future(synthesize())
+    first_output_s = None
+    count = 0
+    try:
+        while True:
+            item = await sentences.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                yield json.dumps({"type": "error", "detail": str(item)}) + "\n"
+                break
+
+            index, tts_path, offset_s, duration_s = item
+            line = {"type": "sentence", "index": index, "start_s": round(offset_s, 2), "duration_s": round(duration_s, 2)}
+            if request.model_name:
+                try:
+                    result = await convert_part(ConvertRequest(
+                        input_audio=tts_path,
+                        model_name=request.model_name,
+                        pitch=request.rvc_pitch,
+                        f0_method=request.f0_method,
+                        index_rate=request.index_rate,
+                        output_name=f"{prefix}_{index:03d}.wav",
+                        precision=request.precision,
+                        backend=request.backend,
+                        priority=request.priority
+                    ))
+                    line.update(success=True, output_path=result["output_path"], job_id=result["job_id"])
+                except HTTPException as e:
+                    line.update(success=False, status_code=e.status_code, detail=e.detail)
+            else:
+                line.update(success=True, output_path=tts_path)
+
+            if first_output_s is None and line["success"]:
+                first_output_s = time.time() - start
+                tts_first_output.observe(first_output_s)
+            count += 1
+            line["elapsed_s"] = round(time.time() - start, 2)
+            yield json.dumps(line) + "\n"
+
+        print(f"🔊 TTS em streaming {prefix}: {count} frases, 1º áudio em {stats.get('first_audio_s', 0):.2f}s, 1ª frase pronta em {first_output_s or 0:.2f}s")
+        yield json.dumps({
+            "type": "done",
+            "sentences": count,
+            "audio_s": round(stats.get("audio_s", 0.0), 2),
+            "first_audio_s": round(stats["first_audio_s"], 2) if "first_audio_s" in stats else None,
+            "first_output_s": round(first_output_s, 2) if first_output_s is not None else None,
+            "elapsed_s": round(time.time() - start, 2)
+        }) + "\n"
+    finally:
+        producer.cancel()
+
+@app.post("/tts/stream")
+async def text_to_speech_stream(request: TTSStreamRequest):
+    """TTS em streaming: cada frase (convertida com model_name) sai em NDJSON assim que fica pronta"""
+    if not EDGE_TTS_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Edge TTS não disponível")
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Texto vazio")
+    if request.model_name and not (MODELS_DIR / request.model_name).exists():
+        raise HTTPException(status_code=404, detail=f"Modelo '{request.model_name}' não encontrado")
+    if request.priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Prioridade '{request.priority}' inválida (use: {', '.join(PRIORITIES)})")
+
+    prefix = Path(request.output_prefix).name if request.output_prefix else f"stream_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    return StreamingResponse(run_tts_stream(request, prefix), media_type="application/x-ndjson")
+
+@app.get("/workers")
+async def workers_status():
+    """Estado do pool de inferência: fila por worker e modelos carregados"""
+    if worker_pool is None:
+        return {"workers": [], "queue_depth": 0, "loaded_models": list(model_cache)}
+    return worker_pool.stats()
+
+@app.get("/batching")
+async def batching_status():
+    """Estatísticas do micro-batching do Hubert"""
+    if hubert_batcher is None:
+        return {"enabled": False, "concurrency": CONVERSION_CONCURRENCY}
+    return {"enabled": True, "concurrency": CONVERSION_CONCURRENCY, **hubert_batcher.stats()}
+
+@app.get("/memory")
+async def memory_status():
+    """Memória do servidor e dos workers (RSS conta os pesos compartilhados em cada processo; PSS/USS não)"""
+    processes = [{"role": "server", "pid": os.getpid(), **shared_weights.memory_usage()}]
+    if worker_pool is not None:
+        for worker in worker_pool.stats()["workers"]:
+            processes.append({"role": f"worker-{worker['id']}", "pid": worker["pid"], **shared_weights.memory_usage(worker["pid"])})
+    
+    total = {key: round(sum(p.get(key, 0) for p in processes), 1) for key in ("rss_mb", "pss_mb", "uss_mb")}
+    return {
+        "shared_weights": shared_weights.enabled(config),
+        "processes": processes,
+        "total": total,
+        "models_cached": list(model_cache),
+        "recent_jobs": list(memory_history)
+    }
+
 @app.get("/audio/{filename}")
 async def get_audio(filename: str):
     """Retorna arquivo de áudio"""
@@ -401,6 +1481,229 @@ async def websocket_progress(websocket: WebSocket):
     except Exception as e:
         print(f"WebSocket error: {e}")
 
+def open_realtime_session(settings: dict) -> StreamingConverter:
+    """Carrega modelo, Hubert, backend e índice e cria o conversor em blocos da sessão"""
+    model_name = settings.get("model_name")
+    if not model_name or not (MODELS_DIR / model_name).exists():
+        raise HTTPException(status_code=404, detail=f"Modelo '{model_name}' não encontrado")
+    precision = resolve_request_precision(settings.get("precision"))
+    model = load_rvc_model(model_name)
+
+    index, big_npy = None, None
+    index_rate = float(settings.get("index_rate", 0.0))
+    index_files = [f for f in (MODELS_DIR / model_name).glob("*.index") if not compact_index.is_compact(f)]
+    if index_rate > 0 and index_files:
+        index, big_npy = model['vc'].load_index(str(index_files[0]))
+
+    try:
+        return StreamingConverter(
+            model['vc'],
+            load_hubert(precision),
+            get_net_g(precision, model),
+            model['version'],
+            model['cpt'].get("f0", 1),
+            model['tgt_sr'],
+            f0_method=settings.get("f0_method", "pm"),
+            f0_up_key=int(settings.get("pitch", 0)),
+            index=index,
+            big_npy=big_npy,
+            index_rate=index_rate,
+            block_ms=int(settings.get("block_ms", 200)),
+            context_ms=int(settings.get("context_ms", 800)),
+            crossfade_ms=int(settings.get("crossfade_ms", 40)),
+            search_ms=int(settings.get("search_ms", 10)),
+            precision=precision,
+            backend=get_backend(settings.get("backend"), model),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def convert_realtime_block(converter: StreamingConverter, block):
+    """Converte um bloco numa vaga de tempo real (a espera por ela entra nas estatísticas)"""
+    ticket = realtime_gate.ticket("interactive")
+    start = time.perf_counter()
+    realtime_gate.acquire(ticket)
+    try:
+        return converter.process(block, queue_wait=time.perf_counter() - start)
+    finally:
+        realtime_gate.release(ticket)
+
+@app.websocket("/ws/realtime")
+async def websocket_realtime(websocket: WebSocket):
+    """
+    Conversão em tempo real (monitoramento ao vivo).
+
+    1ª mensagem (JSON): model_name, pitch, f0_method (pm), index_rate, sample_rate (16000),
+    format (f32 ou s16), block_ms (200), context_ms (800), crossfade_ms (40), search_ms (10),
+    precision, backend, stats_every (blocos entre mensagens de estatística, 0 desliga).
+    Depois: PCM mono binário em qualquer tamanho; cada bloco convertido volta como binário
+    no mesmo formato, na taxa do modelo (output_sample_rate da mensagem "ready").
+    """
+    global realtime_sessions
+    await websocket.accept()
+
+    try:
+        settings = await websocket.receive_json()
+        sample_rate = int(settings.get("sample_rate", 16000))
+        sample_format = settings.get("format", "f32")
+        if sample_format not in ("f32", "s16"):
+            raise HTTPException(status_code=400, detail="format deve ser f32 ou s16")
+        converter = await asyncio.to_thread(open_realtime_session, settings)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close()
+        return
+    except (ValueError, TypeError, KeyError) as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close()
+        return
+
+    stats_every = int(settings.get("stats_every", 10))
+    max_backlog = max(converter.block, REALTIME_MAX_BACKLOG_MS * 16 // converter.block * converter.block)
+    await websocket.send_json({
+        "type": "ready",
+        "output_sample_rate": converter.tgt_sr,
+        "block_samples": converter.block * sample_rate // 16000,
+        "algorithmic_latency_ms": converter.algorithmic_latency_ms
+    })
+    print(f"🎙️ Tempo real: {settings['model_name']} (bloco {converter.block / 16:.0f}ms, latência algorítmica {converter.algorithmic_latency_ms:.0f}ms)")
+
+    # Entrada a 16 kHz ainda não convertida; o receptor acumula e o conversor consome blocos
+    resampler = StreamingResampler(sample_rate, 16000) if sample_rate != 16000 else None
+    pending = deque()
+    pending_samples = 0
+    arrived = asyncio.Event()
+    dropped = 0
+
+    async def receive():
+        nonlocal pending_samples, dropped
+        while True:
+            data = await websocket.receive_bytes()
+            if sample_format == "s16":
+                chunk = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+            else:
+                chunk = np.frombuffer(data, dtype=np.float32)
+            if resampler is not None:
+                # Estado do filtro mantido entre mensagens (sem descontinuidade nas emendas)
+                chunk = resampler.process(chunk)
+            pending.append(chunk)
+            pending_samples += chunk.shape[0]
+            # Atrasado demais: descarta a entrada mais antiga em vez de acumular latência
+            while pending_samples > max_backlog and len(pending) > 1:
+                old = pending.popleft()
+                pending_samples -= old.shape[0]
+                dropped += old.shape[0]
+                realtime_dropped_seconds.inc(old.shape[0] / 16000.0)
+            arrived.set()
+
+    async def convert_blocks():
+        nonlocal pending_samples
+        while True:
+            await arrived.wait()
+            arrived.clear()
+            while pending_samples >= converter.block:
+                buffered = np.concatenate(pending)
+                block, rest = buffered[:converter.block], buffered[converter.block:]
+                pending.clear()
+                if rest.shape[0]:
+                    pending.append(rest)
+                pending_samples = rest.shape[0]
+
+                start = time.perf_counter()
+                audio = await asyncio.to_thread(convert_realtime_block, converter, block)
+                realtime_block_seconds.observe(time.perf_counter() - start)
+                if sample_format == "s16":
+                    await websocket.send_bytes((np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+                else:
+                    await websocket.send_bytes(audio.astype(np.float32).tobytes())
+
+                if stats_every and converter.blocks % stats_every == 0:
+                    await websocket.send_json(dict(
+                        converter.stats(),
+                        type="stats",
+                        backlog_ms=round(pending_samples / 16.0, 1),
+                        dropped_ms=round(dropped / 16.0, 1)
+                    ))
+
+    realtime_sessions += 1
+    tasks = [asyncio.ensure_future(receive()), asyncio.ensure_future(convert_blocks())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"❌ Tempo real: {e}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        realtime_sessions -= 1
+        print(f"🎙️ Tempo real encerrado: {converter.stats()} (descartado {dropped / 16:.0f}ms)")
+
+def collect_active_jobs():
+    counts = {(status,): 0 for status in ("queued", "running", "paused", "submitted")}
+    for state in list(jobs.values()):
+        counts[(state.status,)] = counts.get((state.status,), 0) + 1
+    return counts
+
+def collect_memory():
+    """RSS/PSS (bytes) do servidor e dos workers do pool"""
+    processes = [("server", os.getpid())]
+    if worker_pool is not None:
+        processes += [(f"worker-{w['id']}", w['pid']) for w in worker_pool.stats()['workers'] if w['alive']]
+    values = {}
+    for name, pid in processes:
+        usage = shared_weights.memory_usage(pid)
+        for kind in ("rss", "pss"):
+            if f"{kind}_mb" in usage:
+                values[(name, kind)] = usage[f"{kind}_mb"] * 1024 * 1024
+    return values
+
+metrics.gauge("turborvc_jobs_active", "Jobs ativos por estado", ("status",), collect_active_jobs)
+metrics.gauge("turborvc_queue_waiting", "Jobs esperando a vez no agendador", ("priority",),
+              lambda: {(name,): count for name, count in scheduler.stats()['waiting'].items()})
+metrics.gauge("turborvc_preemptions", "Vezes que um job cedeu o dispositivo (acumulado)", (),
+              lambda: {(): scheduler.stats()['preemptions']})
+metrics.gauge("turborvc_realtime_sessions", "Sessões de conversão em tempo real abertas", (), lambda: {(): realtime_sessions})
+metrics.gauge("turborvc_models_cached", "Modelos de voz no cache LRU", (), lambda: {(): len(model_cache)})
+metrics.gauge("turborvc_memory_bytes", "Memória residente (rss) e proporcional (pss) por processo", ("process", "kind"), collect_memory)
+
+@app.get("/traces/{job_id}")
+async def get_trace(job_id: str):
+    """Trace JSON de uma conversão (abre em chrome://tracing ou ui.perfetto.dev)"""
+    trace_path = TRACES_DIR / f"{Path(job_id).name}.json"
+    if not trace_path.exists():
+        raise HTTPException(status_code=404, detail=f"Trace do job '{job_id}' não encontrado")
+    return FileResponse(trace_path, media_type="application/json")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Telemetria no formato de texto do Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+async def on_startup():
+    """Cria o estado do servidor e inicia o pool de workers quando TURBORVC_WORKERS > 0"""
+    global worker_pool, cost_model, job_executor, render_cache
+    # O gerador de carga pode ter trocado o histórico e o cache antes
+    if cost_model is None:
+        cost_model = CostModel(CACHE_DIR / "job_history.jsonl")
+    if render_cache is None:
+        render_cache = RenderCache(CACHE_DIR / "renders", RENDER_CACHE_MB * 1024 * 1024)
+    if job_executor is None:
+        job_executor = ThreadPoolExecutor(max_workers=MAX_QUEUE, thread_name_prefix="rvc-job")
+    if NUM_WORKERS > 0:
+        worker_pool = WorkerPool(NUM_WORKERS, worker_convert, policy=SCHEDULING_POLICY, aging=SJF_AGING)
+        worker_pool.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if worker_pool is not None:
+        worker_pool.stop()
+    if sharded_converter is not None:
+        sharded_converter.close()
+
 # ============================================
 # MAIN
 # ============================================
@@ -409,6 +1712,10 @@ def start_server(host: str = "127.0.0.1", port: int = 8765):
     """Inicia servidor FastAPI"""
     print(f"🚀 Iniciando TurboRVC Server em http://{host}:{port}")
     print(f"📊 Device: {device}")
+    print(f"🧮 Precisão CPU: {default_precision}")
+    print(f"⚙️ Backend: {default_backend}")
+    print(f"🧵 Workers: {NUM_WORKERS or 'processo único'}")
+    print(f"📦 Batch do Hubert: {HUBERT_BATCH} (espera {HUBERT_BATCH_WAIT_MS:.0f}ms), conversões simultâneas: {CONVERSION_CONCURRENCY}")
     print(f"🎤 Edge TTS: {'✅ Disponível' if EDGE_TTS_AVAILABLE else '❌ Não disponível'}")
     print(f"📁 Base Dir: {BASE_DIR}")
     
@@ -0,0 +1,124 @@
+"""
+TurboRVC TTS Stream
+Áudio do Edge TTS em frases, à medida que chega.
+
+communicate.save() só termina depois da síntese inteira. Aqui os pedaços de
+MP3 de communicate.stream() vão direto para um FFmpeg (stdin -> PCM float32
+mono no stdout), decodificados enquanto a síntese continua. Os eventos de
+fronteira do próprio stream dizem onde cortar: SentenceBoundary (edge-tts 7+)
+marca o início de cada frase; com WordBoundary (versões antigas) uma pausa de
+mais de SENTENCE_GAP_S entre duas palavras é tratada como fim de frase e o
+corte fica no meio da pausa. Assim que o PCM decodificado passa de um ponto de
+corte a frase sai - para a conversão RVC ou para o cliente - sem esperar o
+resto do texto. Frases longas demais são cortadas em max_sentence_s.
+
+Os offsets das fronteiras vêm em unidades de 100 ns desde o início do áudio.
+"""
+
+import asyncio
+import time
+
+import numpy as np
+
+SENTENCE_GAP_S = 0.25
+TICKS_PER_SECOND = 10_000_000
+READ_SIZE = 4096 * 4
+
+
+class SentenceCuts:
+    """Pontos de corte (s) entre frases a partir dos eventos de fronteira do Edge TTS"""
+
+    def __init__(self, gap_s=SENTENCE_GAP_S):
+        self.gap_s = gap_s
+        self.cuts = []
+        self.last_end = None
+
+    def feed(self, chunk):
+        start = chunk["offset"] / TICKS_PER_SECOND
+        end = start + chunk.get("duration", 0) / TICKS_PER_SECOND
+        if chunk["type"] == "SentenceBoundary":
+            if self.last_end is not None:
+                self.cuts.append(start)
+        elif self.last_end is not None and start - self.last_end > self.gap_s:
+            self.cuts.append((self.last_end + start) / 2)
+        self.last_end = end
+
+
+async def _decoder(sample_rate):
+    # probesize mínimo: sem ele o FFmpeg espera megabytes de MP3 antes de emitir a 1ª amostra
+    return await asyncio.create_subprocess_exec(
+        "ffmpeg", "-nostdin", "-loglevel", "error",
+        "-probesize", "32", "-analyzeduration", "0", "-fflags", "nobuffer",
+        "-f", "mp3", "-i", "pipe:0",
+        "-f", "f32le", "-ac", "1", "-ar", str(sample_rate), "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+
+async def stream_sentences(communicate, sample_rate=16000, max_sentence_s=8.0, stats=None):
+    """
+    Gera (pcm float32, início em s) por frase enquanto o TTS sintetiza.
+
+    communicate: qualquer objeto com um async stream() no formato do edge_tts
+    (dicts {"type": "audio", "data": bytes} e de fronteira). stats, se informado,
+    recebe first_audio_s (requisição -> 1ª amostra decodificada) e audio_s.
+    """
+    start = time.time()
+    decoder = await _decoder(sample_rate)
+    cuts = SentenceCuts()
+
+    async def feed():
+        try:
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    decoder.stdin.write(chunk["data"])
+                    await decoder.stdin.drain()
+                elif chunk["type"] in ("WordBoundary", "SentenceBoundary"):
+                    cuts.feed(chunk)
+        finally:
+            decoder.stdin.close()
+
+    feeder = asyncio.ensure_future(feed())
+    pending = np.zeros(0, dtype=np.float32)
+    emitted = 0  # amostras já entregues (início da frase atual)
+    tail = b""
+    max_samples = int(max_sentence_s * sample_rate)
+    try:
+        while True:
+            data = await decoder.stdout.read(READ_SIZE)
+            if not data:
+                break
+            data, tail = tail + data, b""
+            usable = len(data) - len(data) % 4
+            data, tail = data[:usable], data[usable:]
+            if stats is not None and "first_audio_s" not in stats and usable:
+                stats["first_audio_s"] = time.time() - start
+            pending = np.concatenate([pending, np.frombuffer(data, dtype=np.float32)])
+
+            while True:
+                cut = None
+                while cuts.cuts and int(cuts.cuts[0] * sample_rate) <= emitted:
+                    cuts.cuts.pop(0)
+                if cuts.cuts and int(cuts.cuts[0] * sample_rate) <= emitted + len(pending):
+                    cut = int(cuts.cuts.pop(0) * sample_rate) - emitted
+                elif len(pending) >= max_samples:
+                    cut = max_samples
+                if cut is None:
+                    break
+                yield pending[:cut], emitted / sample_rate
+                pending = pending[cut:]
+                emitted += cut
+
+        await feeder
+        if len(pending):
+            yield pending, emitted / sample_rate
+        if await decoder.wait() != 0:
+            raise RuntimeError(f"FFmpeg falhou: {(await decoder.stderr.read()).decode(errors='ignore')[-500:]}")
+        if stats is not None:
+            stats["audio_s"] = (emitted + len(pending)) / sample_rate
+    finally:
+        feeder.cancel()
+        if decoder.returncode is None:
+            decoder.kill()
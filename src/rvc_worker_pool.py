@@ -0,0 +1,290 @@
+"""
+TurboRVC Worker Pool
+Pool de processos de inferência com roteamento por afinidade de modelo.
+
+Cada worker é um processo separado (contexto spawn) com seu próprio Hubert e
+cache de modelos, então N workers usam N fluxos de inferência na CPU em paralelo.
+O dispatcher envia cada requisição para um worker que já tem a voz carregada
+(ou que já recebeu requisições dessa voz); se esse worker estiver muito mais
+ocupado que o menos carregado, ou nenhum tiver a voz, vai para o menos carregado.
+
+Dentro de cada worker os jobs passam por um PriorityGate de capacidade 1 (o
+mesmo agendador do servidor): cada job recebido roda em uma thread que espera
+a vez, e um job em andamento cede o worker entre segmentos quando chega um de
+prioridade maior - uma prévia não espera o fim de um render longo que caiu no
+mesmo worker.
+"""
+
+import os
+import itertools
+import threading
+import time
+import traceback
+import multiprocessing as mp
+from concurrent.futures import Future
+from queue import Empty
+
+from rvc_scheduler import PriorityGate
+
+# Diferença máxima de fila aceita para manter a afinidade (recarregar uma voz
+# custa ~1-3s, mais ou menos uma conversão curta)
+AFFINITY_SLACK = 2
+# Intervalo da verificação de workers mortos (também com a fila de respostas sempre cheia)
+LIVENESS_INTERVAL_S = 1.0
+
+
+class WorkerError(Exception):
+    """Erro devolvido por um worker (status HTTP + detalhe)"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def default_worker_threads(n_workers):
+    """Threads de torch por worker: divide os núcleos entre os workers"""
+    env = os.environ.get("TURBORVC_WORKER_THREADS")
+    if env:
+        return int(env)
+    return max(1, (os.cpu_count() or 1) // max(1, n_workers))
+
+
+def worker_main(worker_id, handler, n_threads, inbox, outbox, control, policy="fifo", aging=1.0):
+    """
+    Loop do processo worker: executa handler(job) e devolve o resultado.
+    Cada job roda em uma thread e espera a vez no agendador local (job["priority"],
+    job["predicted_s"]); o handler chama job["checkpoint"]() entre segmentos para
+    ceder a vez a um job mais prioritário. Cancelamentos chegam pela fila control
+    (job_id); o handler consulta job["is_cancelled"]() entre segmentos.
+    """
+    import torch
+    torch.set_num_threads(n_threads)
+    print(f"🧵 Worker {worker_id} iniciado (pid={os.getpid()}, threads={n_threads})")
+    gate = PriorityGate(1, policy, aging)
+    cancelled = set()
+
+    def drain_control():
+        while True:
+            try:
+                cancelled.add(control.get_nowait())
+            except Empty:
+                return
+
+    def run(job):
+        reply = {"id": job["id"], "worker": worker_id}
+        job_id = job.get("job_id")
+        ticket = gate.ticket(job.get("priority", "normal"), job.get("predicted_s", 0.0))
+
+        def abort_if_cancelled():
+            drain_control()
+            if job_id in cancelled:
+                raise WorkerError(409, "Conversão cancelada")
+
+        def checkpoint():
+            if gate.should_yield(ticket):
+                gate.yield_slot(ticket, abort_if_cancelled)
+
+        job["is_cancelled"] = lambda: drain_control() or job_id in cancelled
+        job["checkpoint"] = checkpoint
+        try:
+            gate.acquire(ticket, abort_if_cancelled)
+            try:
+                abort_if_cancelled()
+                reply["result"], reply["loaded"] = handler(job)
+            finally:
+                gate.release(ticket)
+        except WorkerError as e:
+            reply["error"] = (e.status_code, e.detail)
+        except Exception as e:
+            traceback.print_exc()
+            status_code = getattr(e, "status_code", 500)
+            reply["error"] = (status_code, str(getattr(e, "detail", e)))
+        cancelled.discard(job_id)
+        outbox.put(reply)
+
+    threads = []
+    while True:
+        job = inbox.get()
+        if job is None:
+            break
+        thread = threading.Thread(target=run, args=(job,), name=f"rvc-worker-{worker_id}-job", daemon=True)
+        thread.start()
+        threads = [t for t in threads if t.is_alive()] + [thread]
+    for thread in threads:
+        thread.join()
+
+
+class _Worker:
+    def __init__(self, worker_id):
+        self.id = worker_id
+        self.process = None
+        self.inbox = None
+        self.control = None
+        self.pending = {}  # job id -> (Future, chave de afinidade)
+        self.job_ids = {}  # job id interno -> job_id da requisição (cancelamento)
+        self.loaded = []  # modelos em cache no worker (informado a cada resposta)
+        self.assigned = set()  # chaves roteadas para este worker e ainda pendentes ou em cache
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+
+class WorkerPool:
+    """
+    Dispatcher do pool.
+    handler(job) roda no worker e deve retornar (resultado, lista de modelos carregados);
+    precisa ser uma função de módulo (importável pelo processo spawn).
+    """
+
+    def __init__(self, n_workers, handler, n_threads=None, policy="fifo", aging=1.0):
+        self.n_workers = n_workers
+        self.handler = handler
+        self.n_threads = n_threads or default_worker_threads(n_workers)
+        self.policy = policy
+        self.aging = aging
+        self.ctx = mp.get_context("spawn")
+        self.outbox = self.ctx.Queue()
+        self.workers = [_Worker(i) for i in range(n_workers)]
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.running = False
+        self.reader = None
+
+    def start(self):
+        for worker in self.workers:
+            self._spawn(worker)
+        self.running = True
+        self.reader = threading.Thread(target=self._read_results, name="worker-pool-reader", daemon=True)
+        self.reader.start()
+        print(f"✅ Pool de inferência: {self.n_workers} workers x {self.n_threads} threads")
+
+    def _spawn(self, worker):
+        worker.inbox = self.ctx.Queue()
+        worker.control = self.ctx.Queue()
+        worker.process = self.ctx.Process(
+            target=worker_main,
+            args=(worker.id, self.handler, self.n_threads, worker.inbox, self.outbox, worker.control, self.policy, self.aging),
+            name=f"rvc-worker-{worker.id}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.loaded = []
+        worker.assigned = set()
+
+    def stop(self):
+        self.running = False
+        for worker in self.workers:
+            try:
+                worker.inbox.put(None)
+            except Exception:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    def route(self, key, urgent=False):
+        """
+        Escolhe o worker: afinidade pela chave, senão o menos carregado.
+        Jobs urgentes (prévias) não aceitam fila maior que a do menos carregado.
+        """
+        alive = [w for w in self.workers if w.process.is_alive()] or self.workers
+        least = min(alive, key=lambda w: len(w.pending))
+        affine = [w for w in alive if key in w.loaded or key in w.assigned]
+        if affine:
+            best = min(affine, key=lambda w: len(w.pending))
+            if len(best.pending) <= len(least.pending) + (0 if urgent else AFFINITY_SLACK):
+                return best
+        return least
+
+    def submit(self, job, key=None, urgent=False):
+        """Envia um job (dict serializável) e retorna um concurrent.futures.Future"""
+        future = Future()
+        with self.lock:
+            job = dict(job, id=next(self.ids))
+            worker = self.route(key, urgent)
+            worker.pending[job["id"]] = (future, key)
+            if job.get("job_id") is not None:
+                worker.job_ids[job["id"]] = job["job_id"]
+            if key is not None:
+                worker.assigned.add(key)
+            worker.inbox.put(job)
+        return future
+
+    def cancel(self, job_id):
+        """Pede o cancelamento de um job (identificado por job["job_id"]) ao worker que o recebeu"""
+        with self.lock:
+            for worker in self.workers:
+                if job_id in worker.job_ids.values():
+                    worker.control.put(job_id)
+                    return True
+        return False
+
+    def _read_results(self):
+        last_check = time.monotonic()
+        while self.running:
+            if time.monotonic() - last_check >= LIVENESS_INTERVAL_S:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                reply = self.outbox.get(timeout=LIVENESS_INTERVAL_S)
+            except Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                worker = self.workers[reply["worker"]]
+                future, _ = worker.pending.pop(reply["id"], (None, None))
+                worker.job_ids.pop(reply["id"], None)
+                if "loaded" in reply:
+                    worker.loaded = list(reply["loaded"])
+                # Afinidade só para vozes ainda em cache no worker ou com jobs na fila dele
+                waiting = {key for _, key in worker.pending.values()}
+                worker.assigned = {key for key in worker.assigned if key in worker.loaded or key in waiting}
+                if "error" in reply:
+                    worker.failed += 1
+                else:
+                    worker.completed += 1
+            if future is None:
+                continue
+            if "error" in reply:
+                future.set_exception(WorkerError(*reply["error"]))
+            else:
+                future.set_result(reply["result"])
+
+    def _check_workers(self):
+        """Reinicia workers que morreram e falha os jobs que estavam com eles"""
+        with self.lock:
+            for worker in self.workers:
+                if not self.running or worker.process.is_alive():
+                    continue
+                print(f"⚠️ Worker {worker.id} morreu (exitcode={worker.process.exitcode}) - reiniciando")
+                lost = list(worker.pending.values())
+                worker.pending.clear()
+                worker.job_ids.clear()
+                worker.failed += len(lost)
+                worker.restarts += 1
+                self._spawn(worker)
+                for future, _ in lost:
+                    future.set_exception(WorkerError(500, f"Worker {worker.id} terminou inesperadamente"))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": [
+                    {
+                        "id": w.id,
+                        "pid": w.process.pid,
+                        "alive": w.process.is_alive(),
+                        "queue_depth": len(w.pending),
+                        "loaded_models": list(w.loaded),
+                        "completed": w.completed,
+                        "failed": w.failed,
+                        "restarts": w.restarts,
+                    }
+                    for w in self.workers
+                ],
+                "threads_per_worker": self.n_threads,
+                "queue_depth": sum(len(w.pending) for w in self.workers),
+            }
@@ -10,11 +10,26 @@ IMPORTANTE: Este script DEVE ser executado com:
 
 Exemplo:
 python.exe rvc_wrapper.py --input audio.wav --model_path pasta_modelo --output saida.wav
+
+Conversão em lote (pasta de entrada -> pasta de saída, em pipeline):
+python.exe rvc_wrapper.py --input pasta_audios --model_path pasta_modelo --output pasta_saida
+
+Linha do tempo da conversão (arquivo único; abre em chrome://tracing ou Perfetto):
+python.exe rvc_wrapper.py --input audio.wav --model_path pasta_modelo --output saida.wav --trace saida.trace.json
+
+Reconverter um áudio quase igual a um já convertido (nova tomada, reexportação com um
+trecho corrigido): só os segmentos que mudaram passam pelo modelo, os demais saem do
+cache em cache/chunks (o mesmo do servidor):
+python.exe rvc_wrapper.py --input audio_v2.wav --model_path pasta_modelo --output saida_v2.wav --reuse
+
+Prévia de um trecho de um arquivo longo (só [start, end] em segundos é decodificado e convertido):
+python.exe rvc_wrapper.py --input audio_longo.mp3 --model_path pasta_modelo --output previa.wav --start 600 --end 610
 """
 
 import os
 import sys
 import warnings
+from contextlib import ExitStack
 
 # ============================================
 # PARSE ARGS PRIMEIRO (antes de qualquer import que use argparse)
@@ -44,6 +59,14 @@ if IS_WRAPPER_MODE:
         pitch = int(get_arg('--pitch', '0'))
         method = get_arg('--method', 'harvest')
         index_rate = float(get_arg('--index_rate', '0.75'))
+        precision = get_arg('--precision')  # fp32 | int8 | bf16 (apenas CPU)
+        backend = get_arg('--backend', os.environ.get('TURBORVC_BACKEND', 'eager'))  # eager | torchscript | onnx
+        shards = int(get_arg('--shards', os.environ.get('TURBORVC_SHARDS', '1')))  # processos para um arquivo longo
+        trace = get_arg('--trace', os.environ.get('TURBORVC_TRACE'))  # caminho do trace JSON (ou 1 = ao lado da saída)
+        memory_profile = '--memory-profile' in sys.argv or os.environ.get('TURBORVC_MEMORY_PROFILE', '0') == '1'  # tracemalloc por estágio
+        start = float(get_arg('--start')) if get_arg('--start') else None  # trecho (s), só arquivo único
+        end = float(get_arg('--end')) if get_arg('--end') else None
+        reuse = '--reuse' in sys.argv or os.environ.get('TURBORVC_CHUNK_REUSE', '0') == '1'  # reaproveitar segmentos já convertidos
     
     WRAPPER_ARGS = WrapperArgs()
     
@@ -83,16 +106,21 @@ try:
     import torch
     import soundfile as sf
     import numpy as np
-    from fairseq import checkpoint_utils
     
     # Imports do RVC-GUI
-    from vc_infer_pipeline import VC
     from config import Config
     from my_utils import load_audio
-    
-    # Modelos RVC v1 e v2
-    from infer_pack.models import SynthesizerTrnMs256NSFsid, SynthesizerTrnMs256NSFsid_nono
-    from infer_pack.modelsv2 import SynthesizerTrnMs768NSFsid, SynthesizerTrnMs768NSFsid_nono
+    import model_loader
+    import cpu_precision
+    import infer_backend
+    from staged_executor import Stage, StagedExecutor
+    import shared_weights
+    from sharded_convert import ShardedConverter
+    import stage_timing
+    from trace_profiler import TraceRecorder
+    from memory_accounting import MemoryAccountant
+    from chunk_reuse import ChunkStore, convert_with_reuse, conversion_params
+    from time_range import load_range, trim_range
     
     print("[RVC Wrapper] Módulos carregados com sucesso")
     
@@ -109,7 +137,7 @@ except ImportError as e:
 config = Config()
 hubert_model = None
 
-def load_hubert():
+def load_hubert(precision="fp32"):
     """Carrega modelo Hubert"""
     global hubert_model
     
@@ -123,24 +151,12 @@ def load_hubert():
     
     print(f"[RVC Wrapper] Carregando Hubert de: {hubert_path}")
     
-    models, _, _ = checkpoint_utils.load_model_ensemble_and_task(
-        [hubert_path],
-        suffix="",
-    )
-    hubert_model = models[0]
-    hubert_model = hubert_model.to(config.device)
-    
-    if config.is_half:
-        hubert_model = hubert_model.half()
-    else:
-        hubert_model = hubert_model.float()
-    
-    hubert_model.eval()
-    print("[RVC Wrapper] Hubert carregado")
+    hubert_model = model_loader.load_hubert(hubert_path, config, precision)
+    print(f"[RVC Wrapper] Hubert carregado ({precision})")
     
     return hubert_model
 
-def load_rvc_model(model_path):
+def load_rvc_model(model_path, precision="fp32", backend="eager"):
     """Carrega modelo RVC"""
     
     # Encontrar arquivo .pth
@@ -154,7 +170,8 @@ def load_rvc_model(model_path):
         model_file = os.path.join(model_path, pth_files[0])
         
         # Encontrar arquivo .index
-        index_files = [f for f in os.listdir(model_path) if f.endswith('.index')]
+        # O .compact.index é derivado do original (o pipeline o escolhe sozinho)
+        index_files = [f for f in os.listdir(model_path) if f.endswith('.index') and not f.endswith('.compact.index')]
         index_file = os.path.join(model_path, index_files[0]) if index_files else ""
     else:
         model_file = model_path
@@ -162,66 +179,61 @@ def load_rvc_model(model_path):
     
     print(f"[RVC Wrapper] Carregando modelo: {os.path.basename(model_file)}")
     
-    # Carregar checkpoint
-    cpt = torch.load(model_file, map_location="cpu")
-    tgt_sr = cpt["config"][-1]
-    cpt["config"][-3] = cpt["weight"]["emb_g.weight"].shape[0]
+    # Carregar checkpoint e criar modelo apropriado (v1/v2, com ou sem f0) + pipeline VC
+    model_data = model_loader.load_synthesizer(model_file, config, precision)
+    model_data['index_file'] = index_file
+    model_data['model_file'] = model_file
+    model_data['precision'] = precision
     
-    if_f0 = cpt.get("f0", 1)
-    version = cpt.get("version", "v1")
+    try:
+        model_data['backend'] = infer_backend.create_backend(backend, model_file, RVC_GUI_DIR, config.device)
+    except FileNotFoundError as e:
+        print(f"[RVC Wrapper] AVISO: {e} - usando eager")
+        model_data['backend'] = infer_backend.eager_backend()
+    print(f"[RVC Wrapper] Backend: {model_data['backend'].name}")
     
-    # Criar modelo apropriado
-    if version == "v1":
-        if if_f0 == 1:
-            net_g = SynthesizerTrnMs256NSFsid(*cpt["config"], is_half=config.is_half)
-        else:
-            net_g = SynthesizerTrnMs256NSFsid_nono(*cpt["config"])
-    else:  # v2
-        if if_f0 == 1:
-            net_g = SynthesizerTrnMs768NSFsid(*cpt["config"], is_half=config.is_half)
-        else:
-            net_g = SynthesizerTrnMs768NSFsid_nono(*cpt["config"])
+    print(f"[RVC Wrapper] Modelo carregado: {model_data['version']}, tgt_sr={model_data['tgt_sr']}, f0={model_data['if_f0']}")
     
-    del net_g.enc_q
-    net_g.load_state_dict(cpt["weight"], strict=False)
-    net_g.eval().to(config.device)
+    return model_data
+
+def convert_sharded(audio, model_data, pitch, f0_method, index_rate, shards, times):
+    """
+    Arquivo longo: f0 e pontos de corte calculados uma vez aqui,
+    segmentos convertidos em paralelo por N processos (ver sharded_convert.py)
+    """
+    vc = model_data['vc']
+    prepared = vc.prepare(
+        audio,
+        times,
+        pitch,
+        f0_method,
+        model_data['index_file'],
+        index_rate,
+        model_data['if_f0'],
+        128,  # crepe_hop_length
+    )
     
-    if config.is_half:
-        net_g = net_g.half()
-    else:
-        net_g = net_g.float()
-    
-    # Criar pipeline VC
-    vc = VC(tgt_sr, config)
-    
-    print(f"[RVC Wrapper] Modelo carregado: {version}, tgt_sr={tgt_sr}, f0={if_f0}")
-    
-    return {
-        'net_g': net_g,
-        'cpt': cpt,
-        'version': version,
-        'tgt_sr': tgt_sr,
-        'vc': vc,
-        'if_f0': if_f0,
-        'index_file': index_file
-    }
+    print(f"[RVC Wrapper] Convertendo em {shards} processos...")
+    converter = ShardedConverter(
+        os.path.join(RVC_GUI_DIR, "hubert_base.pt"),
+        model_data['model_file'],
+        shards,
+        model_data['precision'],
+        model_data['backend'].name,
+        RVC_GUI_DIR,
+    )
+    try:
+        return converter.convert(vc, prepared, 0, times, model_data['index_file'])
+    finally:
+        converter.close()
 
-def convert_audio(input_path, model_data, pitch, f0_method, index_rate, output_path):
-    """Converte áudio usando RVC"""
+def convert_serial(audio, model_data, pitch, f0_method, index_rate, times):
+    """Conversão no próprio processo"""
     
     # Carregar Hubert
-    hubert = load_hubert()
+    hubert = load_hubert(model_data['precision'])
     
-    # Carregar áudio
-    print(f"[RVC Wrapper] Carregando áudio: {input_path}")
-    audio = load_audio(input_path, 16000)
-    
-    times = [0, 0, 0]
-    
-    # Converter
-    print(f"[RVC Wrapper] Convertendo... pitch={pitch}, method={f0_method}")
-    
-    audio_opt = model_data['vc'].pipeline(
+    return model_data['vc'].pipeline(
         hubert,
         model_data['net_g'],
         0,  # sid
@@ -235,16 +247,212 @@ def convert_audio(input_path, model_data, pitch, f0_method, index_rate, output_p
         model_data['version'],
         128,  # crepe_hop_length
         None,
+        precision=model_data['precision'],
+        backend=model_data['backend'],
+    )
+
+def convert_reused(audio, model_data, pitch, f0_method, index_rate, times):
+    """
+    Conversão com cortes definidos pelo conteúdo: segmentos iguais aos de conversões
+    anteriores (mesmo modelo e parâmetros) saem de cache/chunks sem passar pelo modelo
+    """
+    vc = model_data['vc']
+    prepared = vc.prepare(
+        audio,
+        times,
+        pitch,
+        f0_method,
+        model_data['index_file'],
+        index_rate,
+        model_data['if_f0'],
+        128,  # crepe_hop_length
+        split_policy="content",
     )
+    params = conversion_params(
+        vc,
+        model_data['model_file'],
+        model_data['index_file'],
+        model_data['version'],
+        model_data['tgt_sr'],
+        model_data['if_f0'],
+        pitch,
+        f0_method,
+        index_rate,
+        model_data['precision'],
+        model_data['backend'].name,
+    )
+    store = ChunkStore(os.path.join(RVC_GUI_DIR, "cache", "chunks"), int(os.environ.get("TURBORVC_CHUNK_CACHE_MB", "4096")) * 1024 * 1024)
+    
+    audio_opt, report = convert_with_reuse(
+        vc,
+        store,
+        params,
+        audio,
+        prepared,
+        load_hubert(model_data['precision']),
+        model_data['net_g'],
+        0,  # sid
+        times,
+        model_data['version'],
+        model_data['precision'],
+        model_data['backend'],
+    )
+    print(f"[RVC Wrapper] Reaproveitado: {report['reused_segments']}/{report['segments']} segmentos "
+          f"({report['reuse_ratio']:.0%} do áudio, ~{report['saved_s']:.1f}s economizados)")
+    return audio_opt
+
+def convert_audio(input_path, model_data, pitch, f0_method, index_rate, output_path, shards=1, reuse=False, start=None, end=None):
+    """Converte áudio usando RVC (com start/end, só esse trecho)"""
+    
+    # Carregar áudio (trecho: só a janela pedida, com x_pad s de contexto de cada lado)
+    print(f"[RVC Wrapper] Carregando áudio: {input_path}")
+    range_offset = None
+    with stage_timing.stage("decode"):
+        if start is None and end is None:
+            audio = load_audio(input_path, 16000)
+        else:
+            print(f"[RVC Wrapper] Trecho: {start or 0}s - {end if end is not None else 'fim'}")
+            audio, range_offset = load_range(input_path, 16000, start, end, model_data['vc'].x_pad)
+    if len(audio) == 0:
+        raise Exception("Trecho vazio (start além do fim do áudio?)")
+    
+    times = [0, 0, 0]
+    
+    # Converter
+    print(f"[RVC Wrapper] Convertendo... pitch={pitch}, method={f0_method}")
+    
+    if reuse:
+        audio_opt = convert_reused(audio, model_data, pitch, f0_method, index_rate, times)
+    elif shards > 1:
+        audio_opt = convert_sharded(audio, model_data, pitch, f0_method, index_rate, shards, times)
+    else:
+        audio_opt = convert_serial(audio, model_data, pitch, f0_method, index_rate, times)
+    
+    if range_offset is not None:
+        audio_opt = trim_range(audio_opt, model_data['tgt_sr'], range_offset, start, end)
     
     # Salvar
-    sf.write(output_path, audio_opt, model_data['tgt_sr'], format='WAV')
+    with stage_timing.stage("write"):
+        sf.write(output_path, audio_opt, model_data['tgt_sr'], format='WAV')
     
     print(f"[RVC Wrapper] Conversão concluída em: {output_path}")
     print(f"[RVC Wrapper] Tempo: npy={times[0]:.2f}s, f0={times[1]:.2f}s, infer={times[2]:.2f}s")
     
     return output_path
 
+def convert_traced(args, model_data):
+    """
+    Conversão de arquivo único com contabilidade de memória por estágio (pico de RSS;
+    tracemalloc com --memory-profile) e, com --trace, a linha do tempo da conversão
+    (chrome://tracing ou ui.perfetto.dev)
+    """
+    recorder = None
+    accountant = MemoryAccountant(track_allocations=args.memory_profile)
+    trace_path = None
+    if args.trace and args.trace.lower() not in ("0", "false", "no"):
+        trace_path = args.output + ".trace.json" if args.trace.lower() in ("1", "true", "yes") else args.trace
+        recorder = TraceRecorder(f"rvc_wrapper {os.path.basename(args.input)}")
+    
+    try:
+        with ExitStack() as stack:
+            if recorder is not None:
+                stack.enter_context(stage_timing.listen(recorder))
+            stack.enter_context(accountant)
+            stack.enter_context(stage_timing.listen(accountant))
+            return convert_audio(args.input, model_data, args.pitch, args.method, args.index_rate, args.output, args.shards, args.reuse, args.start, args.end)
+    finally:
+        if recorder is not None:
+            recorder.save(trace_path)
+            print(f"[RVC Wrapper] Trace: {trace_path}")
+            print("[RVC Wrapper] Tempo por estágio: " + ", ".join(f"{k}={v:.2f}s" for k, v in recorder.summary().items()))
+        report = accountant.report()
+        print(f"[RVC Wrapper] Pico de RSS: {report['rss_peak_mb']}MB (início {report['rss_start_mb']}MB, estágio de pico: {report['peak_stage']})")
+        for name, figures in report['stages'].items():
+            print(f"[RVC Wrapper]   {name}: " + ", ".join(f"{k}={v}" for k, v in figures.items()))
+        for allocation in report['top_allocations']:
+            print(f"[RVC Wrapper]   alocação ({allocation['stage']}): {allocation['site']} {allocation['size_mb']}MB")
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.m4a', '.aac', '.opus', '.webm')
+
+def convert_batch(input_dir, model_data, pitch, f0_method, index_rate, output_dir):
+    """
+    Converte todos os áudios de uma pasta em pipeline:
+    decode e f0 do próximo arquivo e escrita do anterior rodam enquanto
+    o arquivo atual está no Hubert/net_g (ver staged_executor.py)
+    """
+    
+    hubert = load_hubert(model_data['precision'])
+    vc = model_data['vc']
+    
+    paths = sorted(
+        os.path.join(input_dir, f) for f in os.listdir(input_dir)
+        if f.lower().endswith(AUDIO_EXTENSIONS)
+    )
+    if not paths:
+        raise Exception(f"Nenhum arquivo de áudio encontrado em: {input_dir}")
+    
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"[RVC Wrapper] Lote: {len(paths)} arquivos")
+    
+    times = {}
+    
+    def decode(path, _):
+        times[path] = [0, 0, 0]
+        return load_audio(path, 16000)
+    
+    def prepare(path, audio):
+        return vc.prepare(
+            audio,
+            times[path],
+            pitch,
+            f0_method,
+            model_data['index_file'],
+            index_rate,
+            model_data['if_f0'],
+            128,  # crepe_hop_length
+        )
+    
+    def infer(path, prepared):
+        return vc.convert(
+            hubert,
+            model_data['net_g'],
+            0,  # sid
+            prepared,
+            times[path],
+            model_data['version'],
+            precision=model_data['precision'],
+            backend=model_data['backend'],
+        )
+    
+    def write(path, audio_opt):
+        output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + '.wav')
+        sf.write(output_path, audio_opt, model_data['tgt_sr'], format='WAV')
+        return output_path
+    
+    executor = StagedExecutor([
+        Stage("decode", decode),
+        Stage("f0", prepare, workers=int(os.environ.get('TURBORVC_F0_WORKERS', '2'))),
+        Stage("infer", infer),
+        Stage("write", write),
+    ])
+    
+    results, failed = [], []
+    for path, output_path, error in executor.run(paths):
+        name = os.path.basename(path)
+        if error is None:
+            t = times[path]
+            print(f"[RVC Wrapper] ✅ {name} -> {output_path} (f0={t[1]:.2f}s, infer={t[2]:.2f}s)")
+            results.append(output_path)
+        else:
+            print(f"[RVC Wrapper] ❌ {name}: {error}", file=sys.stderr)
+            failed.append(name)
+    
+    print(f"[RVC Wrapper] {executor.report()}")
+    if failed:
+        raise Exception(f"{len(failed)} de {len(paths)} arquivos falharam: {', '.join(failed)}")
+    
+    return output_dir
+
 def main():
     global WRAPPER_ARGS
     
@@ -257,30 +465,42 @@ def main():
     print(f"[RVC Wrapper] Iniciando conversão...")
     print(f"[RVC Wrapper] Device: {config.device}")
     print(f"[RVC Wrapper] Half precision: {config.is_half}")
+    
+    precision = cpu_precision.resolve_precision(args.precision or config.cpu_precision, config.device)
+    print(f"[RVC Wrapper] Precisão CPU: {precision}")
     print(f"[RVC Wrapper] Input: {args.input}")
     print(f"[RVC Wrapper] Model: {args.model_path}")
     print(f"[RVC Wrapper] Output: {args.output}")
     
+    batch = os.path.isdir(args.input)
+    if (args.start is not None and args.start < 0) or (args.end is not None and args.end <= (args.start or 0)):
+        print("[RVC Wrapper] ERRO: Trecho inválido: use 0 <= --start < --end", file=sys.stderr)
+        sys.exit(1)
+    if batch and (args.start is not None or args.end is not None):
+        print("[RVC Wrapper] AVISO: --start/--end valem só para arquivo único - convertendo a pasta inteira")
+    
     # Criar diretório de saída se não existir
-    output_dir = os.path.dirname(args.output)
+    output_dir = args.output if batch else os.path.dirname(args.output)
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
     
     try:
         # Carregar modelo
-        model_data = load_rvc_model(args.model_path)
+        model_data = load_rvc_model(args.model_path, precision, args.backend)
         
-        # Converter
-        result = convert_audio(
-            args.input,
-            model_data,
-            args.pitch,
-            args.method,
-            args.index_rate,
-            args.output
-        )
+        # Converter (pasta inteira em pipeline ou arquivo único)
+        if batch:
+            result = convert_batch(args.input, model_data, args.pitch, args.method, args.index_rate, args.output)
+        else:
+            result = convert_traced(args, model_data)
         
         print(f"[RVC Wrapper] SUCESSO: {result}")
+        
+        # Pesos compartilhados (mmap): RSS conta a cópia compartilhada, USS só a memória privada
+        memory = shared_weights.memory_usage()
+        if memory:
+            shared = "compartilhados" if shared_weights.enabled(config) else "privados"
+            print(f"[RVC Wrapper] Memória (pesos {shared}): " + ", ".join(f"{k}={v}" for k, v in memory.items()))
         sys.exit(0)
         
     except Exception as e: